@@ -0,0 +1,308 @@
+'''
+    AsyncJenkinsLight
+    jenkinslight, but asyncio. Same calls, same return shapes, same cache, so
+    one thread can keep hundreds of requests outstanding instead of needing a
+    thread per request. Built on httpx, which isn't needed for anything else,
+    so it's only imported when you make one of these.
+
+        async with AsyncJenkinsLight(server, uid, token) as j:
+            runs = await j.get_pipeline_data('big-pipeline-job')
+            details = await j.fetch_run_details([('big-pipeline-job', runs)], summary=True)
+'''
+import asyncio
+import json
+import logging
+
+from jenkinslight import (DEFAULT_MAX_WORKERS, DEFAULT_RETRIES, FINGERPRINT_TREE, SUMMARY_TREE,
+                          Revalidator, fingerprints_from_json, job_results_summary,
+                          parse_fingerprints_html, save_json)
+from responsecache import is_terminal
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth waiting out and asking again, same as tune_session
+RETRY_STATUSES = (429, 503)
+BACKOFF_FACTOR = 0.5
+
+
+class AsyncJenkinsLight():
+
+    def __init__(
+        self,
+        baseurl: str,
+        username: str = "",
+        password: str = "",
+        ssl_verify: bool = True,
+        cert=None,
+        timeout: int = 10,
+        max_retries: int = DEFAULT_RETRIES,
+        max_per_host: int = DEFAULT_MAX_WORKERS,
+        max_connections: int = None,
+        cache=None,
+        compress: bool = True,
+    ) -> None:
+        """
+        :param baseurl: baseurl for jenkins instance including port, str
+        :param username: username for jenkins auth, str
+        :param password: password for jenkins auth, str
+        :param max_retries: retries for connection errors and 429/503, int
+        :param max_per_host: max requests in flight against the server, int
+        :param max_connections: connection pool size, defaults to max_per_host
+        :param cache: ResponseCache for finished builds, None to always fetch
+        :param compress: ask for gzipped responses, bool
+        """
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("AsyncJenkinsLight needs httpx, pip install httpx") from e
+
+        self.baseurl = baseurl
+        self.max_per_host = max(1, max_per_host)
+        self.max_retries = max_retries
+        self.cache = cache
+        self._html_fingerprints = set()
+        # Same conditional GET bookkeeping and cache entries as JenkinsLight
+        self._validators = Revalidator(baseurl, cache)
+        # Everything waits its turn here, however many tasks are queued up
+        self._limit = asyncio.Semaphore(self.max_per_host)
+
+        connections = max_connections or self.max_per_host
+        limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+        headers = {} if compress else {'Accept-Encoding': 'identity'}
+        self.client = httpx.AsyncClient(
+            auth=httpx.BasicAuth(username, password) if username else None,
+            timeout=timeout,
+            headers=headers,
+            # The transport only retries failed connects, statuses are handled in _get
+            transport=httpx.AsyncHTTPTransport(retries=max_retries, limits=limits,
+                                               verify=ssl_verify, cert=cert),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """Closes the pooled connections"""
+        await self.client.aclose()
+
+    async def get_pipeline_data(self, jobname, filename=None):
+        """Get the wfapi run list for a pipeline job, conditionally if we can
+
+        Returns:
+            List of run dicts, newest first
+        """
+        url = self.baseurl + '/job/' + jobname + '/wfapi/runs'
+
+        (entry, headers) = self._validators.lookup(url)
+        response = await self._get(url, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            json_data = self._validators.not_modified(url, None, entry)
+        else:
+            if response.status_code != 200:
+                logger.error("Failed request at %s", url)
+                response.raise_for_status()
+            json_data = json.loads(response.content)
+            self._validators.remember(url, None, response.headers, json_data)
+
+        if filename is not None:
+            save_json(json_data, filename)
+        return json_data
+
+    async def get_pipeline_results(self, jobname, jobno, status=None, tree=None):
+        """Get the test report for a build, finished ones through the cache"""
+        url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/testReport/api/json'
+        endpoint = 'testReport' if tree is None else 'testReport?tree=' + tree
+        return await self._cached(endpoint, jobname, jobno, status,
+                                  lambda: self._get_json(url, {'tree': tree} if tree else None))
+
+    async def get_results_summary(self, jobname, jobno, status=None):
+        """Get just the pass/fail/skip counters for a build's test report"""
+        url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/testReport/api/json'
+        return await self._cached('testSummary', jobname, jobno, status,
+                                  lambda: self._get_json(url, {'tree': 'passCount,failCount,skipCount'}))
+
+    async def get_job_results_summary(self, jobname, count):
+        """Get the test counters for the last count builds of a job in one request
+
+        Returns:
+            (summaries, oldest), see JenkinsLight.get_job_results_summary
+        """
+        url = self.baseurl + '/job/' + jobname + '/api/json'
+        return job_results_summary(await self._get_json(url, {'tree': SUMMARY_TREE % count}))
+
+    async def get_run_summaries(self, jobname, runs):
+        """Test counters for a list of wfapi runs of one job
+
+        Returns:
+            Dict keyed on run id, LookupError for runs without test results
+        """
+        summaries = {}
+        wanted = []
+        for run in runs:
+            if self.cache is not None and is_terminal(run.get("status")):
+                cached = self.cache.get((self.baseurl, jobname, str(run["id"]), 'testSummary'))
+                if cached is not None:
+                    summaries[run["id"]] = cached
+                    continue
+            wanted.append(run)
+
+        if not wanted:
+            return summaries
+
+        (found, oldest) = await self.get_job_results_summary(jobname, len(runs))
+        older = [run for run in wanted
+                 if run["id"] not in found and oldest is not None and int(run["id"]) < oldest]
+        fallbacks = await self.fetch_all([(self.get_results_summary, (jobname, run["id"], run.get("status")))
+                                          for run in older])
+        fallbacks = dict(zip((run["id"] for run in older), fallbacks))
+
+        for run in wanted:
+            if run["id"] in found:
+                summary = found[run["id"]]
+                if self.cache is not None and is_terminal(run.get("status")):
+                    self.cache.put((self.baseurl, jobname, str(run["id"]), 'testSummary'), summary)
+            elif run["id"] in fallbacks:
+                summary = fallbacks[run["id"]]
+            else:
+                summary = LookupError(f"No test results for {jobname} #{run['id']}")
+            summaries[run["id"]] = summary
+        return summaries
+
+    async def get_fingerprints(self, jobname, jobno, status=None):
+        """Get a build's fingerprints, json api first and the page as a fallback
+
+        Returns:
+            List of dicts, same as JenkinsLight.get_fingerprints
+        """
+        return await self._cached('fingerprints', jobname, jobno, status,
+                                  lambda: self._fetch_fingerprints(jobname, jobno))
+
+    async def _fetch_fingerprints(self, jobname, jobno):
+        if jobname not in self._html_fingerprints:
+            url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/api/json'
+            data = await self._get_json(url, {'tree': FINGERPRINT_TREE})
+            if 'fingerprint' in data:
+                return fingerprints_from_json(data['fingerprint'], jobname, jobno)
+            self._html_fingerprints.add(jobname)
+
+        url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/fingerprints/'
+        response = await self._get(url)
+        if response.status_code != 200:
+            logger.debug("Failed request at %s", url)
+            response.raise_for_status()
+        return parse_fingerprints_html(response.content.decode(response.encoding or "ISO-8859-1"))
+
+    async def fetch_all(self, calls, timeout=None):
+        """Runs a batch of calls concurrently, max_per_host requests at a time
+
+        Args:
+            calls: list of (coroutine function, args) tuples, like
+                (j.get_fingerprints, (jobname, jobno))
+            timeout: seconds to give the whole batch. Whatever isn't done by
+                then is cancelled and gets a TimeoutError in its slot.
+
+        Returns:
+            List of results in the same order as calls, exceptions in the
+            slots of calls that failed. If the caller gets cancelled the whole
+            batch is cancelled with it.
+        """
+        if not calls:
+            return []
+
+        tasks = [asyncio.ensure_future(func(*args)) for (func, args) in calls]
+        try:
+            (_, pending) = await asyncio.wait(tasks, timeout=timeout)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        results = []
+        for task in tasks:
+            if task.cancelled():
+                results.append(asyncio.TimeoutError(f"Gave up after {timeout}s"))
+            else:
+                error = task.exception()
+                results.append(error if error is not None else task.result())
+        return results
+
+    async def fetch_run_details(self, job_runs, results=True, fingerprints=False, summary=False,
+                                timeout=None):
+        """Fans out the per-run requests for every run of every job at once
+
+        Same as JenkinsLight.fetch_run_details, minus downstream. timeout is
+        passed on to fetch_all.
+        """
+        calls = []
+        slots = []
+        for (jobname, runs) in job_runs:
+            if results and summary:
+                calls.append((self.get_run_summaries, (jobname, runs)))
+                slots.append((jobname, None, 'summaries'))
+            for run in runs:
+                if results and not summary:
+                    calls.append((self.get_pipeline_results, (jobname, run["id"], run.get("status"))))
+                    slots.append((jobname, run["id"], 'results'))
+                if fingerprints:
+                    calls.append((self.get_fingerprints, (jobname, run["id"], run.get("status"))))
+                    slots.append((jobname, run["id"], 'fingerprints'))
+
+        details = {}
+        for ((jobname, run_id, kind), value) in zip(slots, await self.fetch_all(calls, timeout)):
+            if kind == 'summaries':
+                for run in dict(job_runs)[jobname]:
+                    if isinstance(value, Exception):
+                        run_summary = value
+                    else:
+                        run_summary = value.get(run["id"], LookupError(run["id"]))
+                    details.setdefault((jobname, run["id"]), {})['results'] = run_summary
+                continue
+            details.setdefault((jobname, run_id), {})[kind] = value
+        return details
+
+    async def _cached(self, endpoint, jobname, jobno, status, fetch):
+        """Serves finished builds out of the cache, awaits fetch() for the rest"""
+        if self.cache is None or not is_terminal(status):
+            return await fetch()
+
+        # Same keys as JenkinsLight, so the two share a cache
+        key = (self.baseurl, jobname, str(jobno), endpoint)
+        value = self.cache.get(key)
+        if value is None:
+            value = await fetch()
+            self.cache.put(key, value)
+        return value
+
+    async def _get(self, url, params=None, headers=None):
+        """GETs url under the per-host limit, retrying 429/503 with backoff"""
+        attempt = 0
+        while True:
+            async with self._limit:
+                response = await self.client.get(url, params=params, headers=headers)
+            if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                return response
+
+            # Sleep outside the semaphore so other requests can go meanwhile
+            retry_after = response.headers.get('Retry-After', '')
+            delay = float(retry_after) if retry_after.isdigit() else BACKOFF_FACTOR * (2 ** attempt)
+            logger.debug("Got %d from %s, retrying in %.1fs", response.status_code, url, delay)
+            await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _get_json(self, url, params=None):
+        """GETs url and hands back the decoded json, raising on a bad status"""
+        response = await self._get(url, params=params)
+        if response.status_code != 200:
+            logger.debug("Failed request at %s with params: %s", url, params)
+            response.raise_for_status()
+        return response.json()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+    bench_e2e.py - How long do the tools take, start to finish?
+
+    Starts fakejenkins.py in the background, writes a janky.cfg pointing at it
+    into a scratch directory and runs stage-view.py, pigsig.py and the janky.py
+    flows against it as real subprocesses. For each one it reports the wall
+    time, how many requests it made, how many bytes came over the wire (after
+    gzip) and the peak RSS of the process.
+
+    Every run starts with an empty response cache unless --warm is given, then
+    the first run fills it and the rest read from it.
+
+    python3 bench/bench_e2e.py
+    python3 bench/bench_e2e.py -n 5 --latency 0.05 stage-view pigsig
+    python3 bench/bench_e2e.py --cases 50000 --console-lines 500000 janky-fails janky-grep
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fakejenkins import add_server_options, fake_from_options, start_server
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scenarios(opts):
+    """name: (script, args) for everything we know how to time"""
+    job = opts.upstream
+    last = str(opts.builds - opts.running)
+    running = str(opts.builds)
+    return {
+        'stage-view': ('stage-view.py', ['-j', job, '-l', '10']),
+        'stage-view-sub': ('stage-view.py', ['-j', job, '-l', '10', '-s', opts.subjob]),
+        'stage-view-compact': ('stage-view.py', ['-j', job, '-l', '10', '-c']),
+        'pigsig': ('pigsig.py', ['-j', job, '-l', '10', '-s', opts.subjob]),
+        'janky-list': ('janky.py', ['-j', job, '-l']),
+        'janky-list-last': ('janky.py', ['-j', job, '-t', '-l']),
+        'janky-results': ('janky.py', ['-j', job, '-n', last, '-r']),
+        'janky-fails': ('janky.py', ['-j', job, '-n', last, '-f', '-d']),
+        'janky-console': ('janky.py', ['-j', job, '-n', last, '-c']),
+        'janky-grep': ('janky.py', ['-j', job, '-n', last, '-g', 'ERROR']),
+        'janky-tail': ('janky.py', ['-j', job, '-n', last, '--tail', '100']),
+        'janky-stream': ('janky.py', ['-j', job, '-n', running, '-s']),
+        'janky-flaky': ('janky.py', ['-j', job, '--flaky', '10']),
+        'janky-launch': ('janky.py', ['-j', job, '-x']),
+        'janky-sweep': ('janky.py', ['-j', job, '--sweep', '-p', 'TARGET=staging|prod', '-p', 'DEPLOY=true|false']),
+    }
+
+
+def run_once(script, args, workdir, env):
+    """Returns (wall seconds, peak RSS bytes, exit code)"""
+    cmd = [sys.executable, os.path.join(REPO, script)] + args
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # wait4 instead of wait, it hands back the child's rusage
+    (_, status, usage) = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return (wall, peak, proc.returncode)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="bench_e2e.py",
+                                     description="End to end benchmark against a fake Jenkins")
+    parser.add_argument("-n", "--repeat", dest="repeat", type=int, default=3,
+                        help="How many runs per scenario")
+    parser.add_argument("--warm", dest="warm", action="store_true", default=False,
+                        help="Keep the response cache between runs")
+    parser.add_argument("--list", dest="list", action="store_true", default=False,
+                        help="List the scenarios and quit")
+    parser.add_argument("-o", "--output", dest="output",
+                        help="Also write the numbers to this json file")
+    add_server_options(parser)
+    parser.add_argument("names", nargs='*',
+                        help="Scenarios to run, all of them if none given")
+    opts = parser.parse_args()
+
+    known = scenarios(opts)
+    if opts.list:
+        for (name, (script, args)) in known.items():
+            print(f"{name:20} {script} {' '.join(args)}")
+        return 0
+    unknown = [name for name in opts.names if name not in known]
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(unknown)}, see --list")
+
+    fake = fake_from_options(opts)
+    server = start_server(fake)
+    workdir = tempfile.mkdtemp(prefix='janky-bench-')
+    cache = os.path.join(workdir, 'cache')
+    with open(os.path.join(workdir, 'janky.cfg'), 'w') as cfg:
+        cfg.write(f"[fake]\nuname: bench\ntoken: bench\nserver: {server.url}\n")
+    # stage-view wants its theme in the current directory too
+    shutil.copy(os.path.join(REPO, 'colors.cfg'), workdir)
+    env = dict(os.environ, XDG_CACHE_HOME=cache, COLUMNS='120')
+
+    faulty = opts.fail_rate or opts.drop_rate or opts.cut_rate
+    print(f"{'scenario':20} {'wall ms':>9} {'requests':>9} {'KB':>9} {'peak MB':>8}  exit"
+          + ("  faults" if faulty else ""))
+    results = {}
+    try:
+        for name in opts.names or list(known):
+            (script, args) = known[name]
+            shutil.rmtree(cache, ignore_errors=True)
+            runs = []
+            for _ in range(opts.repeat):
+                if not opts.warm:
+                    shutil.rmtree(cache, ignore_errors=True)
+                fake.reset()
+                (wall, peak, code) = run_once(script, args, workdir, env)
+                stats = fake.snapshot()
+                runs.append({'wall': wall, 'peak': peak, 'exit': code,
+                             'requests': stats['requests'], 'bytes': stats['bytes'],
+                             'faults': stats['failed'] + stats['dropped'] + stats['cut'],
+                             'endpoints': stats['endpoints']})
+
+            # Median run by wall time, its counts go with it
+            middle = sorted(runs, key=lambda run: run['wall'])[len(runs) // 2]
+            results[name] = {'median': middle, 'runs': runs}
+            print(f"{name:20} {statistics.median(run['wall'] for run in runs) * 1000:9.0f} "
+                  f"{middle['requests']:9} {middle['bytes'] / 1024:9.0f} "
+                  f"{max(run['peak'] for run in runs) / 1048576:8.1f}  "
+                  f"{','.join(sorted(set(str(run['exit']) for run in runs))):4}"
+                  + (f"  {middle['faults']:6}" if faulty else ""))
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if opts.output:
+        with open(opts.output, 'w') as out:
+            json.dump(results, out, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
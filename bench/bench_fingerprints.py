@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+    bench_fingerprints.py - How long does it take to read a fingerprints page?
+
+    Compares the old regex scraper (whole page .*? row match, regexes compiled
+    per row) against parse_fingerprints_html and the json api's payload, on
+    generated pages with lots of fingerprinted artifacts. -w saves the
+    generated page and json so they can be fed to something else.
+
+    python3 bench/bench_fingerprints.py -n 5000
+    python3 bench/bench_fingerprints.py -p recorded-fingerprints.html
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jenkinslight import fingerprints_from_json, parse_fingerprints_html
+
+
+def synthetic_page(rows, seed=42):
+    """A fingerprints page and the matching api json, rows artifacts each"""
+    rng = random.Random(seed)
+    html = ['<html><head><title>Recorded Fingerprints</title></head><body>',
+            '<table class="fingerprint-in-build sortable bigtable">',
+            '<tr><th>File</th><th>Original owner</th><th>Age</th></tr>']
+    entries = []
+    for row in range(rows):
+        digest = '%032x' % rng.getrandbits(128)
+        filename = f'artifacts/module{row % 50}/lib-{row}.jar'
+        if rng.random() < 0.3:
+            owner_cell = 'this build'
+            original = {'name': 'big-pipeline-job', 'number': 1200}
+        else:
+            job = f'sub-job-{row % 7}'
+            number = rng.randint(1, 5000)
+            owner_cell = f'<a href="/job/{job}/{number}/" class="model-link">{job} #{number}</a>'
+            original = {'name': job, 'number': number}
+        html.append(f'<tr><td><a href="/fingerprint/{digest}/">{filename}</a></td>'
+                    f'<td>{owner_cell}</td><td>{rng.randint(1, 23)} hr old</td>'
+                    f'<td><a href="/fingerprint/{digest}/">more details</a></td></tr>')
+        entries.append({'fileName': filename, 'original': original,
+                        'timestamp': int(time.time() * 1000) - rng.randint(1, 23) * 3600000})
+    html.append('</table></body></html>')
+    return ('\n'.join(html), json.dumps({'fingerprint': entries}))
+
+
+def old_parser(data):
+    """What get_fingerprints used to do, kept here to measure against"""
+    fingerprints = []
+    rows = re.findall(r'<tr>.*?</tr>', data, re.DOTALL)
+    for row in rows:
+        if '<th' in row:
+            continue
+        cells = re.findall(r'<td[^>]*>(.*?)</td>', row, re.DOTALL)
+        if len(cells) >= 3:
+            filename_match = re.search(r'>([^<]+)</a>', cells[0])
+            filename = filename_match.group(1) if filename_match else ''
+            owner_text = re.sub(r'<[^>]+>', '', cells[1]).strip()
+            job_link_match = re.search(r'href="/job/([^/]+)/(\d+)/', cells[1])
+            owner_job = None
+            owner_build_number = None
+            if job_link_match:
+                owner_job = job_link_match.group(1)
+                owner_build_number = int(job_link_match.group(2))
+            age = re.sub(r'<[^>]+>', '', cells[2]).strip()
+            fingerprints.append({'filename': filename, 'owner': owner_text, 'owner_job': owner_job,
+                                 'owner_build_number': owner_build_number, 'age': age})
+    return fingerprints
+
+
+def measure(name, func, repeat):
+    result = func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{name:<28} {elapsed * 1000:>10.2f} ms   {len(result)} fingerprints")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="bench_fingerprints.py",
+                                     description="Fingerprints parsing benchmark")
+    parser.add_argument("-n", "--rows", dest="rows", type=int, default=5000,
+                        help="Number of fingerprinted artifacts on the synthetic page")
+    parser.add_argument("-p", "--page", dest="page", default=None,
+                        help="Recorded fingerprints page to use instead")
+    parser.add_argument("-r", "--repeat", dest="repeat", type=int, default=5,
+                        help="Times to run each parser")
+    parser.add_argument("-w", "--write", dest="write", default=None,
+                        help="Save the generated page and json as WRITE.html and WRITE.json")
+    opts = parser.parse_args()
+
+    (page, api_json) = synthetic_page(opts.rows)
+    if opts.page:
+        with open(opts.page, 'r', encoding="utf-8", errors="replace") as page_file:
+            page = page_file.read()
+        api_json = None
+    if opts.write:
+        with open(opts.write + '.html', 'w', encoding="utf-8") as out:
+            out.write(page)
+        if api_json:
+            with open(opts.write + '.json', 'w', encoding="utf-8") as out:
+                out.write(api_json)
+
+    print(f"page {len(page) / 1024:.0f} KB\n")
+    old = measure("old regex scraper", lambda: old_parser(page), opts.repeat)
+    new = measure("parse_fingerprints_html", lambda: parse_fingerprints_html(page), opts.repeat)
+    if api_json:
+        measure("json api", lambda: fingerprints_from_json(json.loads(api_json)['fingerprint'],
+                                                            'big-pipeline-job', 1200), opts.repeat)
+    if old != new:
+        print("\nWARNING: the html parsers disagree")
+
+
+if __name__ == "__main__":
+    main()
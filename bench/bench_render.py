@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+    bench_render.py - How long does stage-view take to draw a big board?
+
+    Renders synthetic wfapi/runs data the regular way (a row of panels per
+    run, printed run by run) and with --compact (one table per job, one
+    print), into a throwaway console. No Jenkins needed.
+
+    python3 bench/bench_render.py -j 3 -r 20 -s 40
+"""
+import argparse
+import importlib.util
+import io
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from rich.console import Console, Group
+
+STATUSES = ['SUCCESS'] * 8 + ['FAILED', 'UNSTABLE', 'ABORTED', 'NOT_EXECUTED']
+
+
+def load_stage_view():
+    """stage-view.py has a dash in it, so no plain import"""
+    spec = importlib.util.spec_from_file_location("stage_view", os.path.join(ROOT, "stage-view.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_runs(jobs, runs, stages, seed=42):
+    """wfapi/runs shaped data plus fetch_run_details shaped details"""
+    rng = random.Random(seed)
+    job_runs = []
+    details = {}
+    for job_no in range(jobs):
+        jobname = f'pipeline-{job_no}'
+        job = []
+        for run_no in range(runs, 0, -1):
+            run_stages = [{"id": str(stage_no), "name": f"Stage {stage_no}",
+                           "status": rng.choice(STATUSES),
+                           "startTimeMillis": 0, "durationMillis": rng.randint(1000, 600000)}
+                          for stage_no in range(stages)]
+            job.append({"id": str(run_no), "name": f"#{run_no}", "status": rng.choice(STATUSES),
+                        "startTimeMillis": 1700000000000 + run_no * 3600000,
+                        "durationMillis": sum(stage["durationMillis"] for stage in run_stages),
+                        "stages": run_stages})
+            details[(jobname, str(run_no))] = {
+                'results': {'passCount': rng.randint(0, 5000), 'failCount': rng.randint(0, 20),
+                            'skipCount': rng.randint(0, 50)},
+                'downstream': [run_no + 1000],
+            }
+        job_runs.append((jobname, job))
+    return (job_runs, details)
+
+
+def panels(stage_view, styles, console, job_runs, details):
+    for (jobname, runs) in job_runs:
+        console.print(jobname)
+        for run in runs:
+            (renderable, _) = stage_view.render_run(run, details[(jobname, run["id"])], 'sub', styles)
+            console.print(renderable)
+
+
+def compact(stage_view, styles, console, job_runs, details):
+    frame = []
+    for (jobname, runs) in job_runs:
+        (table, _) = stage_view.render_table(jobname, runs, details, 'sub', styles)
+        frame.extend([jobname, table])
+    console.print(Group(*frame))
+
+
+def measure(name, func, make_console, repeat):
+    best = None
+    for _ in range(repeat):
+        (console, out) = make_console()
+        start = time.perf_counter()
+        func(console)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<20} {best * 1000:>10.1f} ms   {len(out.getvalue()) / 1024:>8.0f} KB output")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="bench_render.py",
+                                     description="stage-view rendering benchmark")
+    parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=3,
+                        help="Number of jobs")
+    parser.add_argument("-r", "--runs", dest="runs", type=int, default=20,
+                        help="Runs per job")
+    parser.add_argument("-s", "--stages", dest="stages", type=int, default=40,
+                        help="Stages per run")
+    parser.add_argument("-n", "--repeat", dest="repeat", type=int, default=3,
+                        help="Take the best of this many")
+    parser.add_argument("--width", dest="width", type=int, default=200,
+                        help="Console width")
+    opts = parser.parse_args()
+
+    # load_theme reads colors.cfg out of the current directory
+    os.chdir(ROOT)
+    stage_view = load_stage_view()
+    theme = stage_view.load_theme()
+    (job_runs, details) = synthetic_runs(opts.jobs, opts.runs, opts.stages)
+
+    def make_console():
+        out = io.StringIO()
+        return (Console(file=out, theme=theme, width=opts.width, force_terminal=True,
+                        color_system="truecolor"), out)
+
+    print(f"{opts.jobs} jobs x {opts.runs} runs x {opts.stages} stages, {opts.width} columns\n")
+    measure("panels", lambda console: panels(stage_view, stage_view.ThemeCache(theme), console,
+                                             job_runs, details),
+            make_console, opts.repeat)
+    measure("compact table", lambda console: compact(stage_view, stage_view.ThemeCache(theme), console,
+                                                     job_runs, details),
+            make_console, opts.repeat)
+
+    # What a --watch tick costs when nothing changed: replaying kept segments
+    styles = stage_view.ThemeCache(theme)
+    board = stage_view.Prerendered(Group(*[stage_view.render_run(run, details[(jobname, run["id"])],
+                                                                 'sub', styles)[0]
+                                           for (jobname, runs) in job_runs for run in runs]))
+    measure("unchanged redraw", lambda console: console.print(board), make_console, opts.repeat)
+
+
+if __name__ == "__main__":
+    main()
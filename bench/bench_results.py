@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+    bench_results.py - How long does janky -r/-f take on a big test report?
+
+    Compares the old way (whole report as dicts, suites sorted twice, a
+    jenkinsapi Result built for every case) against streaming the report into
+    testresults. Parsing is included both ways, printing isn't. The last row
+    parses what Jenkins sends back once the tree= filter trims the report.
+
+    python3 bench/bench_results.py -n 100000
+"""
+import argparse
+import json
+import operator
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import jsonstream
+from bench_testreport import chunked, synthetic_report
+from testresults import TestResults
+
+
+def old_way(json_bytes, fails):
+    from jenkinsapi.result import Result
+
+    report = json.loads(json_bytes)
+    shown = 0
+    suites = sorted(report["suites"], key=operator.itemgetter('name'))
+    for suite in sorted(report["suites"], key=operator.itemgetter('name')):
+        for case in sorted(suite["cases"], key=operator.itemgetter('className')):
+            result = Result(**case)
+            if not fails or case["status"] not in ['PASSED', 'FIXED']:
+                shown += 1
+    return shown
+
+
+def new_way(json_bytes, fails):
+    stream = jsonstream.iter_test_cases(jsonstream.iter_text(chunked(json_bytes)), fails)
+    results = TestResults.from_stream(stream, fails)
+    return sum(len(cases) for (_, cases) in results.by_suite())
+
+
+def trimmed(report):
+    """What the report looks like after tree=suites[name,cases[className,name,status]]"""
+    return {"suites": [{"name": suite["name"],
+                        "cases": [{key: case[key] for key in ("className", "name", "status")}
+                                  for case in suite["cases"]]}
+                       for suite in report["suites"]]}
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<32} {elapsed * 1000:>10.1f} ms {peak / (1024 * 1024):>10.1f} MB   {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="bench_results.py",
+                                     description="Test results processing benchmark")
+    parser.add_argument("-n", "--cases", dest="cases", type=int, default=100000,
+                        help="Number of cases in the synthetic report")
+    opts = parser.parse_args()
+
+    report = synthetic_report(opts.cases)
+    json_bytes = json.dumps(report).encode("utf-8")
+    tree_bytes = json.dumps(trimmed(report)).encode("utf-8")
+    del report
+    print(f"json payload {len(json_bytes) / (1024 * 1024):.1f} MB, "
+          f"with tree= {len(tree_bytes) / (1024 * 1024):.1f} MB, {opts.cases} cases\n")
+    print(f"{'method':<32} {'time':>13} {'peak mem':>13}   cases shown")
+
+    measure("old, all (-r)", lambda: old_way(json_bytes, False))
+    measure("testresults, all (-r)", lambda: new_way(json_bytes, False))
+    measure("old, failures (-f)", lambda: old_way(json_bytes, True))
+    measure("testresults, failures (-f)", lambda: new_way(json_bytes, True))
+    measure("testresults, all, tree= payload", lambda: new_way(tree_bytes, False))
+
+
+if __name__ == "__main__":
+    main()
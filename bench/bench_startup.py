@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+    bench_startup.py - How long do the tools take to get off the ground?
+
+    Runs each script with -h under python -X importtime a few times and
+    reports the wall time plus the imports that cost the most. -h doesn't
+    need a server or a janky.cfg, so it's pure startup cost.
+
+    python3 bench/bench_startup.py
+    python3 bench/bench_startup.py -n 10 janky.py stage-view.py
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def run_once(script, args):
+    """Returns (wall seconds, {top level module: cumulative usec})"""
+    cmd = [sys.executable, "-X", "importtime", os.path.join(REPO, script)] + args
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=REPO, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    imports = {}
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        # Only the outermost imports, indent of one space
+        if match and len(match.group(3)) == 1:
+            imports[match.group(4)] = int(match.group(2))
+    return (wall, imports)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="bench_startup.py",
+                                     description="Startup time benchmark")
+    parser.add_argument("-n", "--runs", dest="runs", type=int, default=5,
+                        help="How many runs per script")
+    parser.add_argument("-t", "--top", dest="top", type=int, default=8,
+                        help="How many of the slowest imports to show")
+    parser.add_argument("scripts", nargs='*', default=["janky.py", "stage-view.py", "pigsig.py"],
+                        help="Scripts to time")
+    opts = parser.parse_args()
+
+    for script in opts.scripts:
+        walls = []
+        imports = {}
+        for _ in range(opts.runs):
+            (wall, run_imports) = run_once(script, ["-h"])
+            walls.append(wall)
+            imports = run_imports
+
+        total = sum(imports.values())
+        print(f"{script}: median {statistics.median(walls) * 1000:.0f} ms wall, "
+              f"{total / 1000:.0f} ms in imports")
+        for (name, usec) in sorted(imports.items(), key=lambda item: -item[1])[:opts.top]:
+            print(f"    {usec / 1000:8.1f} ms  {name}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+    bench_testreport.py - How long does it take to chew through a test report?
+
+    Compares the old ast.literal_eval of the /api/python payload against
+    json.loads and the streaming jsonstream parser. Uses a synthetic report
+    unless you hand it a recorded one (testReport/api/json output) with -r.
+
+    python3 bench/bench_testreport.py -n 20000
+    python3 bench/bench_testreport.py -r recorded-report.json
+"""
+import argparse
+import ast
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jsonstream
+
+CHUNK_SIZE = 65536
+
+
+def synthetic_report(cases, fail_rate=0.02, seed=42):
+    """Builds a testReport shaped dict with cases spread over suites of 200"""
+    rng = random.Random(seed)
+    suites = []
+    counts = {'PASSED': 0, 'FAILED': 0, 'SKIPPED': 0}
+    for suite_no in range(0, cases, 200):
+        suite_cases = []
+        for case_no in range(suite_no, min(suite_no + 200, cases)):
+            roll = rng.random()
+            status = 'FAILED' if roll < fail_rate else 'SKIPPED' if roll < fail_rate * 2 else 'PASSED'
+            counts[status] += 1
+            suite_cases.append({
+                "age": 0,
+                "className": f"com.example.module{suite_no // 200}.SomeTest",
+                "duration": round(rng.random(), 3),
+                "errorDetails": "expected:<1> but was:<2>" if status == 'FAILED' else None,
+                "errorStackTrace": ("java.lang.AssertionError\n" + "\tat com.example.Thing.method(Thing.java:42)\n" * 30)
+                                   if status == 'FAILED' else None,
+                "failedSince": 0,
+                "name": f"test_case_{case_no}",
+                "skipped": status == 'SKIPPED',
+                "status": status,
+                "stderr": None,
+                "stdout": "some captured output line\n" * 5,
+            })
+        suites.append({"cases": suite_cases, "duration": 1.0, "id": None,
+                       "name": f"com.example.module{suite_no // 200}.SomeTest", "timestamp": None})
+    return {"_class": "hudson.tasks.junit.TestResult", "duration": 123.4, "empty": False,
+            "failCount": counts['FAILED'], "passCount": counts['PASSED'],
+            "skipCount": counts['SKIPPED'], "suites": suites}
+
+
+def chunked(data, size=CHUNK_SIZE):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<32} {elapsed * 1000:>10.1f} ms {peak / (1024 * 1024):>10.1f} MB   {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="bench_testreport.py",
+                                     description="Test report parse benchmark")
+    parser.add_argument("-n", "--cases", dest="cases", type=int, default=20000,
+                        help="Number of cases in the synthetic report")
+    parser.add_argument("-r", "--report", dest="report", default=None,
+                        help="Recorded testReport/api/json file to use instead")
+    opts = parser.parse_args()
+
+    if opts.report:
+        with open(opts.report, 'rb') as report_file:
+            json_bytes = report_file.read()
+        report = json.loads(json_bytes)
+    else:
+        report = synthetic_report(opts.cases)
+        json_bytes = json.dumps(report).encode("utf-8")
+    # What /api/python hands back is a python literal
+    python_text = repr(report)
+    del report
+
+    print(f"json payload {len(json_bytes) / (1024 * 1024):.1f} MB, "
+          f"python payload {len(python_text) / (1024 * 1024):.1f} MB\n")
+    print(f"{'parser':<32} {'time':>13} {'peak mem':>13}   result")
+
+    measure("ast.literal_eval (api/python)",
+            lambda: ast.literal_eval(python_text)["failCount"])
+    measure("json.loads (api/json)",
+            lambda: json.loads(json_bytes)["failCount"])
+    measure("jsonstream, all cases",
+            lambda: sum(1 for _ in jsonstream.iter_test_cases(jsonstream.iter_text(chunked(json_bytes)))))
+    measure("jsonstream, failures only",
+            lambda: sum(1 for _ in jsonstream.iter_test_cases(jsonstream.iter_text(chunked(json_bytes)),
+                                                              only_failed=True)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,980 @@
+#!/usr/bin/env python3
+"""
+    fakejenkins.py - A stand-in Jenkins to point the tools at
+
+    Serves synthetic (or recorded) versions of the endpoints the tools read:
+    wfapi/runs and wfapi/describe, api/json and api/python for jobs and
+    builds, testReport, fingerprints/, consoleText (with Range),
+    logText/progressiveText and config.xml, plus crumbIssuer with --crumbs.
+    Any job name works, the data is made up from the job name and build
+    number so it's the same every time. tree= filters are applied, so byte
+    counts are close to what a real Jenkins would send.
+
+    Latency, bandwidth, payload sizes and failures are all knobs, and --notes
+    hides a console note before every log line, stripped from progressiveText
+    like Jenkins does, so X-Text-Size runs ahead of the text. /_stats has
+    request and byte counts and the most requests answered at once, /_reset
+    zeroes them.
+
+    python3 bench/fakejenkins.py -P 8080 --latency 0.05
+    python3 bench/fakejenkins.py --fixtures recorded/ --fail-rate 0.05
+
+    Recorded fixtures are files laid out like the url paths, e.g.
+    recorded/job/big-pipeline/wfapi/runs, grabbed with curl -o. They win over
+    the synthetic data, anything not recorded falls back to it.
+
+    Then a janky.cfg with server: http://127.0.0.1:8080 (any uname and token).
+"""
+import argparse
+import functools
+import gzip
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# The subjob's build numbers are the upstream's plus this, so mixing the two up shows
+SUB_OFFSET = 1000
+# Piece size for --chunked bodies
+CHUNK_SIZE = 16384
+# What a console note looks like in the log on disk, e.g. a hyperlink
+NOTE = b'\x1b[8mha:////4Dx7c2VyaWFsaXplZCBjb25zb2xlIG5vdGU=\x1b[0m'
+NOTES = re.compile(rb'\x1b\[8mha:[A-Za-z0-9+/=]*\x1b\[0m')
+
+# What the crumb issuer hands out when there is one
+CRUMB = 'c0ffee'
+
+PERMALINKS = ('lastBuild', 'lastCompletedBuild', 'lastSuccessfulBuild', 'lastFailedBuild')
+
+# (name, parameter definition class, default, choices)
+PARAMETERS = [
+    ('GIT_BRANCH', 'StringParameterDefinition', 'main', None),
+    ('DEPLOY', 'BooleanParameterDefinition', False, None),
+    ('TARGET', 'ChoiceParameterDefinition', 'staging', ['staging', 'prod', 'dev']),
+    ('NOTES', 'TextParameterDefinition', '', None),
+]
+
+# result: (wfapi status, weight)
+RESULTS = {'SUCCESS': ('SUCCESS', 80), 'UNSTABLE': ('UNSTABLE', 12),
+           'FAILURE': ('FAILED', 6), 'ABORTED': ('ABORTED', 2)}
+
+JOB_PATH = re.compile(r'^((?:/job/[^/]+)+)(/.*)?$')
+BUILD_PATH = re.compile(r'^/(\d+|' + '|'.join(PERMALINKS) + r')(/.*)$')
+QUEUE_ITEM_PATH = re.compile(r'^/queue/item/(\d+)/api/(?:json|python)$')
+RANGE = re.compile(r'bytes=(\d*)-(\d*)$')
+TREE_FIELD = re.compile(r'([^,\[\]{}]*)')
+
+
+def parse_tree(text):
+    """
+    Parses a Jenkins tree= filter, 'a,b[c,d[e]]{0,5}'
+
+    Returns:
+        dict of field name to (subtree or None, (first, last) or None)
+    """
+    return _parse_fields(text, 0)[0]
+
+
+def _parse_fields(text, pos):
+    """Fields up to the closing ], returns (tree, position after it)"""
+    tree = {}
+    while pos < len(text):
+        match = TREE_FIELD.match(text, pos)
+        name = match.group(1).strip()
+        pos = match.end()
+        subtree = None
+        bounds = None
+        if text.startswith('[', pos):
+            (subtree, pos) = _parse_fields(text, pos + 1)
+        if text.startswith('{', pos):
+            end = text.index('}', pos)
+            bounds = parse_bounds(text[pos + 1:end])
+            pos = end + 1
+        if name:
+            tree[name] = (subtree, bounds)
+        if text.startswith(']', pos):
+            return (tree, pos + 1)
+        pos += 1
+    return (tree, pos)
+
+
+def parse_bounds(text):
+    """{M,N} is M up to N, {M,} M onwards, {,N} up to N, {N} just N"""
+    if ',' not in text:
+        return (int(text), int(text) + 1)
+    (first, last) = text.split(',', 1)
+    return (int(first) if first else 0, int(last) if last else None)
+
+
+def apply_tree(value, tree):
+    """Keeps only what tree asks for, the way Jenkins does"""
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [apply_tree(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    kept = {}
+    if '_class' in value:
+        kept['_class'] = value['_class']
+    for (name, (subtree, bounds)) in tree.items():
+        if name not in value:
+            continue
+        field = value[name]
+        if bounds is not None and isinstance(field, list):
+            field = field[bounds[0]:bounds[1]]
+        kept[name] = apply_tree(field, subtree)
+    return kept
+
+
+def seeded(seed, *parts):
+    """A Random that gives the same numbers for the same job/build/whatever"""
+    return random.Random(zlib.crc32('#'.join(str(part) for part in parts).encode()) ^ seed)
+
+
+@functools.lru_cache(maxsize=32)
+def console_text(seed, jobname, number, lines, result):
+    """The whole console of a build, an ERROR line now and then to grep for"""
+    rng = seeded(seed, jobname, number, 'console')
+    out = []
+    append = out.append
+    append(b'Started by upstream project\n')
+    for line in range(lines):
+        if line % 499 == 498:
+            append(b'ERROR: step %d failed to frobnicate %08x\n' % (line, rng.getrandbits(32)))
+        elif line % 97 == 96:
+            append(b'WARNING: step %d is deprecated, use something else\n' % line)
+        else:
+            append(b'[%7.3f] step %d: doing stuff with item %d of the batch\n'
+                   % (line * 0.013, line, rng.randint(0, 99999)))
+    if result:
+        append(b'Finished: ' + result.encode() + b'\n')
+    return b''.join(out)
+
+
+@functools.lru_cache(maxsize=32)
+def noted_console(seed, jobname, number, lines, result):
+    """The console as it is on disk, a note in front of every line"""
+    text = console_text(seed, jobname, number, lines, result)
+    return b''.join(NOTE + line for line in text.splitlines(keepends=True))
+
+
+@functools.lru_cache(maxsize=256)
+def failing_cases(seed, jobname, number, cases, fail_pct):
+    """Which cases fail in a build, the same few every build plus some flakes"""
+    always = seeded(seed, jobname, 'broken')
+    rng = seeded(seed, jobname, number, 'flakes')
+    failures = int(cases * fail_pct / 100)
+    broken = set(always.sample(range(cases), min(cases, failures // 2)))
+    return frozenset(broken | set(rng.sample(range(cases), min(cases, failures - len(broken)))))
+
+
+def case_status(case_no, failing):
+    if case_no in failing:
+        return 'FAILED'
+    if case_no % 97 == 13:
+        return 'SKIPPED'
+    return 'PASSED'
+
+
+def test_counts(seed, jobname, number, cases, fail_pct):
+    """(failCount, skipCount) without making the whole report"""
+    failing = failing_cases(seed, jobname, number, cases, fail_pct)
+    skipped = sum(1 for case_no in range(13, cases, 97) if case_no not in failing)
+    return (len(failing), skipped)
+
+
+@functools.lru_cache(maxsize=32)
+def test_report(seed, jobname, number, cases, fail_pct):
+    """A testReport/api/json dict"""
+    rng = seeded(seed, jobname, number, 'report')
+    failing = failing_cases(seed, jobname, number, cases, fail_pct)
+
+    suites = []
+    counts = {'PASSED': 0, 'FAILED': 0, 'SKIPPED': 0}
+    for case_no in range(cases):
+        if case_no % 50 == 0:
+            suite = f'com.example.suite{case_no // 50}'
+            suites.append({'name': suite, 'duration': 0.0, 'cases': []})
+        status = case_status(case_no, failing)
+        counts[status] += 1
+        failed = status == 'FAILED'
+        suites[-1]['cases'].append({
+            'className': f'{suite}.Class{(case_no % 50) // 10}',
+            'name': f'test_thing_{case_no}',
+            'status': status,
+            'duration': round(rng.random(), 3),
+            'errorDetails': f'expected {case_no} but was {case_no + 1}' if failed else None,
+            'errorStackTrace': (f'java.lang.AssertionError: expected {case_no}\n'
+                                f'\tat {suite}.Class{(case_no % 50) // 10}.test_thing_{case_no}(Test.java:{case_no})\n'
+                                '\tat java.base/jdk.internal.reflect.Method.invoke(Method.java:77)\n'
+                                if failed else None),
+            'skipped': status == 'SKIPPED',
+            'stdout': None,
+        })
+    return {'_class': 'hudson.tasks.junit.TestResult', 'duration': 12.5, 'empty': False,
+            'passCount': counts['PASSED'], 'failCount': counts['FAILED'],
+            'skipCount': counts['SKIPPED'], 'suites': suites}
+
+
+class FakeJenkins():
+    """The made up Jenkins, everything but the http"""
+
+    def __init__(self, builds=30, running=1, runs=10, stages=12, cases=2000, fail_pct=2.0,
+                 artifacts=20, console_lines=20000, stream_step=262144, upstream='big-pipeline',
+                 subjob='sub-job', latency=0.0, jitter=0.0, bandwidth=0, fail_rate=0.0,
+                 fail_status=503, drop_rate=0.0, cut_rate=0.0, compress=True, fixtures=None, queue_wait=2.0,
+                 build_time=5.0, crumbs=False, notes=False, chunked=False, seed=1):
+        """
+        :param builds: builds per job
+        :param running: how many of the newest builds are still going
+        :param runs: runs wfapi/runs hands back
+        :param cases: test cases per report
+        :param fail_pct: percent of test cases failing
+        :param artifacts: fingerprinted files per build
+        :param console_lines: console lines per build
+        :param stream_step: bytes a running build's console grows per progressiveText poll
+        :param upstream: job whose builds kick off subjob
+        :param subjob: downstream job, its builds' causes point at upstream
+        :param latency: seconds added to every request
+        :param jitter: up to this many more seconds, at random
+        :param bandwidth: KB/s to trickle responses out at, 0 for no limit
+        :param fail_rate: fraction of requests answered with fail_status
+        :param drop_rate: fraction of requests where the connection just closes
+        :param cut_rate: fraction of requests where the connection closes halfway through the body
+        :param compress: gzip responses for clients that ask
+        :param fixtures: directory of recorded responses, laid out like the urls
+        :param queue_wait: seconds a launched build sits in the queue before it starts
+        :param build_time: seconds a launched build runs for
+        :param crumbs: serve a crumbIssuer and turn away POSTs without the crumb
+        :param notes: console notes in the log, stripped from progressiveText
+        :param chunked: send bodies chunked, no Content-Length, like Jenkins does for big ones
+        """
+        self.builds = builds
+        self.running = running
+        self.runs = runs
+        self.stages = stages
+        self.cases = cases
+        self.fail_pct = fail_pct
+        self.artifacts = artifacts
+        self.console_lines = console_lines
+        self.stream_step = stream_step
+        self.upstream = upstream
+        self.subjob = subjob
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.drop_rate = drop_rate
+        self.cut_rate = cut_rate
+        self.compress = compress
+        self.fixtures = fixtures
+        self.queue_wait = queue_wait
+        self.build_time = build_time
+        self.crumbs = crumbs
+        self.notes = notes
+        self.chunked = chunked
+        self.seed = seed
+        self.now = int(time.time() * 1000)
+
+        self.lock = threading.Lock()
+        self.faults = random.Random(seed)
+        self.in_flight = 0
+        self.configs = {}
+        self.jobs = {}
+        # Launched builds, queue id: item, how many each job has had and
+        # when they started
+        self.queue = {}
+        self.launched = {}
+        self.begun = {}
+        self.reset()
+
+    def reset(self):
+        """Zeroes the stats and starts running builds' consoles over"""
+        with self.lock:
+            self.progress = {}
+            self.stats = {'requests': 0, 'bytes': 0, 'endpoints': {}, 'statuses': {},
+                          'failed': 0, 'dropped': 0, 'cut': 0, 'peak_in_flight': 0}
+
+    def snapshot(self):
+        """A copy of the stats"""
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+    def count(self, path, status, size):
+        kind = endpoint_kind(path)
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += size
+            endpoint = self.stats['endpoints'].setdefault(kind, [0, 0])
+            endpoint[0] += 1
+            endpoint[1] += size
+            self.stats['statuses'][str(status)] = self.stats['statuses'].get(str(status), 0) + 1
+
+    def arrive(self):
+        """A request's being answered, keeps track of how many at once at most"""
+        with self.lock:
+            self.in_flight += 1
+            self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.in_flight)
+
+    def depart(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def fault(self):
+        """None, 'fail', 'drop' or 'cut' for the next request"""
+        with self.lock:
+            roll = self.faults.random()
+            if roll < self.drop_rate:
+                self.stats['dropped'] += 1
+                return 'drop'
+            if roll < self.drop_rate + self.fail_rate:
+                self.stats['failed'] += 1
+                return 'fail'
+            if roll < self.drop_rate + self.fail_rate + self.cut_rate:
+                self.stats['cut'] += 1
+                return 'cut'
+        return None
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def throttle(self, size):
+        if self.bandwidth:
+            time.sleep(size / (self.bandwidth * 1024))
+
+    # The jobs and builds
+
+    def numbers(self, jobname):
+        """Build numbers of a job, oldest first"""
+        offset = SUB_OFFSET if jobname == self.subjob else 0
+        return range(offset + 1, offset + self.builds + self.launched.get(jobname, 0) + 1)
+
+    def resolve(self, jobname, number):
+        """Build number for a number or permalink, None if there's no such build"""
+        numbers = self.numbers(jobname)
+        finished = [n for n in numbers if not self.building(jobname, n)]
+        if number == 'lastBuild':
+            return numbers[-1] if numbers else None
+        if number in ('lastCompletedBuild', 'lastSuccessfulBuild', 'lastFailedBuild'):
+            wanted = {'lastSuccessfulBuild': ('SUCCESS',), 'lastFailedBuild': ('FAILURE',)}.get(number)
+            for n in reversed(finished):
+                if wanted is None or self.result(jobname, n) in wanted:
+                    return n
+            return None
+        number = int(number)
+        return number if number in numbers else None
+
+    def building(self, jobname, number):
+        if (jobname, number) in self.begun:
+            return time.time() - self.begun[(jobname, number)] < self.build_time
+        offset = SUB_OFFSET if jobname == self.subjob else 0
+        return number > offset + self.builds - self.running
+
+    def result(self, jobname, number):
+        if self.building(jobname, number):
+            return None
+        rng = seeded(self.seed, jobname, number, 'result')
+        return rng.choices(list(RESULTS), [weight for (_, weight) in RESULTS.values()])[0]
+
+    def started(self, jobname, number):
+        """Start time in millis, an hour apart, newest an hour ago"""
+        if (jobname, number) in self.begun:
+            return int(self.begun[(jobname, number)] * 1000)
+        return self.now - (self.numbers(jobname)[-1] - number + 1) * 3600000
+
+    def params(self, jobname, number=None):
+        """name: value for a build, the defaults with a bit of variety"""
+        values = {}
+        rng = seeded(self.seed, jobname, number, 'params')
+        for (name, _, default, choices) in PARAMETERS:
+            if number is None:
+                values[name] = default
+            elif choices:
+                values[name] = rng.choice(choices)
+            elif isinstance(default, bool):
+                values[name] = rng.random() < 0.3
+            elif name == 'GIT_BRANCH':
+                values[name] = rng.choice(['main', 'main', 'release/2.1', f'feature/thing-{number}'])
+            else:
+                values[name] = default
+        return values
+
+    def wfapi_run(self, jobname, number):
+        rng = seeded(self.seed, jobname, number, 'stages')
+        result = self.result(jobname, number)
+        status = RESULTS[result][0] if result else 'IN_PROGRESS'
+        start = self.started(jobname, number)
+        # Where things stopped, a failed stage or the one still going
+        stop = rng.randrange(self.stages) if status in ('FAILED', 'ABORTED', 'IN_PROGRESS') else self.stages
+
+        stages = []
+        offset = start
+        for stage_no in range(self.stages):
+            duration = rng.randint(2000, 300000)
+            if stage_no < stop:
+                stage_status = 'SUCCESS'
+                if status == 'UNSTABLE' and stage_no == self.stages - 1:
+                    stage_status = 'UNSTABLE'
+            elif stage_no == stop:
+                stage_status = status
+            else:
+                stage_status = 'NOT_EXECUTED'
+                duration = 0
+            stages.append({'id': str(10 + stage_no * 7), 'name': f'Stage {stage_no}',
+                           'execNode': '', 'status': stage_status, 'startTimeMillis': offset,
+                           'durationMillis': duration, 'pauseDurationMillis': 0})
+            offset += duration
+        return {'id': str(number), 'name': f'#{number}', 'status': status,
+                'startTimeMillis': start, 'endTimeMillis': offset if result else 0,
+                'durationMillis': offset - start, 'queueDurationMillis': 5,
+                'pauseDurationMillis': 0, 'stages': stages}
+
+    def build_info(self, jobname, number):
+        result = self.result(jobname, number)
+        actions = [{'_class': 'hudson.model.ParametersAction',
+                    'parameters': [{'_class': 'hudson.model.' + cls.replace('Definition', 'Value'),
+                                    'name': name, 'value': value}
+                                   for ((name, cls, _, _), value)
+                                   in zip(PARAMETERS, self.params(jobname, number).values())]}]
+        if jobname == self.subjob:
+            cause = {'_class': 'hudson.model.Cause$UpstreamCause', 'upstreamProject': self.upstream,
+                     'upstreamBuild': number - SUB_OFFSET, 'upstreamUrl': f'job/{self.upstream}/'}
+        else:
+            cause = {'_class': 'hudson.model.Cause$UserIdCause', 'userId': 'someone'}
+        actions.append({'_class': 'hudson.model.CauseAction', 'causes': [cause]})
+        if result:
+            (fail_count, skip_count) = test_counts(self.seed, jobname, number, self.cases, self.fail_pct)
+            actions.append({'_class': 'hudson.tasks.junit.TestResultAction',
+                            'failCount': fail_count, 'skipCount': skip_count,
+                            'totalCount': self.cases, 'urlName': 'testReport'})
+        actions.append({})
+
+        return {'_class': 'org.jenkinsci.plugins.workflow.job.WorkflowRun',
+                'number': number, 'id': str(number), 'url': f'/job/{jobname}/{number}/',
+                'displayName': f'#{number}', 'fullDisplayName': f'{jobname} #{number}',
+                'result': result, 'building': result is None,
+                'duration': 0 if result is None else self.duration(jobname, number),
+                'timestamp': self.started(jobname, number),
+                'actions': actions, 'fingerprint': self.fingerprints(jobname, number)}
+
+    def duration(self, jobname, number):
+        """Millis a finished build took"""
+        return int(self.build_time * 1000) if (jobname, number) in self.begun else 1800000
+
+    def job_info(self, jobname):
+        # Nothing about a job changes while we're up, so it's made once.
+        # Unless builds have been launched, they finish on their own time.
+        if jobname in self.launched:
+            return self.make_job_info(jobname)
+        if jobname not in self.jobs:
+            self.jobs[jobname] = self.make_job_info(jobname)
+        return self.jobs[jobname]
+
+    def make_job_info(self, jobname):
+        builds = [self.build_info(jobname, n) for n in reversed(self.numbers(jobname))]
+        last = builds[0]['number'] if builds else None
+        return {'_class': 'org.jenkinsci.plugins.workflow.job.WorkflowJob',
+                'name': jobname.split('/')[-1], 'fullName': jobname, 'url': f'/job/{jobname}/',
+                'buildable': True, 'color': 'blue_anime' if self.running else 'blue', 'actions': [],
+                'property': [{'_class': 'hudson.model.ParametersDefinitionProperty',
+                              'parameterDefinitions': [parameter_definition(*param) for param in PARAMETERS]}],
+                'builds': builds[:100], 'allBuilds': builds,
+                'lastBuild': {'number': last} if last else None,
+                'nextBuildNumber': (last or 0) + 1}
+
+    def fingerprints(self, jobname, number):
+        rng = seeded(self.seed, jobname, number, 'artifacts')
+        entries = []
+        for artifact in range(self.artifacts):
+            original = {'name': jobname, 'number': number}
+            if artifact == 0 and jobname == self.upstream and number + SUB_OFFSET in self.numbers(self.subjob):
+                original = {'name': self.subjob, 'number': number + SUB_OFFSET}
+            entries.append({'fileName': f'{jobname.split("/")[-1]}-{number}-part{artifact}.tar.gz',
+                            'hash': '%032x' % rng.getrandbits(128), 'original': original,
+                            'timestamp': self.started(jobname, number) + artifact * 1000})
+        return entries
+
+    def fingerprints_page(self, jobname, number):
+        rows = ['<table class="fingerprint-in-build sortable bigtable"><tr><th>File</th>'
+                '<th>Original owner</th><th>Age</th><th></th></tr>']
+        for entry in self.fingerprints(jobname, number):
+            original = entry['original']
+            if original['name'] == jobname and original['number'] == number:
+                owner = 'this build'
+            else:
+                owner = (f'<a href="/job/{original["name"]}/{original["number"]}/">'
+                         f'{original["name"]} #{original["number"]}</a>')
+            age = (self.now - entry['timestamp']) // 3600000
+            rows.append(f'<tr><td><a href="/fingerprint/{entry["hash"]}/">{entry["fileName"]}</a></td>'
+                        f'<td>{owner}</td><td>{age} hr old</td>'
+                        f'<td><a href="/fingerprint/{entry["hash"]}/">more details</a></td></tr>')
+        rows.append('</table>')
+        return ('<html><head><title>Fingerprints</title></head><body><div id="main-panel">'
+                + '\n'.join(rows) + '</div></body></html>').encode()
+
+    def config_xml(self, jobname):
+        if jobname in self.configs:
+            return self.configs[jobname]
+        definitions = []
+        for (name, cls, default, choices) in PARAMETERS:
+            if choices:
+                extra = ('<choices class="java.util.Arrays$ArrayList"><a class="string-array">'
+                         + ''.join(f'<string>{choice}</string>' for choice in choices) + '</a></choices>')
+            else:
+                extra = f'<defaultValue>{str(default).lower() if isinstance(default, bool) else default}</defaultValue>'
+            definitions.append(f'        <hudson.model.{cls}>\n          <name>{name}</name>\n'
+                               f'          <description></description>\n          {extra}\n'
+                               f'        </hudson.model.{cls}>')
+        return ("<?xml version='1.1' encoding='UTF-8'?>\n"
+                '<flow-definition plugin="workflow-job">\n  <description></description>\n'
+                '  <properties>\n    <hudson.model.ParametersDefinitionProperty>\n'
+                '      <parameterDefinitions>\n' + '\n'.join(definitions) + '\n'
+                '      </parameterDefinitions>\n    </hudson.model.ParametersDefinitionProperty>\n'
+                '  </properties>\n  <definition class="org.jenkinsci.plugins.workflow.cps.CpsFlowDefinition">\n'
+                "    <script>node { echo 'hi' }</script>\n  </definition>\n</flow-definition>\n").encode()
+
+    def progressive(self, jobname, number, start):
+        """(body, headers) for progressiveText, running builds grow a step per poll"""
+        result = self.result(jobname, number)
+        make = noted_console if self.notes else console_text
+        full = make(self.seed, jobname, number, self.console_lines, result or 'SUCCESS')
+        size = len(full)
+        if result is None:
+            with self.lock:
+                size = min(len(full), self.progress.get((jobname, number), 0) + self.stream_step)
+                if self.notes:
+                    # Whole lines, never half a note
+                    size = full.rfind(b'\n', 0, size) + 1 or size
+                self.progress[(jobname, number)] = size
+        headers = {'X-Text-Size': str(size), 'Content-Type': 'text/plain;charset=UTF-8'}
+        if size < len(full):
+            headers['X-More-Data'] = 'true'
+        body = full[start:size]
+        return (NOTES.sub(b'', body) if self.notes else body, headers)
+
+    # The queue
+
+    def enqueue(self, jobname):
+        """Queues a build of jobname, returns the queue id"""
+        with self.lock:
+            queue_id = len(self.queue) + 1
+            self.queue[queue_id] = {'id': queue_id, 'job': jobname, 'since': int(time.time() * 1000),
+                                    'number': None}
+            return queue_id
+
+    def queue_item(self, queue_id):
+        """The queue item as Jenkins shows it, the build starts once it's waited queue_wait"""
+        with self.lock:
+            item = self.queue[queue_id]
+            jobname = item['job']
+            waited = time.time() - item['since'] / 1000
+            if item['number'] is None and waited >= self.queue_wait:
+                self.launched[jobname] = self.launched.get(jobname, 0) + 1
+                item['number'] = self.numbers(jobname)[-1]
+                self.begun[(jobname, item['number'])] = time.time()
+
+        entry = {'id': queue_id, 'inQueueSince': item['since'], 'stuck': False, 'blocked': False,
+                 'cancelled': False, 'url': f'queue/item/{queue_id}/',
+                 'task': {'_class': 'org.jenkinsci.plugins.workflow.job.WorkflowJob',
+                          'name': jobname.split('/')[-1], 'url': f'/job/{jobname}/'},
+                 'params': ''.join(f'\n{name}={default}' for (name, _, default, _) in PARAMETERS)}
+        if item['number'] is not None:
+            number = item['number']
+            entry.update({'_class': 'hudson.model.Queue$LeftItem', 'why': None,
+                          'executable': {'_class': 'org.jenkinsci.plugins.workflow.job.WorkflowRun',
+                                         'number': number, 'url': f'/job/{jobname}/{number}/'}})
+        else:
+            # Quiet period first, then waiting on an executor like everybody else
+            entry.update({'_class': 'hudson.model.Queue$WaitingItem', 'buildable': waited >= self.queue_wait / 2,
+                          'why': ('In the quiet period.' if waited < self.queue_wait / 2
+                                  else 'Waiting for next available executor'),
+                          'executable': None})
+        return entry
+
+    # Requests
+
+    def route(self, method, path, query, headers, payload=None):
+        """Answers one request
+
+        Returns:
+            (status, headers dict, body bytes)
+        """
+        tree = parse_tree(query['tree'][0]) if 'tree' in query else None
+        recorded = self.recorded(path)
+        if recorded is not None:
+            if path.endswith('/api/json') and tree is not None:
+                recorded = json.dumps(apply_tree(json.loads(recorded), tree)).encode()
+            return (200, {'Content-Type': content_type(path)}, recorded)
+
+        match = QUEUE_ITEM_PATH.match(path)
+        if match:
+            queue_id = int(match.group(1))
+            if queue_id not in self.queue:
+                return not_found()
+            return self.data(path, apply_tree(self.queue_item(queue_id), tree))
+        if path in ('/queue/api/json', '/queue/api/python'):
+            items = [self.queue_item(queue_id) for queue_id in list(self.queue)]
+            waiting = {'items': [item for item in items if item['_class'].endswith('WaitingItem')]}
+            return self.data(path, apply_tree(waiting, tree))
+
+        if path in ('/crumbIssuer/api/json', '/crumbIssuer/api/python'):
+            if not self.crumbs:
+                return not_found()
+            return self.data(path, apply_tree({'_class': 'hudson.security.csrf.DefaultCrumbIssuer',
+                                               'crumb': CRUMB, 'crumbRequestField': 'Jenkins-Crumb'}, tree))
+        if method == 'POST' and self.crumbs and headers.get('Jenkins-Crumb') != CRUMB:
+            return (403, {'Content-Type': 'text/plain'}, b'No valid crumb was included in the request')
+
+        if path in ('/api/json', '/api/python'):
+            root = {'_class': 'hudson.model.Hudson', 'mode': 'NORMAL', 'useCrumbs': self.crumbs,
+                    # Absolute like the real thing, and jenkinsapi takes anything
+                    # without a color for a folder
+                    'jobs': [{'name': name, 'url': f"http://{headers.get('Host')}/job/{name}/", 'color': 'blue'}
+                             for name in (self.upstream, self.subjob)]}
+            return self.data(path, apply_tree(root, tree))
+
+        match = JOB_PATH.match(path)
+        if not match:
+            return not_found()
+        jobname = '/'.join(unquote(part) for part in match.group(1).split('/job/')[1:])
+        rest = match.group(2) or '/'
+
+        if rest in ('/', '/api/json', '/api/python'):
+            return validated(headers, self.data(rest, apply_tree(self.job_info(jobname), tree)))
+        if rest == '/wfapi/runs':
+            runs = [self.wfapi_run(jobname, n) for n in reversed(self.numbers(jobname))][:self.runs]
+            return validated(headers, (200, {'Content-Type': 'application/json;charset=utf-8'},
+                                       json.dumps(runs).encode()))
+        if rest == '/config.xml':
+            if method == 'POST':
+                self.configs[jobname] = payload
+                return (200, {}, b'')
+            return validated(headers, (200, {'Content-Type': 'application/xml'}, self.config_xml(jobname)))
+        if method == 'POST' and rest in ('/build', '/buildWithParameters'):
+            # jenkinsapi wants the queue url to start with the server url it knows
+            queue_id = self.enqueue(jobname)
+            return (201, {'Location': f"http://{headers.get('Host')}/queue/item/{queue_id}/"}, b'')
+        if method == 'POST':
+            # stop and friends, nothing actually happens
+            return (200, {}, b'')
+
+        match = BUILD_PATH.match(rest)
+        number = self.resolve(jobname, match.group(1)) if match else None
+        if number is None:
+            return not_found()
+        rest = match.group(2)
+        result = self.result(jobname, number)
+
+        if rest in ('/', '/api/json', '/api/python'):
+            return self.data(rest, apply_tree(self.build_info(jobname, number), tree))
+        if rest == '/wfapi/describe':
+            return self.data(rest, self.wfapi_run(jobname, number))
+        if rest in ('/testReport/api/json', '/testReport/api/python'):
+            if result is None:
+                return not_found()
+            report = test_report(self.seed, jobname, number, self.cases, self.fail_pct)
+            return self.data(rest, apply_tree(report, tree))
+        if rest == '/fingerprints/':
+            return (200, {'Content-Type': 'text/html;charset=utf-8'}, self.fingerprints_page(jobname, number))
+        if rest == '/consoleText':
+            full = console_text(self.seed, jobname, number, self.console_lines, result or 'SUCCESS')
+            return ranged(full, headers.get('Range'))
+        if rest == '/logText/progressiveText':
+            (body, text_headers) = self.progressive(jobname, number, int(query.get('start', ['0'])[0]))
+            return (200, text_headers, body)
+        return not_found()
+
+    def recorded(self, path):
+        """The recorded response for path, None if there isn't one"""
+        if not self.fixtures:
+            return None
+        root = os.path.abspath(self.fixtures)
+        name = os.path.normpath(os.path.join(root, unquote(path).strip('/') or 'index'))
+        if not name.startswith(root):
+            return None
+        for candidate in (name, os.path.join(name, 'index'), name + '.json'):
+            if os.path.isfile(candidate):
+                with open(candidate, 'rb') as fixture:
+                    return fixture.read()
+        return None
+
+    def data(self, path, value):
+        """json, or a python literal for api/python"""
+        if path.endswith('/python'):
+            return (200, {'Content-Type': 'text/plain;charset=utf-8'}, repr(value).encode())
+        return (200, {'Content-Type': 'application/json;charset=utf-8'}, json.dumps(value).encode())
+
+
+def parameter_definition(name, cls, default, choices):
+    definition = {'_class': 'hudson.model.' + cls, 'name': name, 'type': cls, 'description': '',
+                  'defaultParameterValue': {'_class': 'hudson.model.' + cls.replace('Definition', 'Value'),
+                                            'name': name, 'value': default}}
+    if choices:
+        definition['choices'] = choices
+    return definition
+
+
+def ranged(full, header):
+    """consoleText answered whole or for a Range: bytes=... header"""
+    match = RANGE.match(header or '')
+    if not match or not (match.group(1) or match.group(2)):
+        return (200, {'Content-Type': 'text/plain;charset=UTF-8', 'Accept-Ranges': 'bytes'}, full)
+    if not full:
+        return (416, {'Content-Range': 'bytes */0'}, b'')
+    if match.group(1):
+        first = int(match.group(1))
+        last = min(len(full) - 1, int(match.group(2))) if match.group(2) else len(full) - 1
+    else:
+        first = max(0, len(full) - int(match.group(2)))
+        last = len(full) - 1
+    if first >= len(full):
+        return (416, {'Content-Range': f'bytes */{len(full)}'}, b'')
+    return (206, {'Content-Type': 'text/plain;charset=UTF-8',
+                  'Content-Range': f'bytes {first}-{last}/{len(full)}'}, full[first:last + 1])
+
+
+def validated(headers, response):
+    """Puts an ETag on a response, and makes it a 304 if the client has it already"""
+    (status, response_headers, body) = response
+    etag = '"%08x"' % zlib.crc32(body)
+    if headers.get('If-None-Match') == etag:
+        return (304, {'ETag': etag}, b'')
+    response_headers['ETag'] = etag
+    return (status, response_headers, body)
+
+
+def not_found():
+    return (404, {'Content-Type': 'text/html'}, b'<html><body>Not found</body></html>')
+
+
+def content_type(path):
+    if path.endswith('/json') or path.endswith('/wfapi/runs'):
+        return 'application/json;charset=utf-8'
+    if path.endswith('.xml'):
+        return 'application/xml'
+    if path.endswith('/'):
+        return 'text/html;charset=utf-8'
+    return 'text/plain;charset=utf-8'
+
+
+def endpoint_kind(path):
+    """What /_stats groups requests under"""
+    for kind in ('wfapi/runs', 'testReport', 'fingerprints', 'consoleText', 'progressiveText', 'config.xml',
+                 'queue'):
+        if kind in path:
+            return kind
+    match = JOB_PATH.match(path)
+    if match and (path.endswith('/api/json') or path.endswith('/api/python')):
+        return 'build api' if BUILD_PATH.match(match.group(2) or '') else 'job api'
+    return 'other'
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeJenkins'
+    # Headers and body in one write and no Nagle, or small responses sit
+    # out a delayed ACK and every request looks 40ms slower than it is
+    wbufsize = 65536
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self.answer('GET')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.answer('POST', self.rfile.read(length) if length else b'')
+
+    def answer(self, method, payload=None):
+        fake = self.server.fake
+        url = urlsplit(self.path)
+
+        if url.path == '/_stats':
+            return self.send(200, {'Content-Type': 'application/json'}, json.dumps(fake.snapshot()).encode())
+        if url.path == '/_reset':
+            fake.reset()
+            return self.send(200, {}, b'')
+
+        fake.arrive()
+        try:
+            return self.respond(fake, method, url, payload)
+        finally:
+            fake.depart()
+
+    def respond(self, fake, method, url, payload):
+        fault = fake.fault()
+        fake.delay()
+        if fault == 'drop':
+            # Hang up without a word, like a proxy timing out
+            self.close_connection = True
+            fake.count(url.path, 0, 0)
+            return None
+        if fault == 'fail':
+            (status, headers, body) = (fake.fail_status, {'Retry-After': '0'}, b'')
+        else:
+            (status, headers, body) = fake.route(method, url.path, parse_qs(url.query), self.headers, payload)
+
+        if (fake.compress and len(body) > 1024 and status == 200
+                and 'gzip' in self.headers.get('Accept-Encoding', '')):
+            # Level 1, the client's cost of reading it is the same and the server stays out of the way
+            body = gzip.compress(body, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+        fake.throttle(len(body))
+        fake.count(url.path, status, len(body))
+        return self.send(status, headers, body, cut=fault == 'cut')
+
+    def send(self, status, headers, body, cut=False):
+        chunked = self.server.fake.chunked and body and self.command != 'HEAD'
+        self.send_response(status)
+        for (name, value) in headers.items():
+            self.send_header(name, value)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if cut:
+            # Half the body, then hang up
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        if self.command == 'HEAD':
+            return
+        if not chunked:
+            self.wfile.write(body)
+            return
+        for start in range(0, len(body), CHUNK_SIZE):
+            piece = body[start:start + CHUNK_SIZE]
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(piece), piece))
+        if not cut:
+            self.wfile.write(b'0\r\n\r\n')
+
+
+class FakeJenkinsServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The tools open a pool's worth of connections at once, don't drop any SYNs
+    request_queue_size = 128
+
+    def __init__(self, address, fake, verbose=False):
+        super().__init__(address, FakeHandler)
+        self.fake = fake
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+
+def start_server(fake, host='127.0.0.1', port=0, verbose=False):
+    """Serves fake from a background thread, port 0 picks a free one
+
+    Returns:
+        The server, shut it down with server.shutdown()
+    """
+    server = FakeJenkinsServer((host, port), fake, verbose)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_server_options(parser):
+    """The knobs, shared with bench_e2e.py"""
+    parser.add_argument("--builds", dest="builds", type=int, default=30,
+                        help="Builds per job")
+    parser.add_argument("--running", dest="running", type=int, default=1,
+                        help="How many of the newest builds are still going")
+    parser.add_argument("--runs", dest="runs", type=int, default=10,
+                        help="Runs wfapi/runs hands back")
+    parser.add_argument("--stages", dest="stages", type=int, default=12,
+                        help="Stages per run")
+    parser.add_argument("--cases", dest="cases", type=int, default=2000,
+                        help="Test cases per report")
+    parser.add_argument("--fail-pct", dest="fail_pct", type=float, default=2.0,
+                        help="Percent of test cases failing")
+    parser.add_argument("--artifacts", dest="artifacts", type=int, default=20,
+                        help="Fingerprinted files per build")
+    parser.add_argument("--console-lines", dest="console_lines", type=int, default=20000,
+                        help="Console lines per build")
+    parser.add_argument("--stream-step", dest="stream_step", type=int, default=262144,
+                        help="Bytes a running build's console grows per progressiveText poll")
+    parser.add_argument("--upstream", dest="upstream", default="big-pipeline",
+                        help="Job that kicks off the subjob")
+    parser.add_argument("--subjob", dest="subjob", default="sub-job",
+                        help="Downstream job")
+    parser.add_argument("--latency", dest="latency", type=float, default=0.0,
+                        help="Seconds added to every request")
+    parser.add_argument("--jitter", dest="jitter", type=float, default=0.0,
+                        help="Up to this many more seconds per request, at random")
+    parser.add_argument("--bandwidth", dest="bandwidth", type=float, default=0,
+                        help="KB/s to send responses at, 0 for no limit")
+    parser.add_argument("--fail-rate", dest="fail_rate", type=float, default=0.0,
+                        help="Fraction of requests answered with --fail-status")
+    parser.add_argument("--fail-status", dest="fail_status", type=int, default=503,
+                        help="Status for failed requests")
+    parser.add_argument("--drop-rate", dest="drop_rate", type=float, default=0.0,
+                        help="Fraction of requests where the connection just closes")
+    parser.add_argument("--cut-rate", dest="cut_rate", type=float, default=0.0,
+                        help="Fraction of requests where the connection closes halfway through the body")
+    parser.add_argument("--no-gzip", dest="compress", action="store_false", default=True,
+                        help="Don't gzip responses")
+    parser.add_argument("--fixtures", dest="fixtures",
+                        help="Directory of recorded responses, laid out like the urls")
+    parser.add_argument("--queue-wait", dest="queue_wait", type=float, default=2.0,
+                        help="Seconds a launched build waits in the queue")
+    parser.add_argument("--build-time", dest="build_time", type=float, default=5.0,
+                        help="Seconds a launched build runs for")
+    parser.add_argument("--crumbs", dest="crumbs", action="store_true", default=False,
+                        help="Have a crumb issuer and want the crumb on POSTs")
+    parser.add_argument("--notes", dest="notes", action="store_true", default=False,
+                        help="Console notes in the log, stripped from progressiveText")
+    parser.add_argument("--chunked", dest="chunked", action="store_true", default=False,
+                        help="Send bodies chunked instead of with a Content-Length")
+    parser.add_argument("--seed", dest="seed", type=int, default=1,
+                        help="Seed for the made up data and the failures")
+
+
+def fake_from_options(opts):
+    return FakeJenkins(builds=opts.builds, running=opts.running, runs=opts.runs, stages=opts.stages,
+                       cases=opts.cases, fail_pct=opts.fail_pct, artifacts=opts.artifacts,
+                       console_lines=opts.console_lines, stream_step=opts.stream_step,
+                       upstream=opts.upstream, subjob=opts.subjob, latency=opts.latency,
+                       jitter=opts.jitter, bandwidth=opts.bandwidth, fail_rate=opts.fail_rate,
+                       fail_status=opts.fail_status, drop_rate=opts.drop_rate, cut_rate=opts.cut_rate,
+                       compress=opts.compress, fixtures=opts.fixtures, queue_wait=opts.queue_wait,
+                       build_time=opts.build_time, crumbs=opts.crumbs, notes=opts.notes,
+                       chunked=opts.chunked, seed=opts.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="fakejenkins.py",
+                                     description="Fake Jenkins server for benchmarks")
+    parser.add_argument("-H", "--host", dest="host", default="127.0.0.1",
+                        help="Address to listen on")
+    parser.add_argument("-P", "--port", dest="port", type=int, default=8080,
+                        help="Port to listen on")
+    parser.add_argument("-v", "--verbose", dest="verbose", action="store_true", default=False,
+                        help="Log every request")
+    add_server_options(parser)
+    opts = parser.parse_args()
+
+    server = FakeJenkinsServer((opts.host, opts.port), fake_from_options(opts), opts.verbose)
+    print(f"Fake Jenkins at {server.url}, jobs {opts.upstream} and {opts.subjob} (or any name)")
+    print(f"janky.cfg:\n[fake]\nuname: me\ntoken: whatever\nserver: {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+'''
+    consolestream
+    Follows a build's console through logText/progressiveText, keeping track of
+    the byte offset Jenkins hands back in X-Text-Size. That's an offset into the
+    log on disk, console notes and all, and the text that comes back has the
+    notes stripped, so it can't be worked out from what we got. A dropped
+    connection means asking again from the last offset Jenkins confirmed and
+    skipping the text that already got printed, the same offset always renders
+    to the same text. Only the dropped poll gets downloaded twice, not the whole
+    console.
+
+    Polling speeds up while output is flowing and backs off when the build goes
+    quiet. Bytes go straight to a big buffered writer, one flush per poll.
+
+    Also home to the console grep and tail, which work on the same stream of
+    bytes without ever holding the whole console.
+'''
+import codecs
+import io
+import logging
+import random
+import re
+import sys
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL = 0.25
+MAX_INTERVAL = 10.0
+MAX_FAILURES = 5
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def stdout_writer(buffer_size=WRITE_BUFFER_SIZE):
+    """A big buffered binary writer on top of stdout's file descriptor"""
+    sys.stdout.flush()
+    raw = io.FileIO(sys.stdout.fileno(), 'wb', closefd=False)
+    return io.BufferedWriter(raw, buffer_size=buffer_size)
+
+
+class TextTranscoder():
+    """
+        Takes console bytes, hands text to a text stream like sys.stdout.
+        Decodes incrementally, so a character split across chunks comes out
+        whole and bad bytes turn into U+FFFD instead of blowing up.
+    """
+
+    def __init__(self, stream, encoding="utf-8"):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+
+    def write(self, data):
+        text = self.decoder.decode(data)
+        if text:
+            self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        """Writes out anything the decoder was still holding on to"""
+        self.stream.write(self.decoder.decode(b'', final=True))
+        self.stream.flush()
+
+
+class ConsoleStreamer():
+
+    def __init__(self, light, jobname, number, out=None, start=0,
+                 min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, max_failures=MAX_FAILURES):
+        """
+        :param light: JenkinsLight to fetch with
+        :param jobname: Name of the Jenkins job, /job/ separated if in a folder
+        :param number: Build number
+        :param out: binary writer, defaults to a buffered writer on stdout
+        :param start: byte offset to start from, 0 for the whole console
+        :param min_interval: seconds between polls while output is flowing
+        :param max_interval: seconds between polls when the build is quiet
+        :param max_failures: failed polls in a row before giving up
+        """
+        self.light = light
+        self.jobname = jobname
+        self.number = number
+        self.out = out
+        self.offset = start
+        # Text passed on since offset, and how much of a retry has come back so far
+        self.written = 0
+        self.received = 0
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_failures = max_failures
+
+    def write(self, data):
+        """Passes data on to out, minus what a poll that dropped already passed on"""
+        self.received += len(data)
+        fresh = self.received - self.written
+        if fresh > 0:
+            self.out.write(data[-fresh:])
+            self.written = self.received
+
+    def run(self):
+        """Streams until Jenkins says there's no more data coming
+
+        Returns:
+            The final byte offset, i.e. the size of the console
+        """
+        if self.out is None:
+            self.out = stdout_writer()
+
+        interval = self.min_interval
+        failures = 0
+        try:
+            while True:
+                before = self.offset
+                self.received = 0
+                try:
+                    (size, more_data) = self.light.copy_progressive_text(self.jobname, self.number,
+                                                                         self.offset, self)
+                except Exception as e:
+                    failures += 1
+                    if failures > self.max_failures:
+                        raise
+                    self.out.flush()
+                    wait = min(self.max_interval, 2 ** (failures - 1)) * random.uniform(0.5, 1.5)
+                    logger.warning("Console stream interrupted after byte %d (%s), retrying in %.1fs",
+                                   self.offset, e, wait)
+                    time.sleep(wait)
+                    continue
+
+                failures = 0
+                self.out.flush()
+                # Jenkins says where the next read starts, what we got can't
+                self.offset = max(self.offset, size)
+                self.written = 0
+
+                if not more_data:
+                    break
+
+                # Flowing: poll again soon. Quiet: back off, up to max_interval.
+                if self.offset > before:
+                    interval = self.min_interval
+                else:
+                    interval = min(self.max_interval, interval * 2)
+                time.sleep(interval)
+        finally:
+            self.out.flush()
+
+        return self.offset
+
+
+class ConsoleGrep():
+    """
+        Writer that greps the console bytes going through it, printing matches
+        grep -n style: "12:matched line", "11-context line" and "--" between
+        groups that aren't next to each other.
+
+        Chunks with no match get checked with one regex search over the whole
+        chunk, only the chunks that hit are split into lines. Memory is one
+        chunk plus the before-context lines.
+    """
+
+    def __init__(self, pattern, context=0, ignore_case=False, emit=print):
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        self.regex = re.compile(pattern.encode("utf-8"), flags)
+        self.context = context
+        self.emit = emit
+        self.before = deque(maxlen=context or None)
+        self.after = 0
+        self.partial = b''
+        self.line_no = 0
+        self.last_printed = 0
+        self.matches = 0
+
+    def write(self, data):
+        data = self.partial + data
+        cut = data.rfind(b'\n')
+        if cut < 0:
+            self.partial = data
+            return
+        self.partial = data[cut + 1:]
+        self._scan(data[:cut + 1])
+
+    def close(self):
+        """Checks the last line if the console didn't end with a newline"""
+        if self.partial:
+            self._line(self.partial)
+            self.partial = b''
+
+    def _scan(self, block):
+        if self.after or self.regex.search(block):
+            for line in block[:-1].split(b'\n'):
+                self._line(line)
+            return
+
+        # Nothing in here. Count the lines, remember the last few for context.
+        count = block.count(b'\n')
+        if self.context:
+            tail = block[:-1].rsplit(b'\n', self.context)
+            if count > self.context:
+                tail = tail[1:]
+            first = self.line_no + count - len(tail) + 1
+            for (offset, line) in enumerate(tail):
+                self.before.append((first + offset, line))
+        self.line_no += count
+
+    def _line(self, line):
+        self.line_no += 1
+        if self.regex.search(line):
+            self.matches += 1
+            first = self.before[0][0] if self.before else self.line_no
+            if self.context and self.last_printed and first > self.last_printed + 1:
+                self.emit("--")
+            for (number, text) in self.before:
+                self._print(number, '-', text)
+            self.before.clear()
+            self._print(self.line_no, ':', line)
+            self.after = self.context
+        elif self.after:
+            self._print(self.line_no, '-', line)
+            self.after -= 1
+        elif self.context:
+            self.before.append((self.line_no, line))
+
+    def _print(self, number, separator, line):
+        text = line.rstrip(b'\r').decode("utf-8", errors="replace")
+        self.emit(f"{number}{separator}{text}")
+        self.last_printed = number
+
+
+def tail_console(light, jobname, number, lines):
+    """
+        Gets the last lines of a build's console. Asks Jenkins for just the end
+        of it with a Range request, growing the window until it has enough
+        lines. If the server ignores Range the whole console streams past once
+        and only the end is kept.
+
+        Returns:
+            List of decoded lines, at most lines long
+    """
+    window = max(65536, lines * 256)
+    while True:
+        (data, truncated, ranged) = light.get_console_tail(jobname, number, window)
+        if truncated:
+            # The first line is probably cut off partway
+            data = data[data.find(b'\n') + 1:]
+        if data.count(b'\n') >= lines or not truncated or not ranged:
+            break
+        window *= 4
+
+    text = data.decode("utf-8", errors="replace")
+    return text.splitlines()[-lines:] if lines else []
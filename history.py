@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+"""
+history - Local build history for janky and friends
+
+Keeps runs, stages, test counts, per-case results and fingerprints in a
+SQLite file so the tools don't have to ask Jenkins about builds they've
+already seen. `sync` only fetches runs newer than what's stored (plus any that
+were still going last time), everything else is a local query.
+
+    python3 history.py sync -j big-pipeline-job --cases
+    python3 history.py stages -j big-pipeline-job -l 50
+    python3 history.py failures -j big-pipeline-job
+
+stage-view.py and pigsig.py take --history to sync and render from here.
+
+Filename: history.py
+
+Author: Michael Grundy <grundyisland@gmail.com>
+Copyright (c) 2022-2026 Michael Grundy
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import argparse
+import configparser
+import json
+import os
+import sqlite3
+
+from responsecache import default_cache_dir, is_terminal
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    server TEXT NOT NULL,
+    job TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT,
+    status TEXT,
+    start_ms INTEGER,
+    duration_ms INTEGER,
+    pass_count INTEGER,
+    fail_count INTEGER,
+    skip_count INTEGER,
+    data TEXT,
+    fingerprints_fetched INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (server, job, id)
+);
+CREATE TABLE IF NOT EXISTS stages (
+    server TEXT NOT NULL,
+    job TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    stage_no INTEGER NOT NULL,
+    name TEXT,
+    status TEXT,
+    start_ms INTEGER,
+    duration_ms INTEGER,
+    PRIMARY KEY (server, job, run_id, stage_no)
+);
+CREATE INDEX IF NOT EXISTS stages_by_name ON stages (server, job, name);
+CREATE TABLE IF NOT EXISTS cases (
+    server TEXT NOT NULL,
+    job TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    suite TEXT,
+    class_name TEXT,
+    name TEXT,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS cases_by_run ON cases (server, job, run_id);
+CREATE INDEX IF NOT EXISTS cases_by_test ON cases (server, job, class_name, name);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    server TEXT NOT NULL,
+    job TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    filename TEXT,
+    owner TEXT,
+    owner_job TEXT,
+    owner_build_number INTEGER,
+    age TEXT
+);
+CREATE INDEX IF NOT EXISTS fingerprints_by_run ON fingerprints (server, job, run_id);
+CREATE INDEX IF NOT EXISTS fingerprints_by_owner ON fingerprints (server, owner_job, owner_build_number);
+CREATE TABLE IF NOT EXISTS sync_state (
+    server TEXT NOT NULL,
+    job TEXT NOT NULL,
+    high_water INTEGER NOT NULL,
+    PRIMARY KEY (server, job)
+);
+'''
+
+FAILING_STATUSES = ('FAILED', 'FAILURE', 'REGRESSION', 'UNSTABLE')
+
+
+def default_history_path():
+    """Next to the response cache, ~/.cache/janky/history.db"""
+    return os.path.join(default_cache_dir(), 'history.db')
+
+
+class HistoryStore():
+
+    def __init__(self, path=None):
+        """
+        :param path: SQLite file to use, defaults to ~/.cache/janky/history.db
+        """
+        self.path = path or default_history_path()
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        # WAL so a stage-view --watch reading doesn't block a sync writing
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def high_water(self, server, job):
+        """Highest run number that's stored and finished, with nothing older still going"""
+        row = self.db.execute('SELECT high_water FROM sync_state WHERE server = ? AND job = ?',
+                              (server, job)).fetchone()
+        return row[0] if row else 0
+
+    def save_runs(self, server, job, runs, details, cases=None, high_water=None):
+        """
+        Stores runs and whatever was fetched for them, replacing anything
+        already there for those runs. All in one transaction. Fingerprints
+        only count as fetched for finished runs, a running build can still
+        add more.
+
+        :param runs: run dicts from get_pipeline_data
+        :param details: fetch_run_details output for those runs
+        :param cases: dict of run id -> list of (suite, class, name, status)
+        :param high_water: new high water mark for the job
+        """
+        cases = cases or {}
+        with self.db:
+            for run in runs:
+                run_id = int(run["id"])
+                run_details = details.get((job, run["id"]), {})
+                counts = run_details.get('results')
+                if not isinstance(counts, dict):
+                    counts = {}
+                fingerprints = run_details.get('fingerprints')
+                # None keeps whatever the run had, this sync didn't look
+                fetched = is_terminal(run.get("status")) if isinstance(fingerprints, list) else None
+
+                self.db.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, '
+                                'COALESCE(?, (SELECT fingerprints_fetched FROM runs '
+                                'WHERE server = ? AND job = ? AND id = ?), 0))',
+                                (server, job, run_id, run.get("name"), run.get("status"),
+                                 run.get("startTimeMillis"), run.get("durationMillis"),
+                                 counts.get("passCount"), counts.get("failCount"),
+                                 counts.get("skipCount"), json.dumps(run),
+                                 fetched, server, job, run_id))
+
+                self.db.execute('DELETE FROM stages WHERE server = ? AND job = ? AND run_id = ?',
+                                (server, job, run_id))
+                self.db.executemany('INSERT INTO stages VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                    [(server, job, run_id, stage_no, stage.get("name"),
+                                      stage.get("status"), stage.get("startTimeMillis"),
+                                      stage.get("durationMillis"))
+                                     for (stage_no, stage) in enumerate(run.get("stages", []))])
+
+                if isinstance(fingerprints, list):
+                    self._put_fingerprints(server, job, run_id, fingerprints)
+
+                if run["id"] in cases:
+                    self.db.execute('DELETE FROM cases WHERE server = ? AND job = ? AND run_id = ?',
+                                    (server, job, run_id))
+                    self.db.executemany('INSERT INTO cases VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                        [(server, job, run_id) + case for case in cases[run["id"]]])
+
+            if high_water is not None:
+                self.db.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)',
+                                (server, job, high_water))
+
+    def save_fingerprints(self, server, job, fingerprints):
+        """
+        Stores fingerprints fetched after the fact for finished runs and
+        marks them fetched
+
+        :param fingerprints: dict of run id -> get_fingerprints list
+        """
+        with self.db:
+            for (run_id, prints) in fingerprints.items():
+                self._put_fingerprints(server, job, int(run_id), prints)
+                self.db.execute('UPDATE runs SET fingerprints_fetched = 1 WHERE server = ? AND job = ? AND id = ?',
+                                (server, job, int(run_id)))
+
+    def _put_fingerprints(self, server, job, run_id, fingerprints):
+        self.db.execute('DELETE FROM fingerprints WHERE server = ? AND job = ? AND run_id = ?',
+                        (server, job, run_id))
+        self.db.executemany('INSERT INTO fingerprints VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            [(server, job, run_id, fp.get('filename'), fp.get('owner'),
+                              fp.get('owner_job'), fp.get('owner_build_number'), fp.get('age'))
+                             for fp in fingerprints])
+
+    def missing_fingerprints(self, server, job, limit=None):
+        """Finished runs among the newest limit whose fingerprints were never fetched, run dicts"""
+        rows = self.db.execute('SELECT data FROM (SELECT id, status, data, fingerprints_fetched FROM runs '
+                               'WHERE server = ? AND job = ? ORDER BY id DESC LIMIT ?) '
+                               'WHERE fingerprints_fetched = 0 ORDER BY id DESC', (server, job, limit or -1))
+        runs = [json.loads(data) for (data,) in rows]
+        return [run for run in runs if is_terminal(run.get("status"))]
+
+    def runs(self, server, job, limit=None):
+        """Stored run dicts, newest first, same shape get_pipeline_data returns"""
+        rows = self.db.execute('SELECT data FROM runs WHERE server = ? AND job = ? '
+                               'ORDER BY id DESC LIMIT ?', (server, job, limit or -1))
+        return [json.loads(data) for (data,) in rows]
+
+    def run_details(self, server, job_runs):
+        """
+        Stored test counts and fingerprints, shaped like fetch_run_details
+        output so the renderers don't care where they came from. Runs with no
+        fingerprints stored that never had them fetched get a LookupError
+        there, not an empty list.
+        """
+        details = {}
+        for (job, runs) in job_runs:
+            if not runs:
+                continue
+            ids = [int(run["id"]) for run in runs]
+            marks = ','.join('?' * len(ids))
+            for row in self.db.execute('SELECT id, pass_count, fail_count, skip_count, fingerprints_fetched '
+                                       f'FROM runs WHERE server = ? AND job = ? AND id IN ({marks})',
+                                       [server, job] + ids):
+                (run_id, passed, failed, skipped, fingerprinted) = row
+                results = (LookupError(run_id) if passed is None else
+                           {'passCount': passed, 'failCount': failed, 'skipCount': skipped})
+                details[(job, str(run_id))] = {'results': results,
+                                               'fingerprints': [] if fingerprinted else LookupError(run_id)}
+
+            for row in self.db.execute('SELECT run_id, filename, owner, owner_job, owner_build_number, age '
+                                       f'FROM fingerprints WHERE server = ? AND job = ? AND run_id IN ({marks})',
+                                       [server, job] + ids):
+                (run_id, filename, owner, owner_job, owner_build_number, age) = row
+                run_details = details[(job, str(run_id))]
+                if isinstance(run_details['fingerprints'], Exception):
+                    # What a build had while it was still going, better than nothing
+                    run_details['fingerprints'] = []
+                run_details['fingerprints'].append({
+                    'filename': filename,
+                    'owner': owner,
+                    'owner_job': owner_job,
+                    'owner_build_number': owner_build_number,
+                    'age': age,
+                })
+        return details
+
+    def stage_trends(self, server, job, limit=None):
+        """
+        Duration and failure numbers per stage over the last limit runs
+
+        Returns:
+            list of (stage, runs, failures, avg ms, min ms, max ms) in stage order
+        """
+        return self.db.execute(
+            'SELECT name, COUNT(*), SUM(status IN (%s)), AVG(duration_ms), MIN(duration_ms), '
+            'MAX(duration_ms) FROM stages WHERE server = ? AND job = ? AND run_id IN '
+            '(SELECT id FROM runs WHERE server = ? AND job = ? ORDER BY id DESC LIMIT ?) '
+            'GROUP BY name ORDER BY MIN(stage_no)' % ','.join('?' * len(FAILING_STATUSES)),
+            FAILING_STATUSES + (server, job, server, job, limit or -1)).fetchall()
+
+    def run_statuses(self, server, job, limit=None):
+        """How many of the last limit runs ended in each status, most common first"""
+        return self.db.execute(
+            'SELECT status, COUNT(*) FROM (SELECT status FROM runs WHERE server = ? AND job = ? '
+            'ORDER BY id DESC LIMIT ?) GROUP BY status ORDER BY COUNT(*) DESC',
+            (server, job, limit or -1)).fetchall()
+
+    def failing_tests(self, server, job, limit=None, top=20):
+        """
+        Tests that fail most over the last limit runs with cases stored
+
+        Returns:
+            list of (suite, class, name, failures, runs), most failures first
+        """
+        return self.db.execute(
+            'SELECT suite, class_name, name, SUM(status IN (%s)) AS fails, COUNT(*) FROM cases '
+            'WHERE server = ? AND job = ? AND run_id IN (SELECT DISTINCT run_id FROM cases '
+            'WHERE server = ? AND job = ? ORDER BY run_id DESC LIMIT ?) '
+            'GROUP BY suite, class_name, name HAVING fails > 0 ORDER BY fails DESC, suite, class_name, name '
+            'LIMIT ?' % ','.join('?' * len(FAILING_STATUSES)),
+            FAILING_STATUSES + (server, job, server, job, limit or -1, top)).fetchall()
+
+
+def sync(light, store, jobname, fingerprints=True, cases=False, limit=None):
+    """
+    Brings the store up to date for one job. Only runs past the high water
+    mark are fetched, and the mark only moves past runs that are finished, so
+    in-progress ones get picked up again next time. wfapi/runs only has the
+    newest handful, so if more than that finished since the last sync the
+    ones in between are looked up one by one. With fingerprints, stored runs
+    that were synced without them get theirs filled in too.
+
+    :param light: JenkinsLight to fetch with
+    :param store: HistoryStore to save into
+    :param jobname: job name, /job/ separated for folders
+    :param fingerprints: fetch the fingerprints too
+    :param cases: fetch and store every test case's status, not just counts
+    :param limit: only fill in fingerprints for the newest limit runs
+
+    Returns:
+        (the runs that were fetched, how many runs got their fingerprints filled in)
+    """
+    high_water = store.high_water(light.baseurl, jobname)
+    runs = light.get_pipeline_data(jobname, None)
+    fresh = [run for run in runs if int(run["id"]) > high_water]
+    missed = []
+    if high_water and runs and min(int(run["id"]) for run in runs) > high_water + 1:
+        (gap, missed) = fetch_gap(light, jobname, high_water, min(int(run["id"]) for run in runs))
+        fresh += gap
+    if fresh:
+        save_fresh(light, store, jobname, fresh, high_water, fingerprints, cases, missed)
+    backfilled = backfill_fingerprints(light, store, jobname, limit) if fingerprints else 0
+    return (fresh, backfilled)
+
+
+def fetch_gap(light, jobname, high_water, oldest):
+    """
+    Runs between the high water mark and the oldest one wfapi/runs still
+    has, they finished while nobody was syncing
+
+    Returns:
+        (runs, numbers of the ones that couldn't be fetched)
+    """
+    numbers = [number for number in light.get_build_numbers(jobname, high_water) if number < oldest]
+    fetched = light.fetch_all([(light.get_pipeline_run, (jobname, number)) for number in numbers])
+    runs = []
+    missed = []
+    for (number, run) in zip(numbers, fetched):
+        if isinstance(run, Exception):
+            missed.append(number)
+        else:
+            runs.append(run)
+    return (runs, missed)
+
+
+def save_fresh(light, store, jobname, fresh, high_water, fingerprints, cases, missed=()):
+    """
+    Fetches what goes with runs new to the store and saves the lot. The high
+    water mark stays below missed, run numbers that couldn't be fetched, so
+    they're tried again next time.
+    """
+    from testresults import CASE_TREE, TestResults
+
+    details = light.fetch_run_details([(jobname, fresh)], results=True,
+                                      fingerprints=fingerprints, summary=True)
+
+    run_cases = {}
+    if cases:
+        finished = [run for run in fresh if is_terminal(run.get("status"))]
+        reports = light.fetch_all([(light.get_pipeline_results, (jobname, run["id"], run.get("status"), CASE_TREE))
+                                   for run in finished])
+        for (run, report) in zip(finished, reports):
+            if not isinstance(report, Exception):
+                run_cases[run["id"]] = [(case.suite, case.class_name, case.name, case.status)
+                                        for case in TestResults.from_report(report).cases]
+
+    # Everything up to just before the oldest run that's still going is done
+    going = [int(run["id"]) for run in fresh if not is_terminal(run.get("status"))] + list(missed)
+    newest = max(int(run["id"]) for run in fresh)
+    with light.tracer.span('store'):
+        store.save_runs(light.baseurl, jobname, fresh, details, run_cases,
+                        max(high_water, min(going) - 1 if going else newest))
+
+
+def backfill_fingerprints(light, store, jobname, limit=None):
+    """
+    Fetches fingerprints for finished runs that were stored without them,
+    newest limit runs only
+
+    Returns:
+        how many runs got theirs
+    """
+    from requests import HTTPError
+
+    missing = store.missing_fingerprints(light.baseurl, jobname, limit)
+    if not missing:
+        return 0
+    results = light.fetch_all([(light.get_fingerprints, (jobname, run["id"], run.get("status")))
+                               for run in missing])
+    found = {}
+    for (run, prints) in zip(missing, results):
+        if (isinstance(prints, HTTPError) and prints.response is not None
+                and prints.response.status_code == 404):
+            # Jenkins threw the build away, there's nothing left to ask for
+            prints = []
+        if not isinstance(prints, Exception):
+            found[run["id"]] = prints
+    with light.tracer.span('store'):
+        store.save_fingerprints(light.baseurl, jobname, found)
+    return len(found)
+
+
+def load_runs(light, store, jobs, limit=None, fingerprints=True, downstream=None):
+    """
+    Syncs each job then reads its runs back out of the store, for the
+    renderers. Same shapes as get_pipeline_data and fetch_run_details.
+
+    :param downstream: subjob name, its builds get looked up with
+                       resolve_downstream like fetch_run_details does
+
+    Returns:
+        (job_runs, details)
+    """
+    job_runs = []
+    for jobname in jobs:
+        sync(light, store, jobname, fingerprints=fingerprints, limit=limit)
+        with light.tracer.span('store'):
+            job_runs.append((jobname, store.runs(light.baseurl, jobname, limit)))
+    with light.tracer.span('store'):
+        details = store.run_details(light.baseurl, job_runs)
+    if downstream:
+        light.add_downstream(details, job_runs, downstream)
+    return (job_runs, details)
+
+
+def main():
+    """
+        main - sync or query the build history
+    """
+    from tracing import NULL_TRACER, Tracer, report
+
+    opts = parse_commandline()
+    jobs = opts.jobname.split(",")
+    store = HistoryStore(opts.database)
+    tracer = Tracer() if opts.profile else NULL_TRACER
+
+    (server, uid, token) = load_secrets()
+    if opts.command == 'sync':
+        from jenkinslight import JenkinsLight
+        from responsecache import ResponseCache
+
+        cache = None if opts.no_cache else ResponseCache()
+        j = JenkinsLight(server, uid, token, timeout=60, max_workers=opts.workers, cache=cache,
+                         tracer=tracer)
+        for jobname in jobs:
+            (fetched, backfilled) = sync(j, store, jobname, fingerprints=opts.fingerprints,
+                                         cases=opts.cases, limit=opts.limit)
+            print(f"{jobname}: {len(fetched)} runs synced, "
+                  f"high water #{store.high_water(server, jobname)}"
+                  + (f", fingerprints filled in for {backfilled} older runs" if backfilled else ""))
+
+    if opts.command != 'sync':
+        for jobname in jobs:
+            with tracer.span('query'):
+                print_history(opts, store, server, jobname)
+
+    store.close()
+    if opts.profile:
+        report(tracer, opts.profile, j.pool_stats() if opts.command == 'sync' else None)
+
+
+def print_history(opts, store, server, jobname):
+    """
+        stages or failures for one job, straight out of the store
+    """
+    if opts.command == 'stages':
+        print(f"{jobname}:")
+        print(f"\t{'stage':<30} {'runs':>5} {'failed':>7} {'avg':>9} {'min':>9} {'max':>9}")
+        for (name, runs, failures, avg, low, high) in store.stage_trends(server, jobname, opts.limit):
+            print(f"\t{name:<30} {runs:>5} {failures:>7} {seconds(avg):>9} "
+                  f"{seconds(low):>9} {seconds(high):>9}")
+    elif opts.command == 'failures':
+        statuses = store.run_statuses(server, jobname, opts.limit)
+        total = sum(count for (_, count) in statuses)
+        print(f"{jobname}: {total} runs")
+        for (status, count) in statuses:
+            print(f"\t{status:<14} {count:>5} {100.0 * count / total:>6.1f}%")
+        failing = store.failing_tests(server, jobname, opts.limit)
+        if failing:
+            print("\tMost failing tests:")
+        for (suite, class_name, name, failures, runs) in failing:
+            print(f"\t\t{failures:>4}/{runs:<4} {suite} {class_name} {name}")
+
+
+def seconds(millis):
+    """Milliseconds as a short seconds string, or - if there's nothing"""
+    return '-' if millis is None else f"{millis / 1000.0:.1f}s"
+
+
+def load_secrets():
+    """
+        Reads config file returns (server, userid, personal access token)
+    """
+    cfgfile = 'janky.cfg'
+    if not os.path.isfile(cfgfile):
+        raise ValueError("Config file does not exist")
+    cfg = configparser.ConfigParser()
+    cfg.read(cfgfile)
+    sections = cfg.sections()
+    # Could have a parameter for a specific section, but whatever.
+    sector = sections[0]
+    uname = cfg[sector]['uname']
+    token = cfg[sector]['token']
+    server = cfg[sector]['server']
+
+    return (server, uname, token)
+
+
+def parse_commandline():
+    """
+    Parses command line and returns options object.
+
+        Returns:
+            options (object): Object containing all of the program options set
+            on the command line
+    """
+    from jenkinslight import DEFAULT_MAX_WORKERS
+
+    parser = argparse.ArgumentParser(
+        prog="history.py",
+        description="Local Jenkins build history"
+    )
+    parser.add_argument("command", choices=['sync', 'stages', 'failures'],
+                        help="sync new runs from Jenkins, or show stage trends or failure rates")
+    parser.add_argument("-j", "--jobname", dest="jobname",
+                        help="Name of Jenkins job pipeline, or several comma separated",
+                        required=True)
+    parser.add_argument("-l", "--limit", dest="limit",
+                        help="Only look at the last LIMIT runs",
+                        type=int,
+                        default=None)
+    parser.add_argument("--db", dest="database",
+                        help="History database file, default ~/.cache/janky/history.db",
+                        default=None)
+    parser.add_argument("--cases", dest="cases",
+                        action='store_true',
+                        help="sync: store every test case's status too",
+                        default=False)
+    parser.add_argument("--no-fingerprints", dest="fingerprints",
+                        action='store_false',
+                        help="sync: skip fetching fingerprints, a later sync without this fills them in",
+                        default=True)
+    parser.add_argument("--no-cache", dest="no_cache",
+                        action='store_true',
+                        help="sync: don't use the cache of finished builds",
+                        default=False)
+    parser.add_argument("-w", "--workers", dest="workers",
+                        help="Max number of requests in flight at once",
+                        type=int,
+                        default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--profile", dest="profile",
+                        nargs='?',
+                        const='-',
+                        metavar="FILE",
+                        help="Print where the time went to stderr, and write a Chrome trace to FILE if given",
+                        default=None)
+
+    options = parser.parse_args()
+
+    # Fixup jobname if in a folder
+    if '/' in options.jobname:
+        options.jobname = options.jobname.replace('/', '/job/')
+
+    return options
+
+
+if __name__ == "__main__":
+    main()
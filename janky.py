@@ -4,124 +4,384 @@
 """
 import argparse
 import configparser
-import operator
+import gzip
+import io
 import os.path
 import signal
 import sys
+import threading
 import time
-import xmltodict
 
-# if Python 3.10 or higher we can use the system keychain (or equiv on other platforms)
-if sys.version_info.major >= 3 and sys.version_info.minor >= 10:
-    import truststore
-    truststore.inject_into_ssl()
+# The heavy stuff (jenkinsapi, requests, truststore) gets imported
+# where it's used, so -h and bad arguments come back right away and read only
+# operations never pay for jenkinsapi's Jenkins object.
 
-from jenkinsapi.jenkins import Jenkins
-from jenkinsapi.result import Result
 
 def main():
     """
         main - where the magic happens
     """
-    build = None
-    build_number = None
-    build_params = {}
-
     # Make ctrl+C less vomitty.
     signal.signal(signal.SIGINT, signal_handler)
 
     # Basic setup bits, get cli options, get auth info, connect
-    # to jenkins and grab the job object.
+    # to jenkins. Reading stuff goes through JenkinsLight, the full
+    # jenkinsapi connection only gets made if we're changing something.
     opts = parse_commandline()
-    
+
+    tracer = None
+    if opts.profile:
+        from tracing import Tracer
+        tracer = Tracer()
+
     try:
-        j = connect_to_jenkins()
+        light = connect_light(opts.no_cache, opts.refresh, tracer)
     except Exception as e:
         eprint(e)
         print("Failed building Jenkins connection")
         return 1
-    
+
+    jenkins = SharedJenkins(light.max_workers, tracer)
+
+    # Every launch waits on the one queue poller
+    queue = None
+    if opts.fire or opts.sweep is not None:
+        from queuetrack import QueueTracker
+        queue = QueueTracker(light)
+
+    if opts.sweep is not None:
+        exit_code = run_sweep(opts, light, jenkins, queue)
+    elif len(opts.jobs) == 1:
+        exit_code = run_job(opts, opts.jobs[0], light, jenkins, queue)
+    else:
+        exit_code = run_jobs(opts, light, jenkins, queue)
+
+    if tracer is not None:
+        from tracing import report
+        sys.stdout.flush()
+        report(tracer, opts.profile, light.pool_stats())
+    return exit_code
+
+
+def run_jobs(opts, light, jenkins, queue=None):
+    """
+        Runs the same actions against a bunch of jobs at once. Everything a
+        job prints is held back and printed as one block, in the order the
+        jobs were given, as soon as that job and the ones before it are done.
+
+        Returns:
+            0 if every job went fine, otherwise the worst exit code. --grep
+            goes by grep's rules across all the jobs' builds.
+    """
+    tasks = [(jobname, run_job, (opts, jobname, light, jenkins, queue)) for jobname in opts.jobs]
+    return run_grouped(tasks, light.max_workers, grep_exit_code if opts.grep else max)
+
+
+def run_sweep(opts, light, jenkins, queue):
+    """
+        Launches every combination of the swept parameters for every job,
+        at most opts.max_active queued or running at once, follows them all
+        until they finish and prints a table of how they went
+
+        Returns:
+            0 if every build was a SUCCESS, 1 otherwise
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    combos = sweep_combinations(opts.params)
+    launches = []
+    for jobname in opts.jobs:
+        try:
+            (_, _, build_params) = get_build_params(light, jobname, opts.build_number, opts.last)
+            buildjob = get_job_from_jenkins(jenkins.get(), jobname)
+        except Exception as e:
+            eprint(e)
+            print("Failed getting job or build params for job:", jobname)
+            return 1
+        for combo in combos:
+            label = ' '.join([jobname] + [f"{key}={value}" for (key, value) in combo.items()])
+            launches.append((buildjob, light_name(jobname), dict(build_params, **combo), label))
+
+    print(f"Sweeping {len(launches)} builds, {min(opts.max_active, len(launches))} at a time\n")
+    # A worker holds its slot from launch to finish, so the pool size is the cap
+    with ThreadPoolExecutor(max_workers=min(opts.max_active, len(launches))) as pool:
+        items = list(pool.map(lambda launch: sweep_build(*launch, queue), launches))
+
+    print(f"\nSweep results, {len(items)} builds:")
+    for item in items:
+        number = f"#{item.number}" if item.number is not None else "-"
+        duration = f"{item.duration / 1000:.0f}s" if item.duration is not None else "-"
+        print(f"\t{number:>7} {sweep_outcome(item):<11} {duration:>7}  {item.label}")
+
+    return 0 if all(item.result == 'SUCCESS' for item in items) else 1
+
+
+def sweep_build(job, jobname, params, label, queue):
+    """
+        Launches one build of a sweep and waits for it to finish
+
+        Returns:
+            its QueueItem, or a stand in with the error if it never got queued
+    """
+    from queuetrack import QueueItem
+
     try:
-        buildjob = get_job_from_jenkins(j, opts.jobname)
+        qi = job.invoke(build_params=params)
     except Exception as e:
         eprint(e)
-        print("Unknown Job: ", opts.jobname)
-        return 1
+        print(f"{label}: failed to launch")
+        item = QueueItem(None, label)
+        item.error = e
+        return item
+    return queue.wait(qi.queue_id, label, on_change=print_queue_item, jobname=jobname)
 
-    # get the parameters for the build
+
+def sweep_outcome(item):
+    """
+        One word for how a sweep build went
+    """
+    if item.result is not None:
+        return item.result
+    if item.cancelled:
+        return "CANCELLED"
+    if item.number is None and item.id is None:
+        return "NOT QUEUED"
+    return "LOST"
+
+
+def run_grouped(tasks, max_workers, combine=max):
+    """
+        Runs (label, func, args) tasks side by side. Each task's output is
+        printed as one block under its label, in task order. Works nested
+        too, inner tasks' blocks land inside the outer task's block.
+
+        Returns:
+            combine() of the tasks' exit codes, by default 0 if every task
+            went fine, otherwise the worst one
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    previous = sys.stdout
+    grouped = previous if isinstance(previous, GroupedOutput) else GroupedOutput(previous)
+    sys.stdout = grouped
     try:
-        (build, build_number, build_params) = get_build_params(buildjob, opts.build_number, opts.last)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as pool:
+            futures = [pool.submit(grouped.capture, func, *args) for (_, func, args) in tasks]
+
+            codes = []
+            for ((label, _, _), future) in zip(tasks, futures):
+                (code, output) = future.result()
+                grouped.write(f"\n===== {label} =====\n")
+                grouped.write(output)
+                grouped.flush()
+                codes.append(code)
+    finally:
+        sys.stdout = previous
+
+    return combine(codes)
+
+
+def grep_exit_code(codes):
+    """
+        What grep over several files exits with: 2 if any couldn't be read,
+        otherwise 0 if any matched, 1 if none did
+    """
+    if 2 in codes:
+        return 2
+    return 0 if 0 in codes else 1
+
+
+def search_consoles(opts, jobname, light):
+    """
+        --grep or --tail over the console of every build asked for, several
+        builds at a time
+
+        Returns:
+            For --grep what grep would, 0 if any build matched, 1 if none
+            did, 2 if a console couldn't be read. For --tail 0 if it worked.
+    """
+    numbers = opts.build_numbers
+    if opts.last:
+        numbers = [light.get_build_info(light_name(jobname), 'lastBuild')["number"]]
+
+    if len(numbers) == 1:
+        return search_console(opts, jobname, numbers[0], light)
+
+    tasks = [(f"{jobname} #{number}", search_console, (opts, jobname, number, light))
+             for number in numbers]
+    return run_grouped(tasks, light.max_workers, grep_exit_code if opts.grep else max)
+
+
+def search_console(opts, jobname, number, light):
+    """
+        --grep or --tail one build's console, streamed, never held whole
+    """
+    from consolestream import ConsoleGrep, tail_console
+
+    if opts.tail is not None:
+        for line in tail_console(light, light_name(jobname), number, opts.tail):
+            print(line)
+        return 0
 
+    grep = ConsoleGrep(opts.grep, opts.context, opts.ignore_case)
+    try:
+        light.copy_console_text(light_name(jobname), number, grep)
+    except Exception as e:
+        eprint(f"Couldn't read the console of {jobname} #{number}: {e}")
+        return 2
+    grep.close()
+    # Same as grep, 1 means nothing matched
+    return 0 if grep.matches else 1
+
+
+def run_job(opts, jobname, light, jenkins, queue=None):
+    """
+        Does whatever the command line asked for to one job
+
+        Returns:
+            exit code, 0 is good
+    """
+    build = None
+    build_number = None
+    build_params = {}
+
+    # Console searching and results comparing don't need anything else
+    if opts.grep or opts.tail is not None:
+        return search_consoles(opts, jobname, light)
+
+    if opts.diff:
+        return diff_results(light, jobname, opts.diff[0], opts.diff[1])
+
+    if opts.flaky:
+        return flaky_results(light, jobname, opts.flaky)
+
+    # Config updates only need config.xml
+    if opts.update_job:
+        return update_job_defaults(light, jobname, opts.params, opts.dry_run)
+
+    # get the parameters for the build
+    try:
+        (build, build_number, build_params) = get_build_params(light, jobname,
+                                                               opts.build_number, opts.last)
     except Exception as e:
         eprint(e)
-        print("Failed getting build params")
+        print("Failed getting build params for job:", jobname)
         return 1
 
+    buildjob = None
+    if opts.fire or opts.killbuild:
+        try:
+            j = jenkins.get()
+        except Exception as e:
+            eprint(e)
+            print("Failed building Jenkins connection")
+            return 1
+
+        try:
+            buildjob = get_job_from_jenkins(j, jobname)
+        except Exception as e:
+            eprint(e)
+            print("Unknown Job: ", jobname)
+            return 1
+
     # Print out the parameters
     if opts.list:
         print_params(build_params, build)
 
     # If we passed in some overriding parameters,
     # place them into our build parameters.
-    if opts.params: 
-        if opts.update_job:
-            update_defaults(buildjob, opts.params)
-
-        else:
-            print("\nOverriding the following parameters:", opts.params)
-            for (key, value) in opts.params.items():
-                build_params[key] = value
+    if opts.params:
+        print("\nOverriding the following parameters:", opts.params)
+        for (key, value) in opts.params.items():
+            build_params[key] = value
 
     if opts.results or opts.fails:
-        result_summary = {}
-        from pprint import pprint
-        job_results = build.get_resultset()
-
-        suites_to_sort = job_results._data.get("suites", [])
-        suites = sorted(suites_to_sort, key=operator.itemgetter('name'))
-
-        for suite in sorted(job_results._data.get("suites", []), key=operator.itemgetter('name')):
-            # pprint(suite)
-            found = False
-
-            for case in sorted(suite["cases"], key=operator.itemgetter('className')):
-                result = Result(**case)
-
-                if not opts.fails or case["status"] not in ['PASSED', 'FIXED']:
-                    if not found:
-                        found = True
-                        print(suite["name"])
-                        print("\t", case["className"])
-                    print("\t\t", case["name"], case["status"])
-                    if opts.fails and opts.details:
-                        print("\n", case["errorStackTrace"], "\n")
+        print_results(light, light_name(jobname), build_number, opts.fails, opts.details)
 
     # dump out the console
-    # This may crash on unicode decode issues, use -s instead. They fixed it for
-    # streaming the console, but not for just getting it.
     if opts.get_console:
-        console_text = get_job_console(buildjob, build_number)
-        print(console_text)
+        get_job_console(light, jobname, build_number, opts.output, opts.gzip)
 
     # Kill off the specified build
     if opts.killbuild:
-        kill_job(buildjob, build_number, opts.stream_console)
+        kill_job(buildjob, build_number, opts.stream_console, light)
 
     # stream the console unless we're also launching, then that will take care of stream
     if opts.stream_console and not (opts.fire or opts.killbuild):
-        stream_console(job=buildjob, number=build_number)
+        stream_console(light, jobname, build_number)
         return 0
 
     # Launch mode initiate!
     if opts.fire:
-        launch_build(buildjob, build_params, opts.stream_console)
-    
+        return launch_build(buildjob, build_params, opts.stream_console, light, queue)
+
     return 0
 
+
+class GroupedOutput():
+    """
+        Stands in for sys.stdout while several jobs run side by side. Output
+        from a thread running capture() lands in that thread's own buffer,
+        anything else goes straight through to the real stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def capture(self, func, *args):
+        """
+            Runs func, returns (exit code, everything it printed)
+        """
+        self.local.buffer = io.StringIO()
+        try:
+            code = func(*args)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            eprint(e)
+            print("Failed:", e)
+            code = 1
+        finally:
+            output = self.local.buffer.getvalue()
+            self.local.buffer = None
+        return (code or 0, output)
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (buffer if buffer is not None else self.stream).write(text)
+
+    def flush(self):
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class SharedJenkins():
+    """
+        One jenkinsapi connection for all the jobs, only made when some job
+        actually needs it
+    """
+
+    def __init__(self, pool_size, tracer=None):
+        self.pool_size = pool_size
+        self.tracer = tracer
+        self.lock = threading.Lock()
+        self.jenkins = None
+
+    def get(self):
+        with self.lock:
+            if self.jenkins is None:
+                self.jenkins = connect_to_jenkins(self.pool_size, self.tracer)
+            return self.jenkins
+
+
 def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
-def get_build_params(buildjob, buildnumber, last):
+def get_build_params(light, jobname, buildnumber, last):
     """
         Get the build parameters from the last job, a specific job or the defaults
 
@@ -129,28 +389,157 @@ def get_build_params(buildjob, buildnumber, last):
     build = None
     build_params = {}
     build_number = buildnumber
+    jobname = light_name(jobname)
 
     # get the params from the last job
     if last:
-        build = buildjob.get_last_build()
-        build_params = build.get_params()
-        build_number = build.get_number()
+        info = light.get_build_info(jobname, 'lastBuild')
+        build = info["fullDisplayName"]
+        build_params = build_info_params(info)
+        build_number = info["number"]
 
     # get the params from a specific job number
     elif build_number:
-        build = buildjob.get_build(build_number)
-        build_params = build.get_params()
+        info = light.get_build_info(jobname, build_number)
+        build = info["fullDisplayName"]
+        build_params = build_info_params(info)
 
     # Get the job default parameters
     else:
-        for parm in buildjob.get_params():
-            key = parm["defaultParameterValue"]["name"]
-            value = parm["defaultParameterValue"]["value"]
+        for parm in light.get_job_params(jobname):
+            default = parm.get("defaultParameterValue") or {}
+            key = default.get("name", parm["name"])
+            value = default.get("value")
             build_params[key] = value
 
     return (build, build_number, build_params)
 
 
+def build_info_params(info):
+    """
+        Pulls the name: value parameter pairs out of get_build_info's actions
+    """
+    build_params = {}
+    for action in info.get("actions", []):
+        for parm in (action or {}).get("parameters", []):
+            build_params[parm["name"]] = parm.get("value")
+    return build_params
+
+
+def print_results(light, jobname, number, fails, details):
+    """
+        Prints the test results, suite by suite. The report is streamed and
+        failures filtered out as it comes in, only the cases we print are kept.
+    """
+    from testresults import CASE_TREE, DETAILS_TREE, TestResults
+
+    tree = DETAILS_TREE if (fails and details) else CASE_TREE
+    results = TestResults.from_stream(light.iter_test_cases(jobname, number, fails, tree),
+                                      fails, fails and details)
+
+    with light.tracer.span('render'):
+        for (suite, cases) in results.by_suite():
+            print(suite)
+            print("\t", cases[0].class_name)
+            for case in cases:
+                print("\t\t", case.name, case.status)
+                if fails and details:
+                    print("\n", case.stack_trace, "\n")
+
+
+def diff_results(light, jobname, old, new):
+    """
+        Prints which tests started failing, got fixed, showed up or went away
+        between two builds
+
+        Returns:
+            1 if anything newly failed, 0 otherwise
+    """
+    from testresults import ResultsDiff
+
+    name = light_name(jobname)
+    infos = light.fetch_all([(light.get_build_info, (name, old)), (light.get_build_info, (name, new))])
+    for (number, info) in zip((old, new), infos):
+        if isinstance(info, Exception):
+            eprint(f"Couldn't get build #{number} of {jobname}: {info}")
+            return 1
+    indexes = fetch_result_indexes(light, name, [(old, infos[0].get("result")), (new, infos[1].get("result"))])
+    for (number, index) in zip((old, new), indexes):
+        if index is None:
+            print(f"No test results for #{number}")
+            return 2
+
+    diff = ResultsDiff(indexes[0], indexes[1])
+    with light.tracer.span('render'):
+        print(f"Test results #{old} -> #{new}")
+        print_result_keys("Newly failing", diff.newly_failing)
+        print_result_keys("Fixed", diff.fixed)
+        print_result_keys("Still failing", diff.still_failing)
+        print_result_keys("New tests", diff.added)
+        print_result_keys("Removed tests", diff.removed)
+    return 1 if diff.newly_failing else 0
+
+
+def flaky_results(light, jobname, count):
+    """
+        Prints the tests that flipped between passing and failing over the
+        last count finished builds
+    """
+    from testresults import find_flaky
+
+    name = light_name(jobname)
+    builds = [(number, result) for (number, result) in light.get_build_statuses(name, count)
+              if result is not None]
+    # Oldest first, so the flips come out in order
+    builds.reverse()
+    indexes = [index for index in fetch_result_indexes(light, name, builds) if index is not None]
+
+    with light.tracer.span('compare'):
+        flaky = find_flaky(indexes)
+    print(f"Flaky tests over {len(indexes)} builds with results "
+          f"(#{builds[0][0] if builds else '?'} - #{builds[-1][0] if builds else '?'}):")
+    if not flaky:
+        print("\tNone, nice")
+    for ((suite, class_name, case_name), flips, failures, runs) in flaky:
+        print(f"\t{flips:>3} flips {failures:>4}/{runs:<4} failed  {suite} {class_name} {case_name}")
+    return 0
+
+
+def fetch_result_indexes(light, name, builds):
+    """
+        Gets the (suite, class, name) -> status index of each (number, result)
+        build's test report, all at once. Finished builds come out of the cache
+        when there's one. Builds without a report get None.
+    """
+    from testresults import CASE_TREE, TestResults
+
+    reports = light.fetch_all([(light.get_pipeline_results, (name, number, result, CASE_TREE))
+                               for (number, result) in builds])
+    indexes = []
+    for ((number, _), report) in zip(builds, reports):
+        if isinstance(report, Exception):
+            eprint(f"No test results for #{number}: {report}")
+            indexes.append(None)
+        else:
+            with light.tracer.span('index'):
+                indexes.append(TestResults.from_report(report).index())
+    return indexes
+
+
+def print_result_keys(title, items):
+    """
+        Prints ((suite, class, name), status) pairs grouped by suite
+    """
+    print(f"\n{title}: {len(items)}")
+    suite = None
+    for ((case_suite, class_name, case_name), status) in sorted(items, key=lambda item: tuple(
+            part or '' for part in item[0])):
+        if case_suite != suite:
+            suite = case_suite
+            print("\t", suite)
+        print("\t\t", class_name, case_name, status)
+
+
 def print_params(build_params, build):
     """
         Prints out the build parameters
@@ -164,12 +553,14 @@ def print_params(build_params, build):
         print(key + ":", value)
 
 
-def launch_build(job, params, stream):
+def launch_build(job, params, stream, light, queue):
     """
-        Start a build with parameters
-    """
-    default_retries = 3
+        Start a build with parameters, follow it through the queue and
+        stream the console once it's going if asked to
 
+        Returns:
+            0 if the build started, 1 if it never did
+    """
     try:
         qi = job.invoke(build_params=params)
     except Exception as e:
@@ -179,58 +570,26 @@ def launch_build(job, params, stream):
         # let caller know 
         sys.exit(1)
 
-    # First retry block: getting the job handle and printing parameters
-    retries = default_retries
-    while retries > 0:
-        if retries < default_retries:
-            print("job handle block, sleeping for 30 seconds")
-            time.sleep(30)
-
-        retries = retries - 1
-        print("Retries left:", retries)
-
-        try:
-            build = qi.get_job()
-        except Exception as e:
-            print("Failed to retrieve job reference.")
-            eprint(e)
-            continue
-
-        try:
-            print_params(qi.get_parameters(), build)
-            print('\nBuild:', build, "waiting to start...")
-
-        except Exception as e:
-            print("Failure getting job's  parameters.")
-            eprint(e)
-            continue
+    print_params(params, f"{job.name} (queue item {qi.queue_id})")
+    print()
 
-        # Bust out of this retry loop
-        retries = 0
+    # Moves on the moment Jenkins hands out a build number
+    item = queue.wait(qi.queue_id, job.name, on_change=print_queue_item)
+    if item.number is None:
+        return 1
 
-    # Second retry loop: Blocks until build starts, streams console if needed
-    retries = default_retries
-    while retries > 0:
-        if retries < default_retries:
-            print("Build block, sleeping for 30 seconds")
-            time.sleep(30)
+    if stream:
+        stream_console(light, job.name, item.number)
+    return 0
 
-        retries = retries - 1
-        print("Retries left:", retries)
 
-        try:
-            build = qi.block_until_building()
-            print(build, "started")
-
-        except Exception as e:
-            print("Exception while waiting for build to start")
-            eprint(e)
-            continue
-        if stream:
-            stream_console(build=build)
-
-        # if we made it here we're not in an exception, so leave
-        retries = 0
+def print_queue_item(item):
+    """
+        Prints a queue item's progress as it changes, in one write so lines
+        from a sweep's threads don't run together
+    """
+    sys.stdout.write(item.describe() + "\n")
+    sys.stdout.flush()
 
 
 def get_artifacts(job, number):
@@ -245,7 +604,7 @@ def get_artifacts(job, number):
     return artifacts
 
 
-def kill_job(job, number, stream=False):
+def kill_job(job, number, stream=False, light=None):
     """
         Look up the build number and stop it.
             Stream option will let us watch the console log until the job ends
@@ -260,7 +619,7 @@ def kill_job(job, number, stream=False):
         print("Cancelling build", build)
         build.stop()
         if stream:
-            stream_console(job=job, number=number)
+            stream_console(light, job.name, number)
         else:
             build.block_until_complete()
         print(f"Build {build} cancelled")
@@ -268,74 +627,103 @@ def kill_job(job, number, stream=False):
         print(build, "was not running and couldn't be cancelled")
 
 
-def get_job_console(job, number):
+def get_job_console(light, jobname, number, output=None, compress=False):
     """
-        Look up the build number and grab the console
+        Look up the build number and dump the console to stdout or a file.
+        It's streamed through in chunks, so memory use stays flat no matter
+        how big the console is.
     """
-    build = job.get_build(number)
-
-    return build.get_console()
+    from consolestream import TextTranscoder
+
+    if output:
+        # Raw bytes go to the file, exactly what Jenkins has
+        filename = output.format(job=jobname.replace('/', '_'), number=number)
+        opener = gzip.open if compress or filename.endswith('.gz') else open
+        with opener(filename, 'wb') as out:
+            size = light.copy_console_text(light_name(jobname), number, out)
+        print(f"Wrote {size} bytes of console to {filename}")
+    else:
+        out = TextTranscoder(sys.stdout)
+        light.copy_console_text(light_name(jobname), number, out)
+        out.close()
 
 
-def stream_console(job=None, number=None, build=None):
+def stream_console(light, jobname, number):
     """
-        Look up the build number and grab the console
+        Look up the build number and stream the console until the build is done.
+        Picks up where it left off if the connection drops.
     """
-    retries = 3
-    if job:
-        build = job.get_build(number)
-    while retries > 0:
-        try:
-            for line in build.stream_logs():
-                print(line)
-            break
-        except Exception as e:
-            retries = retries - 1
-            print("Stream interrupted: ", e)
-            time.sleep(30)
-            print("Retrying. Retries left:", retries)
+    from consolestream import ConsoleStreamer
+
+    sys.stdout.flush()
+    try:
+        ConsoleStreamer(light, light_name(jobname), number).run()
+    except Exception as e:
+        print("Stream interrupted, giving up: ", e)
 
     return "Console stream complete"
 
-def update_defaults(job=None, options=None):
+def update_job_defaults(light, jobname, params, dry_run=False):
     """
-        Use some XML magic to update the job config
+        Sets the job's parameter defaults to params, right in its config.xml.
+        All or nothing, if any parameter is missing or a value doesn't fit,
+        nothing gets changed. Nothing gets posted when the defaults are
+        already that, or on a dry run, which shows the diff instead. Password
+        defaults are encrypted in the config, so giving one always posts.
+
+        Returns:
+            0 if the defaults are (or would be) what was asked for, 1 if not
     """
-    job_config_xml = job.get_config()
-    jobconfig = xmltodict.parse(job_config_xml)
+    from jobconfig import update_defaults
 
-    # Grab a reference to the parameterDefinitions section of the job config.
-    parameter_definitions = jobconfig['flow-definition']['properties']['hudson.model.ParametersDefinitionProperty']['parameterDefinitions']
-    # Update the things that were specified
-    for (key, value) in options.items():
-        update_config(parameter_definitions, key, value)
+    try:
+        config = light.get_config_xml(light_name(jobname))
+        update = update_defaults(config, params)
+    except Exception as e:
+        eprint(e)
+        print("Failed reading the config for job:", jobname)
+        return 1
 
-    # This turns the dicts back into xml
-    newconf = xmltodict.unparse(jobconfig, pretty=True)
-    # Then update the job's config
-    job.update_config(newconf)
+    for name in update.missing:
+        print(f"{name}: no such parameter")
+    for (name, why) in update.problems:
+        print(f"{name}: {why}")
+    if not update.ok:
+        print("Not updated")
+        return 1
 
+    for (name, old, new) in update.changes:
+        if name in update.unchecked:
+            print(f"{name}: stored encrypted, can't tell if it's already that, setting it anyway")
+        else:
+            print(f"{name}: {old!r} -> {new!r}")
+    if not update.changes:
+        print("Defaults already set, nothing to update")
+        return 0
+    if dry_run:
+        sys.stdout.write(update.diff(jobname))
+        print("Dry run, not updated")
+        return 0
 
-def update_config(parameter_definitions=None, key=None, value=None):
-    """
-        Updates the specific parameter in the config xml
-        Currently only handles bools or strings. Multivalue updates todo.
-    """
-    if type(value) is bool:
-        config = parameter_definitions["hudson.model.BooleanParameterDefinition"]
-    else:
-        config = parameter_definitions["hudson.model.StringParameterDefinition"]
+    try:
+        light.post_config_xml(light_name(jobname), update.config_xml)
+    except Exception as e:
+        eprint(e)
+        print("Failed updating the config for job:", jobname)
+        return 1
+    print("Updated")
+    return 0
 
-    # this will fail silently if the parameter doesn't exist.
-    # TODO: Make this more informative to user
-    for param in config:
-        if param["name"] == key:
-            param["defaultValue"] = value
 
-def connect_to_jenkins():
+def connect_to_jenkins(pool_size=None, tracer=None):
     """
-        Makes connection to Jenkins server with retry logic and timeout
+        Makes connection to Jenkins server with retry logic and timeout.
+        With a tracer, jenkinsapi's requests get recorded too.
     """
+    use_system_certs()
+    from jenkinsapi.jenkins import Jenkins
+    from jenkinslight import DEFAULT_MAX_WORKERS, tune_session
+
     (server, uid, token) = load_secrets()
     max_retries = 5
     retries = max_retries
@@ -343,6 +731,10 @@ def connect_to_jenkins():
     while retries > 0:
         try:
             j = Jenkins(server, uid, token, lazy=True, timeout=60)
+            # Same pooling and retry setup as JenkinsLight gets
+            tune_session(j.requester.session, pool_size or DEFAULT_MAX_WORKERS)
+            if tracer is not None:
+                tracer.hook(j.requester.session)
             # put back when we have logger
             # print(f"Successfully connected to Jenkins server")
             return j
@@ -357,6 +749,37 @@ def connect_to_jenkins():
                 raise Exception(f"Jenkins connection failed, no retries left: {e}")
 
 
+def connect_light(no_cache=False, refresh=False, tracer=None):
+    """
+        Makes a JenkinsLight, no server round trips until we ask for something.
+        Finished builds' results are cached on disk, same cache as stage-view.
+    """
+    use_system_certs()
+    from jenkinslight import JenkinsLight
+    from responsecache import ResponseCache
+
+    (server, uid, token) = load_secrets()
+    cache = None if no_cache else ResponseCache(refresh=refresh)
+    return JenkinsLight(server, uid, token, timeout=60, cache=cache, tracer=tracer)
+
+
+def light_name(jobname):
+    """
+        Turns folder/job into folder/job/job for JenkinsLight's urls
+    """
+    return jobname.replace('/', '/job/')
+
+
+def use_system_certs():
+    """
+        If Python 3.10 or higher we can use the system keychain (or equiv on
+        other platforms). Only done once we know we're talking to a server.
+    """
+    if sys.version_info.major >= 3 and sys.version_info.minor >= 10:
+        import truststore
+        truststore.inject_into_ssl()
+
+
 def get_job_from_jenkins(jenkins, jobname):
     """
         Retrieves a job from Jenkins server with retry logic
@@ -412,17 +835,92 @@ def parse_params(params):
         for parm in param_pairs:
             if '=' in parm:
                 (key, value) = parm.split('=')
-                # Fix up Bools if needed
-                if value.lower() == "true":
-                        value = True
-                elif value.lower() == "false":
-                        value = False
-
-                parsed_params[key] = value
+                parsed_params[key] = param_value(value)
 
     return parsed_params
 
 
+def param_value(value):
+    """
+        Fix up Bools if needed
+    """
+    if value.lower() == "true":
+        return True
+    if value.lower() == "false":
+        return False
+    return value
+
+
+def sweep_combinations(params):
+    """
+    Expands the sweep axes, values like a|b|c, into every combination of
+    the parameters. Parameters without a | are the same in all of them.
+
+        Returns:
+            list of parameter dicts, the first axis changing slowest
+    """
+    import itertools
+
+    axes = []
+    for (key, value) in (params or {}).items():
+        if isinstance(value, str) and '|' in value:
+            axes.append([(key, param_value(choice)) for choice in value.split('|')])
+        else:
+            axes.append([(key, value)])
+    return [dict(combo) for combo in itertools.product(*axes)]
+
+
+def read_sweep_file(filename):
+    """
+        Reads sweep parameters from a file, key=value or key=a|b|c, one or
+        more comma separated per line. Blank lines and # comments are skipped.
+    """
+    params = {}
+    with open(filename, 'r', encoding="utf-8") as sweep_file:
+        for line in sweep_file:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                params.update(parse_params(line))
+    return params
+
+
+def parse_build_numbers(numbers):
+    """
+    Parses build numbers like 100, 100-120 or 100-105,110
+
+        Returns:
+            list of build numbers
+    """
+    build_numbers = []
+    for part in numbers.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if '-' in part:
+                (first, last) = part.split('-', 1)
+                build_numbers.extend(range(int(first), int(last) + 1))
+            else:
+                build_numbers.append(int(part))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid build number or range: '{part}'")
+    return build_numbers
+
+
+def read_jobs_file(filename):
+    """
+        Reads job names from a file, one per line. Blank lines and # comments
+        are skipped.
+    """
+    jobs = []
+    with open(filename, 'r', encoding="utf-8") as jobs_file:
+        for line in jobs_file:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                jobs.append(line)
+    return jobs
+
+
 def parse_commandline():
     """
     Parses command line and returns options object.
@@ -441,6 +939,14 @@ def parse_commandline():
                         action='store_true',
                         help="Dump out the console text",
                         default=False)
+    parser.add_argument("-o", "--output", dest="output",
+                        help="Write the console (-c) to this file instead of stdout. "
+                             "{job} and {number} get filled in",
+                        default=None)
+    parser.add_argument("-z", "--gzip", dest="gzip",
+                        action='store_true',
+                        help="Gzip the console file (-o), on by default for .gz names",
+                        default=False)
     parser.add_argument("-d", "--details", dest="details",
                         action='store_true',
                         help="Show error details for test failures",
@@ -450,14 +956,59 @@ def parse_commandline():
                         help="Show only failed test results",
                         default=False)
     parser.add_argument("-j", "--jobname", dest="jobname",
-                        help="Name of Jenkins job to run",
+                        help="Name of Jenkins job to run, or a comma separated list of jobs",
+                        default=None)
+    parser.add_argument("--jobs-file", dest="jobs_file",
+                        help="File with more job names, one per line",
                         default=None)
     parser.add_argument("-k", "--kill", dest="killbuild",
                         help="Kill build specified by -n",
                         action='store_true',
                         default=None)
-    parser.add_argument("-n", "--number", dest="build_number",
-                        help="Build number to kill or use parameters from",
+    parser.add_argument("-n", "--number", dest="build_numbers",
+                        help="Build number to kill or use parameters from. "
+                             "--grep and --tail also take ranges like 100-120,125",
+                        type=parse_build_numbers,
+                        default=[])
+    parser.add_argument("-g", "--grep", dest="grep",
+                        help="Search the console for this regex, like grep -n. Exits 0 if any build "
+                             "matched, 1 if none did, 2 if a console couldn't be read",
+                        default=None)
+    parser.add_argument("-C", "--context", dest="context",
+                        help="Lines of context around --grep matches",
+                        type=int,
+                        default=0)
+    parser.add_argument("-i", "--ignore-case", dest="ignore_case",
+                        action='store_true',
+                        help="Case insensitive --grep",
+                        default=False)
+    parser.add_argument("--diff", dest="diff",
+                        help="Show tests that changed status between build A and build B",
+                        metavar=("A", "B"),
+                        nargs=2,
+                        type=int,
+                        default=None)
+    parser.add_argument("--flaky", dest="flaky",
+                        help="Find tests that flipped between pass and fail in the last N builds",
+                        metavar="N",
+                        type=int,
+                        default=None)
+    parser.add_argument("--no-cache", dest="no_cache",
+                        action='store_true',
+                        help="Don't read or write the cache of finished builds",
+                        default=False)
+    parser.add_argument("--refresh", dest="refresh",
+                        action='store_true',
+                        help="Refetch finished builds and update the cache",
+                        default=False)
+    parser.add_argument("--profile", dest="profile",
+                        nargs='?',
+                        const='-',
+                        metavar="FILE",
+                        help="Print where the time went to stderr, and write a Chrome trace to FILE if given",
+                        default=None)
+    parser.add_argument("--tail", dest="tail",
+                        help="Show the last TAIL lines of the console, only fetching the end of it",
                         type=int,
                         default=None)
     parser.add_argument("-l", "--list", dest="list",
@@ -465,12 +1016,25 @@ def parse_commandline():
                         help="List out parameters for specified build or job defaults",
                         default=False)
     parser.add_argument("-p", "--params", dest="params",
-                        help="Param changes in the form key=value,key2=value",
+                        action='append',
+                        help="Param changes in the form key=value,key2=value, can be given more than once. "
+                             "With --sweep, key=a|b|c sweeps over the values",
                         default=None)
     parser.add_argument("-r", "--results", dest="results",
                         action='store_true',
                         help="Display test results",
                         default=False)
+    parser.add_argument("--sweep", dest="sweep",
+                        nargs='?',
+                        const='',
+                        metavar="FILE",
+                        help="Launch every combination of the -p key=a|b|c values (and FILE's, one per line), "
+                             "follow them all and print a summary",
+                        default=None)
+    parser.add_argument("--max-active", dest="max_active",
+                        help="Most --sweep builds queued or running at once",
+                        type=int,
+                        default=4)
     parser.add_argument("-s", "--stream", dest="stream_console",
                         action='store_true',
                         help="Stream the console for a job, or after build is launched",
@@ -481,7 +1045,11 @@ def parse_commandline():
                         default=False)
     parser.add_argument("-u", "--update", dest="update_job",
                         action='store_true',
-                        help="Update the job's default parameters with supplied params (Bool and String params only for now)",
+                        help="Update the job's default parameters with supplied params, any parameter type",
+                        default=False)
+    parser.add_argument("--dry-run", dest="dry_run",
+                        action='store_true',
+                        help="With -u, show what would change in config.xml without updating it",
                         default=False)
     parser.add_argument("-x", "--exec", dest="fire",
                         action='store_true',
@@ -490,12 +1058,65 @@ def parse_commandline():
 
     options = parser.parse_args()
 
-    # Parse the build parameter overrides into a dict
-    if options.params:
-        options.params = parse_params(options.params)
+    # Most things work on one build, only the console searching takes ranges
+    options.build_number = options.build_numbers[0] if options.build_numbers else None
+    if len(options.build_numbers) > 1 and not (options.grep or options.tail is not None):
+        parser.error("Build ranges (-n 100-120) only work with --grep or --tail")
+
+    if options.grep and options.tail is not None:
+        parser.error("Use either --grep or --tail, not both")
+
+    # Gather up the jobs from -j and the jobs file
+    options.jobs = []
+    if options.jobname:
+        options.jobs.extend(name.strip() for name in options.jobname.split(',') if name.strip())
+    if options.jobs_file:
+        try:
+            options.jobs.extend(read_jobs_file(options.jobs_file))
+        except OSError as e:
+            parser.error(f"Can't read jobs file: {e}")
+
+    if not options.jobs:
+        parser.error("Must specify a job name (-j) or a jobs file (--jobs-file)")
+
+    if len(options.jobs) > 1 and options.stream_console:
+        parser.error("Streaming (-s) only works with a single job")
+
+    # Each job's output is held back until it's done, whole consoles would
+    # pile up in memory
+    if len(options.jobs) > 1 and options.get_console and not options.output:
+        parser.error("Dumping the console (-c) of several jobs needs -o with {job} in it")
+
+    if len(options.jobs) > 1 and options.output and '{job}' not in options.output:
+        parser.error("Put {job} in the output file name (-o) when dumping several jobs")
+
+    # Parse the build parameter overrides into a dict, later -p's win
+    params = {}
+    if options.sweep:
+        try:
+            params.update(read_sweep_file(options.sweep))
+        except OSError as e:
+            parser.error(f"Can't read sweep file: {e}")
+    for text in options.params or []:
+        params.update(parse_params(text))
+    options.params = params or None
+
+    if options.update_job:
+        if not options.params:
+            parser.error("Give the new defaults (-p) to update (-u)")
+        if options.fire or options.killbuild or options.stream_console:
+            parser.error("Update (-u) doesn't go with -x, -k or -s, run it first on its own")
+    elif options.dry_run:
+        parser.error("--dry-run goes with -u")
+
+    if options.sweep is not None:
+        if options.stream_console or options.killbuild or options.update_job or options.fire:
+            parser.error("--sweep launches by itself, leave off -x, -s, -k and -u")
+        if options.max_active < 1:
+            parser.error("--max-active needs to be at least 1")
 
     # Make sure that options that need a job number get a job number
-    if ((options.stream_console or options.get_console) 
+    if ((options.stream_console or options.get_console or options.grep or options.tail is not None)
         and not (options.last or options.fire or options.build_number is not None)):
        parser.error("Must specify a job (-n) or the most recent job (-t)" 
                     + " in order to get or stream the console") 
@@ -4,10 +4,11 @@
     It's great, but it's slow for quicky things like grabbing a pipeline status and exiting. 
     This module uses the jenkinsapi requester because it had the sensible stuff done already.
 '''
-import ast
 import json
 import logging
-from typing import Any
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from urllib.parse import urlparse
 from urllib.request import Request, HTTPRedirectHandler, build_opener
@@ -15,11 +16,43 @@ from urllib.parse import quote as urlquote
 from urllib.parse import urlencode
 
 from requests import HTTPError, ConnectionError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from jenkinsapi.custom_exceptions import JenkinsAPIException
 from jenkinsapi.utils.requester import Requester
 
+import jsonstream
+from responsecache import is_terminal
+from tracing import NULL_TRACER
+
 logger = logging.getLogger(__name__)
 
+# How many requests we keep in flight against one server at a time
+DEFAULT_MAX_WORKERS = 8
+# Retries for connection hiccups and 429/503 from a busy server
+DEFAULT_RETRIES = 3
+
+# Test counters for the last N builds of a job, in one go
+SUMMARY_TREE = 'builds[number,actions[failCount,skipCount,totalCount]]{0,%d}'
+
+# What the fingerprint api needs to tell who made each file
+FINGERPRINT_TREE = 'fingerprint[fileName,original[name,number],timestamp]'
+
+# A job's parameter definitions with their defaults
+PARAMS_TREE = 'property[parameterDefinitions[name,type,description,defaultParameterValue[name,value]]]'
+
+# Enough of a queue item to say why it's waiting, or what build it turned into
+QUEUE_ITEM_TREE = 'id,why,blocked,buildable,stuck,cancelled,inQueueSince,task[name],executable[number,url]'
+
+# Fingerprints page bits, compiled once. The table is walked tag by tag so
+# there's no .*? over the whole page to backtrack on.
+_TABLE_TAGS = re.compile(r'<(/?)(tr|td|th)\b[^>]*>', re.IGNORECASE)
+_TAGS = re.compile(r'<[^>]+>')
+_LINK_TEXT = re.compile(r'>([^<]+)</a>')
+_JOB_LINK = re.compile(r'href="/job/([^/]+)/(\d+)/')
+
+
 class JenkinsLight():
 
     def __init__(
@@ -32,16 +65,33 @@ class JenkinsLight():
         cert=None,
         timeout: int = 10,
         max_retries=None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        cache=None,
+        compress: bool = True,
+        tracer=None,
     ) -> None:
         """
         :param baseurl: baseurl for jenkins instance including port, str
         :param username: username for jenkins auth, str
         :param password: password for jenkins auth, str
+        :param max_workers: max requests in flight at once for fetch_all, int
+        :param cache: ResponseCache for finished builds, None to always fetch
+        :param compress: ask for gzipped responses, bool
+        :param tracer: tracing.Tracer to record requests and parse times in
         :return: a Jenkins obj
         """
         self.username = username
         self.password = password
         self.baseurl = baseurl
+        self.max_workers = max(1, max_workers)
+        self.cache = cache
+        self.tracer = tracer or NULL_TRACER
+        # Jobs whose builds don't have fingerprints in the json api
+        self._html_fingerprints = set()
+        # ETags and Last-Modifieds for conditional GETs
+        self._validators = Revalidator(baseurl, cache)
+        # CSRF crumb header for POSTs, fetched the first time one's needed
+        self._crumb = None
         if requester is None:
             requester = Requester
 
@@ -57,99 +107,428 @@ class JenkinsLight():
         else:
             self.requester = requester
 
+        # Size the connection pool for fetch_all so concurrent requests reuse
+        # connections instead of paying for a new TLS handshake each time.
+        session = getattr(self.requester, 'session', None)
+        if session is not None:
+            tune_session(session, self.max_workers, max_retries, compress)
+            self.tracer.hook(session)
+
+    def pool_stats(self):
+        """How well the connection pool is doing
+
+        Returns:
+            Dict with 'opened' (new connections made), 'requests' (requests
+            sent over pooled connections, retries included) and 'reused'
+            (requests that didn't need a new connection)
+        """
+        session = getattr(self.requester, 'session', None)
+        return session_pool_stats(session) if session is not None else {}
 
     def get_pipeline_data(self, jobname, filename):
-        """_summary_
+        """Get the wfapi run list for a pipeline job
+
+        If Jenkins handed out an ETag or Last-Modified last time, we ask again
+        conditionally and a 304 gets the previous data back for free.
 
         Args:
-            j (_type_): _description_
-            jobname (_type_): _description_
-            filename (_type_): _description_
+            jobname: Name of the Jenkins job
+            filename: Save the json to this file too, None to skip
 
         Returns:
-            _type_: _description_
-        """    
-        data = None
+            List of run dicts, newest first
+        """
         url = self.baseurl + '/job/' + jobname + '/wfapi/runs'
-        # print(f'pipeline url {url}')
-        requester = self.requester
+        json_data = self._revalidated(url, None, self._parse_json)
 
-        response = requester.get_url(url)
+        if filename is not None:
+            save_json(json_data, filename)
 
-        content: Any = response.content
+        return json_data
 
-        if isinstance(content, str):
-            data = content
-        elif isinstance(content, bytes):
-            data = content.decode(response.encoding or "ISO-8859-1")
+    def get_pipeline_run(self, jobname, jobno):
+        """Get one run, the same shape as the entries get_pipeline_data returns
 
-        if response.status_code != 200:
-            logger.error(
-                "Failed request at %s with params: %s %s",
-                url,
-                None,
-                "",
-            )
-            response.raise_for_status()
+        For runs that have dropped out of wfapi/runs, which only has the
+        newest handful.
+        """
+        url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/wfapi/describe'
+        return self._get_json(url)
 
-        json_data = json.loads(data)
+    def get_build_numbers(self, jobname, since, page=100):
+        """Numbers of the builds newer than since, newest first
 
-        if filename is not None:
-            j = json.dumps(json_data, indent=4, ensure_ascii=False)
-            with open(filename, 'w', encoding="utf-8") as output_file:
-                output_file.write(j)
+        Pages back through allBuilds page builds at a time until it gets to
+        since, or runs out of builds.
+        """
+        url = self.baseurl + '/job/' + jobname + '/api/json'
+        numbers = []
+        first = 0
+        while True:
+            data = self._get_json(url, {'tree': 'allBuilds[number]{%d,%d}' % (first, first + page)})
+            builds = data.get('allBuilds', [])
+            for build in builds:
+                if build["number"] <= since:
+                    return numbers
+                numbers.append(build["number"])
+            if len(builds) < page:
+                return numbers
+            first += page
 
-        return json_data
+    def get_job_params(self, jobname):
+        """Get a job's parameter definitions
+
+        Returns:
+            List of parameter definition dicts, same shape as jenkinsapi's
+            Job.get_params(), each with a defaultParameterValue holding the
+            name and default value
+        """
+        url = self.baseurl + '/job/' + jobname + '/api/json'
+        data = self._revalidated(url, {'tree': PARAMS_TREE}, self._parse_json)
+
+        params = []
+        for prop in data.get("property", []):
+            params.extend(prop.get("parameterDefinitions") or [])
+        return params
+
+    def get_build_info(self, jobname, jobno):
+        """Get the basics for one build, parameters included
 
-    def get_pipeline_results(self, jobname, jobno):
-        """_summary_
+        Args:
+            jobname: Name of the Jenkins job
+            jobno: Build number, or a permalink like 'lastBuild'
+
+        Returns:
+            Dict with number, fullDisplayName, result, building, duration,
+            timestamp and actions (only the ones carrying parameters)
+        """
+        url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/api/json'
+        tree = 'number,fullDisplayName,result,building,duration,timestamp,actions[parameters[name,value]]'
+        return self._get_json(url, {'tree': tree})
+
+    def get_queue(self):
+        """Everything waiting in the build queue, one request
+
+        Returns:
+            List of queue item dicts (QUEUE_ITEM_TREE fields)
+        """
+        url = self.baseurl + '/queue/api/json'
+        return self._get_json(url, {'tree': 'items[%s]' % QUEUE_ITEM_TREE}).get('items', [])
+
+    def get_queue_item(self, queue_id):
+        """One queue item, still waiting or already left the queue
+
+        Once it's left, executable has the build number, or cancelled is
+        set. Jenkins forgets items a few minutes after they leave, then
+        it's a 404.
+        """
+        url = self.baseurl + '/queue/item/' + str(queue_id) + '/api/json'
+        return self._get_json(url, {'tree': QUEUE_ITEM_TREE})
+
+    def get_config_xml(self, jobname):
+        """Get a job's config.xml, bytes as Jenkins sent them"""
+        url = self.baseurl + '/job/' + jobname + '/config.xml'
+        # latin-1 turns any bytes into json-able text and back without a loss
+        return self._revalidated(url, None, lambda response: response.content.decode('latin-1')).encode('latin-1')
+
+    def post_config_xml(self, jobname, config_xml):
+        """Replace a job's config.xml
+
+        Sends the CSRF crumb along when the server hands them out. API token
+        logins don't need one since Jenkins 2.96, but plenty of servers are
+        older than that or are logged into with a password.
+        """
+        url = self.baseurl + '/job/' + jobname + '/config.xml'
+        headers = {'Content-Type': 'text/xml'}
+        headers.update(self.crumb_header())
+        self.requester.post_and_confirm_status(url, data=config_xml, headers=headers, valid=[200])
+        # A Last-Modified to the second could miss a change made this second
+        self._validators.forget(url)
+        self._validators.forget(self.baseurl + '/job/' + jobname + '/api/json', {'tree': PARAMS_TREE})
+
+    def crumb_header(self):
+        """The crumb as a header for POSTs, {} when CSRF protection is off
+
+        Asked for once, the crumb is good for as long as the session is. A
+        404 from crumbIssuer means there's no protection to satisfy.
+        """
+        if self._crumb is None:
+            url = self.baseurl + '/crumbIssuer/api/json'
+            response = self.requester.get_url(url)
+            if response.status_code == 404:
+                self._crumb = {}
+            else:
+                if response.status_code != 200:
+                    logger.error("Failed request at %s", url)
+                    response.raise_for_status()
+                crumb = json.loads(response.content)
+                self._crumb = {crumb['crumbRequestField']: crumb['crumb']}
+        return self._crumb
+
+    def copy_console_text(self, jobname, jobno, out, chunk_size=65536):
+        """Streams a build's whole console into out, chunk by chunk
 
         Args:
-            j (_type_): _description_
-            jobname (_type_): _description_
-            filename (_type_): _description_
+            out: anything with a write(bytes) method
+
+        Returns:
+            Number of bytes written
+        """
+        url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/consoleText'
+        response = self.requester.get_url(url, stream=True)
+        try:
+            if response.status_code != 200:
+                logger.debug("Failed request at %s", url)
+                response.raise_for_status()
+
+            written = 0
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            response.close()
+        return written
+
+    def get_console_tail(self, jobname, jobno, nbytes):
+        """Get the last nbytes of a build's console
+
+        Asks for a byte range so only the end comes over the wire. Servers that
+        ignore Range send it all, then it's streamed through and only the tail
+        is kept, so memory stays bounded either way.
 
         Returns:
-            _type_: _description_
-        """    
-        data = None
+            Tuple of (bytes, truncated, ranged). truncated means there's more
+            console before what we got, ranged means the server honored Range.
+        """
+        url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/consoleText'
+        response = self.requester.get_url(url, headers={'Range': 'bytes=-%d' % nbytes}, stream=True)
+        try:
+            if response.status_code == 206:
+                data = response.content
+                # Content-Range: bytes first-last/total
+                content_range = response.headers.get('Content-Range', '')
+                first = content_range.split(' ')[-1].split('-')[0]
+                truncated = first.isdigit() and int(first) > 0
+                return (data, truncated, True)
 
-        url = self.baseurl + '/job/' + jobname + '/' + jobno + '/testReport/api/python'
-        # print(f'pipeline url {url}')
-        requester = self.requester
+            if response.status_code == 416:
+                # Nothing in the console to give a range of
+                return (b'', False, True)
 
-        response = requester.get_url(url)
+            if response.status_code != 200:
+                logger.debug("Failed request at %s", url)
+                response.raise_for_status()
 
-        content: Any = response.content
+            tail = bytearray()
+            total = 0
+            for chunk in response.iter_content(chunk_size=65536):
+                tail += chunk
+                total += len(chunk)
+                if len(tail) > 2 * nbytes:
+                    del tail[:-nbytes]
+            return (bytes(tail[-nbytes:]), total > nbytes, False)
+        finally:
+            response.close()
 
-        if isinstance(content, str):
-            data = content
-        elif isinstance(content, bytes):
-            data = content.decode(response.encoding or "ISO-8859-1")
+    def copy_progressive_text(self, jobname, jobno, start, out):
+        """Streams the console from byte offset start into out
+
+        The body is written to out chunk by chunk as it arrives, so even the
+        first request against a huge console doesn't sit in memory. If the
+        connection drops partway, whatever reached out is still good but
+        there's no telling what offset it got to, Jenkins strips the console
+        notes so the text is shorter than the log. Ask again from start, the
+        text comes out the same, and skip what already arrived.
+
+        Args:
+            out: anything with a write(bytes) method
+
+        Returns:
+            Tuple of (offset to ask for next time, more data coming)
+        """
+        url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/logText/progressiveText'
+        response = self.requester.get_url(url, params={'start': start}, stream=True)
+        try:
+            if response.status_code != 200:
+                logger.debug("Failed request at %s from %d", url, start)
+                response.raise_for_status()
+
+            more_data = response.headers.get('X-More-Data', '').lower() == 'true'
+            written = 0
+            for chunk in response.iter_content(chunk_size=65536):
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            response.close()
+
+        size = int(response.headers.get('X-Text-Size', start + written))
+        return (size, more_data)
+
+    def get_pipeline_results(self, jobname, jobno, status=None, tree=None):
+        """Get the test report for a build
+
+        Args:
+            jobname: Name of the Jenkins job
+            jobno: Build number
+            status: Build status if known. Finished builds are served from
+                and saved to the cache.
+            tree: Jenkins tree= filter if you only want some of the fields,
+                e.g. 'suites[name,cases[className,name,status]]'
+
+        Returns:
+            The test report dict
+        """
+        endpoint = 'testReport' if tree is None else 'testReport?tree=' + tree
+        return self._cached(endpoint, jobname, jobno, status,
+                            lambda: self._fetch_pipeline_results(jobname, jobno, tree))
+
+    def _fetch_pipeline_results(self, jobname, jobno, tree=None):
+        url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/testReport/api/json'
+        params = {'tree': tree} if tree else None
+
+        response = self.requester.get_url(url, params=params)
 
         if response.status_code != 200:
-            logger.debug(
-                "Failed request at %s with params: %s %s",
-                url,
-                None,
-                "",
-            )
+            logger.debug("Failed request at %s with params: %s", url, params)
             response.raise_for_status()
 
+        # json.loads takes the raw bytes, no need to decode the text first
+        content = response.content
         try:
-             return ast.literal_eval(response.text)
-        except Exception:
+            with self.tracer.span('parse', url=url):
+                return json.loads(content)
+        except ValueError:
             logger.exception("Inappropriate content found at %s", url)
-            raise JenkinsAPIException("Cannot parse %s" % response.content)
+            raise JenkinsAPIException("Cannot parse %s" % url)
+
+    def iter_test_cases(self, jobname, jobno, only_failed=False, tree=None):
+        """Streams the cases of a build's test report
+
+        The report is parsed as it comes off the wire, so a huge report is
+        never held in memory whole. Pair with tree= to only pull the fields
+        you care about.
+
+        Args:
+            jobname: Name of the Jenkins job
+            jobno: Build number
+            only_failed: skip PASSED and FIXED cases while parsing
+            tree: Jenkins tree= filter, should keep suites[name,cases[...]]
+
+        Yields:
+            (suite name, case dict) tuples
+        """
+        url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/testReport/api/json'
+        params = {'tree': tree} if tree else None
+
+        response = self.requester.get_url(url, params=params, stream=True)
+        try:
+            if response.status_code != 200:
+                logger.debug("Failed request at %s with params: %s", url, params)
+                response.raise_for_status()
 
-    def get_fingerprints(self, jobname, jobno):
+            chunks = jsonstream.iter_text(response.iter_content(chunk_size=65536),
+                                          response.encoding or "utf-8")
+            # Parsed as it downloads, so this span has the download in it too
+            with self.tracer.span('stream parse', url=url):
+                yield from jsonstream.iter_test_cases(chunks, only_failed)
+        finally:
+            response.close()
+
+    def get_results_summary(self, jobname, jobno, status=None):
+        """Get just the pass/fail/skip counters for a build's test report
+
+        Uses tree= so Jenkins only sends the three counters instead of every
+        case and stack trace in the report.
+
+        Returns:
+            Dict with passCount, failCount and skipCount
+        """
+        url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/testReport/api/json'
+        return self._cached('testSummary', jobname, jobno, status,
+                            lambda: self._get_json(url, {'tree': 'passCount,failCount,skipCount'}))
+
+    def get_job_results_summary(self, jobname, count):
+        """Get the test counters for the last count builds of a job in one request
+
+        Args:
+            jobname: Name of the Jenkins job
+            count: How many of the most recent builds to look at
+
+        Returns:
+            Tuple of (summaries, oldest). summaries is a dict keyed on build
+            number (as a str, like the wfapi run ids) holding passCount,
+            failCount and skipCount. Builds without test results are left out.
+            oldest is the lowest build number Jenkins sent back, or None.
+        """
+        url = self.baseurl + '/job/' + jobname + '/api/json'
+        return job_results_summary(self._get_json(url, {'tree': SUMMARY_TREE % count}))
+
+    def get_build_statuses(self, jobname, count):
+        """Get the number and result of the last count builds in one request
+
+        Returns:
+            List of (number, result) tuples, newest first. result is None for
+            builds that are still going.
+        """
+        url = self.baseurl + '/job/' + jobname + '/api/json'
+        # builds stops at 100, allBuilds goes all the way back but costs more
+        field = 'builds' if count <= 100 else 'allBuilds'
+        data = self._get_json(url, {'tree': '%s[number,result]{0,%d}' % (field, count)})
+        return [(build["number"], build.get("result")) for build in data.get(field, [])]
+
+    def get_run_summaries(self, jobname, runs):
+        """Test counters for a list of wfapi runs of one job
+
+        Finished runs come out of the cache when we have them, everything else
+        is picked up with a single get_job_results_summary request. Runs older
+        than what that request covered fall back to get_results_summary.
+
+        Returns:
+            Dict keyed on run id. Runs without test results get a LookupError
+            in their slot, same convention as fetch_all.
+        """
+        summaries = {}
+        wanted = []
+        for run in runs:
+            if self.cache is not None and is_terminal(run.get("status")):
+                key = (self.baseurl, jobname, str(run["id"]), 'testSummary')
+                cached = self.cache.get(key)
+                if cached is not None:
+                    summaries[run["id"]] = cached
+                    continue
+            wanted.append(run)
+
+        if not wanted:
+            return summaries
+
+        (found, oldest) = self.get_job_results_summary(jobname, len(runs))
+        for run in wanted:
+            if run["id"] in found:
+                summary = found[run["id"]]
+                if self.cache is not None and is_terminal(run.get("status")):
+                    self.cache.put((self.baseurl, jobname, str(run["id"]), 'testSummary'), summary)
+            elif oldest is not None and int(run["id"]) < oldest:
+                try:
+                    summary = self.get_results_summary(jobname, run["id"], run.get("status"))
+                except Exception as e:
+                    summary = e
+            else:
+                summary = LookupError(f"No test results for {jobname} #{run['id']}")
+            summaries[run["id"]] = summary
+        return summaries
+
+    def get_fingerprints(self, jobname, jobno, status=None):
         """Get fingerprints information from a build
         
-        Parses the fingerprints HTML page to extract file fingerprint data.
+        Asks the build's json api for its fingerprints, and falls back to the
+        fingerprints HTML page for builds that don't have them there
+        (pipeline runs).
         
         Args:
             jobname: Name of the Jenkins job  
             jobno: Build number
+            status: Build status if known. Finished builds are served from
+                and saved to the cache.
             
         Returns:
             List of dicts with keys: filename, owner, owner_job, owner_build_number, age
@@ -170,75 +549,496 @@ class JenkinsLight():
                 }
             ]
         """
-        import re
-        from html.parser import HTMLParser
-        
-        data = None
+        return self._cached('fingerprints', jobname, jobno, status,
+                            lambda: self._fetch_fingerprints(jobname, jobno))
+
+    def _fetch_fingerprints(self, jobname, jobno):
+        # Freestyle builds have the fingerprints in their json api, pipeline
+        # runs don't. Once a job turns out not to, go straight to the page.
+        if jobname not in self._html_fingerprints:
+            url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/api/json'
+            data = self._get_json(url, {'tree': FINGERPRINT_TREE})
+            if 'fingerprint' in data:
+                return fingerprints_from_json(data['fingerprint'], jobname, jobno)
+            self._html_fingerprints.add(jobname)
+
         url = self.baseurl + '/job/' + jobname + '/' + str(jobno) + '/fingerprints/'
-        requester = self.requester
-        
-        response = requester.get_url(url)
-        content: Any = response.content
-        
-        if isinstance(content, str):
-            data = content
-        elif isinstance(content, bytes):
-            data = content.decode(response.encoding or "ISO-8859-1")
-            
+        response = self.requester.get_url(url)
+
         if response.status_code != 200:
-            logger.verbose(
-                "Failed request at %s",
-                url,
-            )
+            logger.debug("Failed request at %s", url)
             response.raise_for_status()
-            
-        fingerprints = []
-        
-        # Parse HTML table rows - looking for patterns like:
-        # <td><a href="/fingerprint/...">filename</a></td>
-        # <td>this build</td> OR <td><a href="/job/jobname/123/">jobname #123</a></td>
-        # <td>age</td>
-        
-        # Extract table rows
-        row_pattern = r'<tr>.*?</tr>'
-        rows = re.findall(row_pattern, data, re.DOTALL)
-        
-        for row in rows:
-            # Skip header rows
-            if '<th' in row:
+
+        page = response.content.decode(response.encoding or "ISO-8859-1")
+        with self.tracer.span('parse', url=url):
+            return parse_fingerprints_html(page)
+
+    def get_downstream_index(self, subjob, count=100):
+        """Which upstream builds kicked off the last count builds of subjob
+
+        One request on the subjob's side, reading the upstream causes of its
+        builds, instead of a fingerprints page per upstream run.
+
+        Args:
+            subjob: Name of the downstream job, /job/ separated for folders
+            count: How many of its most recent builds to look at
+
+        Returns:
+            Tuple of (index, full). index maps (upstream project, upstream
+            build number) to the subjob build numbers it started. full means
+            Jenkins sent all count builds, so there could be older ones.
+        """
+        url = self.baseurl + '/job/' + subjob + '/api/json'
+        # builds stops at 100, allBuilds goes all the way back but costs more
+        field = 'builds' if count <= 100 else 'allBuilds'
+        tree = '%s[number,actions[causes[upstreamProject,upstreamBuild]]]{0,%d}' % (field, count)
+        builds = self._get_json(url, {'tree': tree}).get(field, [])
+
+        index = {}
+        for build in builds:
+            for action in build.get("actions", []):
+                for cause in (action or {}).get("causes", []):
+                    if cause.get("upstreamProject") and cause.get("upstreamBuild") is not None:
+                        key = (cause["upstreamProject"], int(cause["upstreamBuild"]))
+                        index.setdefault(key, []).append(build["number"])
+        return (index, len(builds) >= count)
+
+    def resolve_downstream(self, job_runs, subjob):
+        """Finds the subjob builds each upstream run started
+
+        Builds the upstream -> downstream index from the subjob side (one
+        request, two if the runs reach further back than the first batch of
+        subjob builds) and joins the runs against it. Runs the index can't
+        speak for, because the upstream never triggers subjob directly or the
+        run is older than the index goes, fall back to their fingerprints.
+
+        Args:
+            job_runs: list of (jobname, runs) tuples like fetch_run_details
+            subjob: Name of the downstream job, with / or /job/ for folders
+
+        Returns:
+            Dict keyed on (jobname, run id) holding a list of subjob build numbers
+        """
+        subjob_name = subjob.replace('/job/', '/')
+        wanted = [(jobname, jobname.replace('/job/', '/'), run) for (jobname, runs) in job_runs for run in runs]
+        if not wanted:
+            return {}
+
+        for count in (100, 1000):
+            (index, full) = self.get_downstream_index(subjob_name.replace('/', '/job/'), count)
+            # How far back the index goes for each upstream project
+            reach = {}
+            for (project, number) in index:
+                reach[project] = min(reach.get(project, number), number)
+            too_old = [run for (_, project, run) in wanted
+                       if project in reach and int(run["id"]) < reach[project]]
+            if not (full and too_old):
+                break
+
+        downstream = {}
+        fallback = []
+        for (jobname, project, run) in wanted:
+            # Older than the index goes only matters if there are older subjob builds
+            if project in reach and not (full and int(run["id"]) < reach[project]):
+                downstream[(jobname, run["id"])] = sorted(index.get((project, int(run["id"])), []))
+            else:
+                fallback.append((jobname, run))
+
+        fingerprints = self.fetch_all([(self.get_fingerprints, (jobname, run["id"], run.get("status")))
+                                       for (jobname, run) in fallback])
+        for ((jobname, run), prints) in zip(fallback, fingerprints):
+            if isinstance(prints, Exception):
+                downstream[(jobname, run["id"])] = prints
                 continue
-                
-            # Extract cells
-            cell_pattern = r'<td[^>]*>(.*?)</td>'
-            cells = re.findall(cell_pattern, row, re.DOTALL)
-            
-            if len(cells) >= 3:
-                # First cell: filename
-                filename_match = re.search(r'>([^<]+)</a>', cells[0])
-                filename = filename_match.group(1) if filename_match else ''
-                
-                # Second cell: owner
-                owner_text = re.sub(r'<[^>]+>', '', cells[1]).strip()
-                
-                # Check if owner is a job link
-                job_link_match = re.search(r'href="/job/([^/]+)/(\d+)/', cells[1])
-                owner_job = None
-                owner_build_number = None
-                
-                if job_link_match:
-                    owner_job = job_link_match.group(1)
-                    owner_build_number = int(job_link_match.group(2))
-                
-                # Third cell: age
-                age = re.sub(r'<[^>]+>', '', cells[2]).strip()
-                
-                fingerprints.append({
-                    'filename': filename,
-                    'owner': owner_text,
-                    'owner_job': owner_job,
-                    'owner_build_number': owner_build_number,
-                    'age': age
-                })
-                
-        return fingerprints
+            downstream[(jobname, run["id"])] = [fp['owner_build_number'] for fp in prints
+                                                if fp['owner_job'] == subjob_name and fp['owner_build_number']]
+        return downstream
+
+    def _cached(self, endpoint, jobname, jobno, status, fetch):
+        """Serves finished builds out of the cache, calls fetch() for the rest"""
+        if self.cache is None or not is_terminal(status):
+            return fetch()
+
+        key = (self.baseurl, jobname, str(jobno), endpoint)
+        value = self.cache.get(key)
+        if value is None:
+            value = fetch()
+            self.cache.put(key, value)
+        return value
+
+    def fetch_all(self, calls):
+        """Runs a batch of calls concurrently, at most max_workers at a time
+
+        Args:
+            calls: list of (callable, args) tuples, usually bound JenkinsLight
+                methods like (j.get_fingerprints, (jobname, jobno))
+
+        Returns:
+            List of results in the same order as calls. If a call raised, its
+            exception object is put in its slot instead, so one missing test
+            report doesn't sink the whole batch. Callers check with isinstance.
+        """
+        if not calls:
+            return []
+
+        workers = min(self.max_workers, len(calls))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(func, *args) for (func, args) in calls]
+
+        results = []
+        for future in futures:
+            error = future.exception()
+            results.append(error if error is not None else future.result())
+        return results
+
+    def fetch_run_details(self, job_runs, results=True, fingerprints=False, summary=False,
+                          downstream=None):
+        """Fans out the per-run requests for every run of every job at once
+
+        Args:
+            job_runs: list of (jobname, runs) tuples, runs being the run dicts
+                from get_pipeline_data
+            results: fetch the test results for each run
+            fingerprints: fetch the fingerprints for each run
+            summary: only fetch the test counters, one request per job
+                instead of a full test report per run
+            downstream: subjob name, find the builds of it each run started
+                with resolve_downstream
+
+        Returns:
+            Dict keyed on (jobname, run id) holding a dict with 'results',
+            'fingerprints' and/or 'downstream' keys. Values are whatever fetch_all returned, so a
+            failed request shows up as an exception object.
+        """
+        calls = []
+        slots = []
+        for (jobname, runs) in job_runs:
+            if results and summary:
+                calls.append((self.get_run_summaries, (jobname, runs)))
+                slots.append((jobname, None, 'summaries'))
+            for run in runs:
+                if results and not summary:
+                    calls.append((self.get_pipeline_results, (jobname, run["id"], run.get("status"))))
+                    slots.append((jobname, run["id"], 'results'))
+                if fingerprints:
+                    calls.append((self.get_fingerprints, (jobname, run["id"], run.get("status"))))
+                    slots.append((jobname, run["id"], 'fingerprints'))
+
+        details = {}
+        for ((jobname, run_id, kind), value) in zip(slots, self.fetch_all(calls)):
+            if kind == 'summaries':
+                # One value for the whole job, spread it out over the runs
+                for run in dict(job_runs)[jobname]:
+                    if isinstance(value, Exception):
+                        summary = value
+                    else:
+                        summary = value.get(run["id"], LookupError(run["id"]))
+                    details.setdefault((jobname, run["id"]), {})['results'] = summary
+                continue
+            details.setdefault((jobname, run_id), {})[kind] = value
+
+        if downstream:
+            self.add_downstream(details, job_runs, downstream)
+        return details
+
+    def add_downstream(self, details, job_runs, subjob):
+        """Puts what resolve_downstream finds under each run's 'downstream' key
+
+        A lookup that falls over lands in every run's slot, like a failed
+        fetch_all call would.
+        """
+        try:
+            resolved = self.resolve_downstream(job_runs, subjob)
+        except Exception as e:
+            resolved = {(jobname, run["id"]): e for (jobname, runs) in job_runs for run in runs}
+        for (key, numbers) in resolved.items():
+            details.setdefault(key, {})['downstream'] = numbers
+        return details
+
+    def _revalidated(self, url, params, parse):
+        """GETs url, conditionally if we've had it before
+
+        A 304 hands back the parsed copy Revalidator kept, even from the last
+        time janky ran.
+
+        Args:
+            parse: turns the response into something json can store
+        """
+        (entry, headers) = self._validators.lookup(url, params)
+        response = self.requester.get_url(url, params=params, headers=headers or None)
+        if response.status_code == 304 and entry is not None:
+            return self._validators.not_modified(url, params, entry)
+
+        if response.status_code != 200:
+            logger.error("Failed request at %s with params: %s", url, params)
+            response.raise_for_status()
+
+        value = parse(response)
+        self._validators.remember(url, params, response.headers, value)
+        return value
+
+    def _parse_json(self, response):
+        with self.tracer.span('parse', url=response.url):
+            return json.loads(response.content)
+
+    def _get_json(self, url, params=None):
+        """GETs url and hands back the decoded json, raising on a bad status"""
+        response = self.requester.get_url(url, params=params)
+
+        if response.status_code != 200:
+            logger.debug("Failed request at %s with params: %s", url, params)
+            response.raise_for_status()
+
+        content = response.content
+        with self.tracer.span('parse', url=url):
+            return json.loads(content)
+
+
+class Revalidator():
+    """
+    What it takes to GET something again conditionally: the ETag or
+    Last-Modified Jenkins sent with it, and the parsed response to hand back
+    on a 304. Kept in memory and in the disk cache when there is one.
+    Responses without either aren't kept, there'd be no way to tell they're
+    still good.
+
+    Only the bookkeeping, the GET itself is up to the caller, so JenkinsLight
+    and AsyncJenkinsLight both use this and share cache entries.
+    """
+
+    def __init__(self, baseurl, cache=None):
+        """
+        :param baseurl: the server, part of every key
+        :param cache: ResponseCache to keep entries across runs, None for memory only
+        """
+        self.baseurl = baseurl
+        self.cache = cache
+        # Cache key -> {etag, last_modified, value}
+        self.entries = {}
+
+    def lookup(self, url, params=None):
+        """
+        Returns:
+            (entry, headers). entry is None if we've nothing for url, headers
+            are the conditional ones to send, empty if so.
+        """
+        key = self.key(url, params)
+        entry = self.entries.get(key)
+        if entry is None and self.cache is not None:
+            entry = self.cache.get(key)
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return (entry, headers)
+
+    def not_modified(self, url, params, entry):
+        """Got a 304 for what lookup found, hands back the kept value"""
+        self.entries[self.key(url, params)] = entry
+        return entry['value']
+
+    def remember(self, url, params, headers, value):
+        """Keeps a 200's value if it came with a validator
+
+        :param headers: the response headers, requests or httpx
+        """
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if etag or last_modified:
+            key = self.key(url, params)
+            entry = {'etag': etag, 'last_modified': last_modified, 'value': value}
+            self.entries[key] = entry
+            if self.cache is not None:
+                self.cache.put(key, entry)
+
+    def forget(self, url, params=None):
+        """Drops what's kept for url"""
+        key = self.key(url, params)
+        self.entries.pop(key, None)
+        if self.cache is not None:
+            self.cache.delete(key)
+
+    def key(self, url, params=None):
+        return (self.baseurl, url, json.dumps(params, sort_keys=True), 'revalidate')
+
+
+def tune_session(session, pool_size=DEFAULT_MAX_WORKERS, max_retries=None, compress=True):
+    """Sets a requests session up for lots of small concurrent GETs
+
+    Mounts an adapter with a pool big enough for pool_size threads, retries
+    with exponential backoff (honoring Retry-After) on connection errors and
+    429/503, and keeps connections alive. Works on any requests session, so
+    the jenkinsapi requester's session can get the same treatment.
+    """
+    retry = Retry(
+        total=DEFAULT_RETRIES if max_retries is None else max_retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 503),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers['Connection'] = 'keep-alive'
+    session.headers['Accept-Encoding'] = 'gzip, deflate' if compress else 'identity'
+
+
+def session_pool_stats(session):
+    """Adds up connection and request counts over all of a session's pools"""
+    opened = 0
+    requests = 0
+    adapters = set(session.adapters.values())
+    for adapter in adapters:
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            requests += pool.num_requests
+    return {'opened': opened, 'requests': requests, 'reused': max(0, requests - opened)}
+
+
+def job_results_summary(data):
+    """Picks the test counters out of a SUMMARY_TREE response
+
+    Returns:
+        (summaries, oldest), see JenkinsLight.get_job_results_summary
+    """
+    summaries = {}
+    oldest = None
+    for build in data.get("builds", []):
+        number = build["number"]
+        oldest = number if oldest is None else min(oldest, number)
+        for action in build.get("actions", []):
+            if action and "totalCount" in action:
+                summaries[str(number)] = {
+                    'passCount': action["totalCount"] - action["failCount"] - action["skipCount"],
+                    'failCount': action["failCount"],
+                    'skipCount': action["skipCount"],
+                }
+                break
+    return (summaries, oldest)
+
+
+def downstream_numbers(run_details, subjob):
+    """The subjob build numbers for a run out of fetch_run_details output
+
+    Uses what resolve_downstream found, or failing that filters the run's
+    fingerprints (what the history store keeps).
+
+    Raises:
+        Whatever exception the lookup ended in
+    """
+    numbers = run_details.get('downstream')
+    if numbers is None:
+        fingerprints = run_details.get('fingerprints', [])
+        if isinstance(fingerprints, Exception):
+            raise fingerprints
+        subjob_name = subjob.replace('/job/', '/')
+        numbers = [fp['owner_build_number'] for fp in fingerprints
+                   if fp['owner_job'] == subjob_name and fp['owner_build_number']]
+    if isinstance(numbers, Exception):
+        raise numbers
+    return numbers
+
+
+def fingerprints_from_json(entries, jobname, jobno):
+    """Turns the api's fingerprint list into what get_fingerprints returns"""
+    this_job = jobname.replace('/job/', '/')
+    now = time.time() * 1000
+    fingerprints = []
+    for entry in entries:
+        original = entry.get('original')
+        owner_job = None
+        owner_build_number = None
+        if original is None:
+            owner = 'outside Jenkins'
+        elif original.get('name') == this_job and str(original.get('number')) == str(jobno):
+            owner = 'this build'
+        else:
+            owner_job = original.get('name')
+            owner_build_number = original.get('number')
+            owner = f'{owner_job} #{owner_build_number}'
+
+        timestamp = entry.get('timestamp')
+        fingerprints.append({
+            'filename': entry.get('fileName'),
+            'owner': owner,
+            'owner_job': owner_job,
+            'owner_build_number': owner_build_number,
+            'age': age_string(now - timestamp) if timestamp else '',
+        })
+    return fingerprints
+
+
+def age_string(millis):
+    """Jenkins style age, '9 hr old'"""
+    seconds = max(0, millis / 1000)
+    for (unit, size) in (('yr', 31536000), ('mo', 2592000), ('day', 86400),
+                         ('hr', 3600), ('min', 60)):
+        if seconds >= size:
+            return f'{int(seconds // size)} {unit} old'
+    return f'{int(seconds)} sec old'
+
+
+def parse_fingerprints_html(data):
+    """Pulls the fingerprints out of a build's fingerprints page
+
+    One pass over the table tags, the cells are sliced out between them.
+    Header rows and rows with less than three cells are skipped.
+
+    Returns:
+        List of dicts, same as get_fingerprints
+    """
+    fingerprints = []
+    cells = None
+    header = False
+    cell_start = None
+    for tag in _TABLE_TAGS.finditer(data):
+        closing = tag.group(1)
+        name = tag.group(2).lower()
+        if name == 'tr':
+            if not closing:
+                cells = []
+                header = False
+                cell_start = None
+            elif cells is not None:
+                if not header and len(cells) >= 3:
+                    fingerprints.append(_fingerprint_row(cells))
+                cells = None
+        elif cells is None:
+            continue
+        elif name == 'th':
+            header = True
+        elif not closing:
+            cell_start = tag.end()
+        elif cell_start is not None:
+            cells.append(data[cell_start:tag.start()])
+            cell_start = None
+    return fingerprints
+
+
+def _fingerprint_row(cells):
+    # filename, owner (plain text or a job link), age
+    filename_match = _LINK_TEXT.search(cells[0])
+    job_link_match = _JOB_LINK.search(cells[1])
+    return {
+        'filename': filename_match.group(1) if filename_match else '',
+        'owner': _TAGS.sub('', cells[1]).strip(),
+        'owner_job': job_link_match.group(1) if job_link_match else None,
+        'owner_build_number': int(job_link_match.group(2)) if job_link_match else None,
+        'age': _TAGS.sub('', cells[2]).strip(),
+    }
+
 
+def save_json(json_data, filename):
+    """Dumps json_data into filename, handy for debugging api responses"""
+    j = json.dumps(json_data, indent=4, ensure_ascii=False)
+    with open(filename, 'w', encoding="utf-8") as output_file:
+        output_file.write(j)
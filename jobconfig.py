@@ -0,0 +1,182 @@
+'''
+    jobconfig
+    Sets parameter defaults in a job's config.xml. ElementTree goes straight to
+    the parameterDefinitions, wherever the job type keeps them (pipeline,
+    freestyle, matrix, maven, inside a folder property...), and only the values
+    that actually change get touched. The stock types are all handled, choices
+    by moving the wanted one to the top, plus anything from a plugin that keeps
+    its default in a defaultValue element. Password defaults Jenkins has
+    encrypted can't be compared, those always count as changed.
+
+    Only the xml, getting and posting config.xml is up to the caller.
+'''
+import difflib
+import re
+import xml.etree.ElementTree as ET
+
+# ElementTree doesn't write the <?xml ...?> line back the way Jenkins wrote it,
+# so it gets kept as is
+_PROLOG = re.compile(rb'^\s*(?:<\?xml[^>]*\?>\s*)?')
+_ENCODING = re.compile(rb'''encoding=["']([\w.-]+)["']''')
+
+# Shown instead of secrets in changes and diffs
+HIDDEN = '****'
+# How Jenkins writes a Secret into config.xml, base64 in braces
+_ENCRYPTED = re.compile(r'^\{[A-Za-z0-9+/=]+\}$')
+
+
+class ParameterUpdate():
+    """What setting the defaults on one config came to"""
+
+    def __init__(self, before, after, config_xml, changes, missing, problems, unchecked=()):
+        """
+        :param before: the config as ElementTree writes it, before the changes
+        :param after: same, after them
+        :param config_xml: the new config.xml bytes to post, None if nothing changed
+        :param changes: (name, old, new) for each default that changed
+        :param missing: names the config has no parameter for
+        :param problems: (name, why) for values that can't go in
+        :param unchecked: names in changes whose old default is encrypted, so
+                          there's no telling if it was already the new one
+        """
+        self.before = before
+        self.after = after
+        self.config_xml = config_xml
+        self.changes = changes
+        self.missing = missing
+        self.problems = problems
+        self.unchecked = list(unchecked)
+
+    @property
+    def ok(self):
+        return not (self.missing or self.problems)
+
+    def diff(self, label='config.xml'):
+        """Unified diff of the config, both sides written by ElementTree so only real changes show"""
+        return ''.join(difflib.unified_diff(self.before.splitlines(keepends=True),
+                                            self.after.splitlines(keepends=True),
+                                            fromfile=f'{label} (now)', tofile=f'{label} (updated)', n=2))
+
+
+def update_defaults(config_xml, values):
+    """
+    Sets parameter defaults in a config.xml
+
+    Args:
+        config_xml: config.xml as Jenkins sent it, bytes
+        values: {parameter name: new default}, bools for boolean parameters
+
+    Returns:
+        ParameterUpdate. config_xml is only set if something changed.
+    """
+    prolog = _PROLOG.match(config_xml).group(0)
+    encoding = _ENCODING.search(prolog)
+    encoding = encoding.group(1).decode('ascii') if encoding else 'utf-8'
+
+    # Comments kept too, so the only differences are the ones we make
+    root = ET.fromstring(config_xml, parser=ET.XMLParser(target=ET.TreeBuilder(insert_comments=True)))
+    before = ET.tostring(root, encoding='unicode')
+
+    definitions = {}
+    for container in root.iter('parameterDefinitions'):
+        for definition in container:
+            name = definition.findtext('name')
+            if name is not None:
+                definitions.setdefault(name, definition)
+
+    changes = []
+    missing = []
+    problems = []
+    unchecked = []
+    for (name, value) in values.items():
+        definition = definitions.get(name)
+        if definition is None:
+            missing.append(name)
+            continue
+        try:
+            change = set_default(definition, value)
+        except ValueError as e:
+            problems.append((name, str(e)))
+            continue
+        if change is not None:
+            if is_secret(definition):
+                if _ENCRYPTED.match(change[0]):
+                    unchecked.append(name)
+                change = (HIDDEN, HIDDEN)
+            changes.append((name,) + change)
+
+    after = ET.tostring(root, encoding='unicode')
+    new_xml = None
+    if changes:
+        new_xml = prolog + after.encode(encoding, 'xmlcharrefreplace')
+        if config_xml.endswith(b'\n'):
+            new_xml += b'\n'
+    if any(is_secret(definitions[name]) for (name, _, _) in changes):
+        # Keep secrets out of anything printed
+        (before, after) = (_hide_secrets(before), _hide_secrets(after))
+    return ParameterUpdate(before, after, new_xml, changes, missing, problems, unchecked)
+
+
+def set_default(definition, value):
+    """
+    Sets one parameter definition element's default
+
+    Returns:
+        (old, new) text if it changed, None if it was already that
+
+    Raises:
+        ValueError if the value doesn't fit the parameter
+    """
+    kind = definition.tag.rsplit('.', 1)[-1]
+    text = _text(value)
+
+    if kind == 'ChoiceParameterDefinition':
+        return _set_choice(definition, text)
+
+    if kind == 'BooleanParameterDefinition' and text not in ('true', 'false'):
+        raise ValueError(f"'{value}' isn't true or false")
+
+    default = definition.find('defaultValue')
+    if default is None:
+        if kind not in ('StringParameterDefinition', 'TextParameterDefinition',
+                        'PasswordParameterDefinition', 'BooleanParameterDefinition'):
+            raise ValueError(f"don't know where a {kind} keeps its default")
+        # Jenkins leaves it out when it's empty
+        default = ET.SubElement(definition, 'defaultValue')
+    old = default.text or ''
+    if old == text:
+        return None
+    default.text = text
+    return (old, text)
+
+
+def _set_choice(definition, text):
+    """The first choice is the default, so the wanted one moves up to first"""
+    choices = definition.find('choices')
+    strings = list(choices.iter('string')) if choices is not None else []
+    names = [string.text or '' for string in strings]
+    if text not in names:
+        raise ValueError(f"'{text}' isn't one of the choices ({', '.join(names)})")
+    if names[0] == text:
+        return None
+    # Swapping the text around instead of the elements leaves the whitespace be
+    ordered = [text] + [name for name in names if name != text]
+    for (string, name) in zip(strings, ordered):
+        string.text = name
+    return (names[0], text)
+
+
+def is_secret(definition):
+    return definition.tag.endswith('PasswordParameterDefinition')
+
+
+def _hide_secrets(text):
+    return re.sub(r'(<[^/\s>]*PasswordParameterDefinition\b.*?<defaultValue>).*?(</defaultValue>)',
+                  r'\1' + HIDDEN + r'\2', text, flags=re.DOTALL)
+
+
+def _text(value):
+    """What a value looks like in the xml, Jenkins writes bools lower case"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
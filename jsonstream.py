@@ -0,0 +1,171 @@
+'''
+    jsonstream
+    Pull items out of a big json document as it streams in, without building
+    the whole thing in memory first. Made for Jenkins test reports, where the
+    interesting bits are the cases buried in suites[].cases[].
+
+    It isn't a full blown tokenizer. It walks the containers along the path you
+    ask for and lets json's raw_decode (the C one) chew through every other
+    value, so each case is decoded at C speed and thrown away when you're done
+    with it.
+'''
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+_DECODER = json.JSONDecoder()
+
+
+class _Reader():
+    """Buffer over an iterator of text chunks, refilled as values need it"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, at_least=1):
+        """Pulls chunks until at_least more chars are buffered, False if none came"""
+        if self.eof:
+            return False
+        pieces = [self.buf[self.pos:]]
+        added = 0
+        while added < at_least:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.eof = True
+                break
+            pieces.append(chunk)
+            added += len(chunk)
+        self.buf = ''.join(pieces)
+        self.pos = 0
+        return added > 0
+
+    def peek(self):
+        """Next non-whitespace char, without consuming it"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of json stream")
+
+    def take(self, expected=None):
+        """Consumes the next non-whitespace char and returns it"""
+        char = self.peek()
+        if expected is not None and char not in expected:
+            raise ValueError(f"Expected {expected!r} at offset {self.pos}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decodes one complete json value, pulling more chunks as needed"""
+        self.peek()
+        while True:
+            try:
+                (value, end) = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Value runs past the buffer. Grab at least as much again as we
+                # have so a huge value doesn't cost a retry per chunk.
+                if not self._fill(max(len(self.buf) - self.pos, 65536)):
+                    raise
+                continue
+            # A number right at the end of the buffer might have more digits
+            # coming in the next chunk.
+            if end == len(self.buf) and not self.eof:
+                self._fill(65536)
+                continue
+            self.pos = end
+            return value
+
+
+def iter_items(chunks, path):
+    """Streams the items of the arrays found at path
+
+    Args:
+        chunks: iterator of str chunks making up one json document
+        path: tuple of keys down to the arrays, ('suites', 'cases') walks
+            doc["suites"][*]["cases"][*]
+
+    Yields:
+        ('item', parents, item) for every item of the innermost arrays, and
+        ('end', parents, None) whenever one of the enclosing objects closes.
+        parents is a list of dicts holding the other fields of each enclosing
+        object, top level first. Those dicts keep filling in as the parse goes,
+        so fields that come after the array (a suite's name, say) are only
+        there once the matching 'end' shows up.
+    """
+    reader = _Reader(chunks)
+    yield from _walk_object(reader, tuple(path), [])
+
+
+def _walk_object(reader, path, parents):
+    reader.take('{')
+    fields = {}
+    parents = parents + [fields]
+    if reader.peek() == '}':
+        reader.take()
+    else:
+        while True:
+            key = reader.value()
+            reader.take(':')
+            if key == path[0] and reader.peek() == '[':
+                yield from _walk_array(reader, path[1:], parents)
+            else:
+                fields[key] = reader.value()
+            if reader.take(',}') == '}':
+                break
+    yield ('end', parents, None)
+
+
+def _walk_array(reader, path, parents):
+    reader.take('[')
+    if reader.peek() == ']':
+        reader.take()
+        return
+    while True:
+        if path and reader.peek() == '{':
+            yield from _walk_object(reader, path, parents)
+        else:
+            yield ('item', parents, reader.value())
+        if reader.take(',]') == ']':
+            break
+
+
+def iter_text(byte_chunks, encoding="utf-8"):
+    """Turns an iterator of byte chunks into str chunks, split characters and all"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    for chunk in byte_chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_test_cases(chunks, only_failed=False):
+    """Streams the cases out of a Jenkins testReport json
+
+    Cases are held per suite until the suite closes, since Jenkins writes the
+    suite name after its cases. With only_failed the PASSED and FIXED ones are
+    dropped as soon as they're decoded, so only the rest are ever held.
+
+    Yields:
+        (suite name, case dict) tuples in report order
+    """
+    pending = []
+    for (event, parents, item) in iter_items(chunks, ('suites', 'cases')):
+        if event == 'item':
+            if only_failed and item.get("status") in ('PASSED', 'FIXED'):
+                continue
+            pending.append(item)
+        elif len(parents) == 2:
+            # A suite just closed, its name is known now
+            suite_name = parents[1].get("name")
+            for case in pending:
+                yield (suite_name, case)
+            pending = []
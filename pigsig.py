@@ -43,7 +43,9 @@ if sys.version_info.major >= 3 and sys.version_info.minor >= 10:
     import truststore
     truststore.inject_into_ssl()
 
-from jenkinslight import JenkinsLight
+from jenkinslight import DEFAULT_MAX_WORKERS, JenkinsLight, downstream_numbers
+from responsecache import ResponseCache
+from tracing import Tracer, report
 
 
 def main():
@@ -54,7 +56,10 @@ def main():
 
     # Read the config file and connect to Jenkins
     (server, uid, token) = load_secrets()
-    j = JenkinsLight(server, uid, token, timeout=60)
+    cache = None if opts.no_cache else ResponseCache(refresh=opts.refresh)
+    tracer = Tracer() if opts.profile else None
+    j = JenkinsLight(server, uid, token, timeout=60, max_workers=opts.workers, cache=cache,
+                     tracer=tracer)
 
     if not opts.jobname:
         print("You have to specify at least one job.")
@@ -65,20 +70,36 @@ def main():
         sys.exit(3)
 
     jobs = opts.jobname.split(",")
-
-    for jobname in jobs:
-        view_data = j.get_pipeline_data(jobname, None)
-        line_limit = int(opts.limit) if opts.limit else 999
-
+    line_limit = int(opts.limit) if opts.limit else None
+
+    # Get every job's run list, then all the per-run results and
+    # fingerprints concurrently. Printing happens after, in order.
+    with j.tracer.span('fetch'):
+        if opts.history:
+            # Only runs newer than what's stored hit the server
+            from history import HistoryStore, load_runs
+
+            store = HistoryStore()
+            (job_runs, details) = load_runs(j, store, jobs, line_limit, downstream=opts.subjob)
+            store.close()
+        else:
+            pipelines = j.fetch_all([(j.get_pipeline_data, (jobname, None)) for jobname in jobs])
+            job_runs = []
+            for (jobname, view_data) in zip(jobs, pipelines):
+                if isinstance(view_data, Exception):
+                    raise view_data
+                job_runs.append((jobname, view_data[:line_limit]))
+
+            details = j.fetch_run_details(job_runs, results=True, summary=True, downstream=opts.subjob)
+
+    for (jobname, runs) in job_runs:
         # Print job header
         display_name = jobname.replace('/job/', '/')
         print(f'{display_name}: {j.baseurl}/job/{jobname}')
         print()
 
-        for job in view_data:
-            if opts.limit and line_limit <= 0:
-                break
-            line_limit -= 1
+        for job in runs:
+            run_details = details.get((jobname, job["id"]), {})
 
             jobtime = datetime.datetime.fromtimestamp(job["startTimeMillis"]/1000.0)
             date = jobtime.strftime("%Y-%m-%d %H:%M:%S")
@@ -89,18 +110,17 @@ def main():
             # Get test results if available
             results_string = ""
             try:
-                result_data = j.get_pipeline_results(jobname, job["id"])
+                result_data = run_details['results']
+                if isinstance(result_data, Exception):
+                    raise result_data
                 results_string = f"Passed: {result_data['passCount']}, Failed: {result_data['failCount']}, Skipped: {result_data['skipCount']}"
             except Exception:
                 results_string = "No test results"
 
-            # Get fingerprints to find downstream job numbers
+            # Find the downstream job numbers
             subjob_number = ""
             try:
-                fingerprints = j.get_fingerprints(jobname, job["id"])
-                # Filter for the specified subjob and extract build numbers
-                subjob_numbers = [fp['owner_build_number'] for fp in fingerprints
-                                  if fp['owner_job'] == opts.subjob and fp['owner_build_number']]
+                subjob_numbers = downstream_numbers(run_details, opts.subjob)
                 if subjob_numbers:
                     subjob_number = ", ".join([str(num) for num in subjob_numbers])
             except Exception:
@@ -117,6 +137,15 @@ def main():
                 print(f"  {opts.subjob}: No run found")
             print()
 
+    if opts.pool_stats:
+        stats = j.pool_stats()
+        print(f"Connections opened: {stats['opened']}, requests: {stats['requests']}, "
+              f"reused: {stats['reused']}", file=sys.stderr)
+
+    if tracer is not None:
+        sys.stdout.flush()
+        report(tracer, opts.profile, j.pool_stats())
+
 
 def load_secrets():
     """
@@ -160,6 +189,32 @@ def parse_commandline():
     parser.add_argument("-s", "--subjob", dest="subjob",
                         help="Name of downstream subjob to track (required)",
                         default=None)
+    parser.add_argument("-w", "--workers", dest="workers",
+                        help="Max number of requests in flight at once",
+                        type=int,
+                        default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--no-cache", dest="no_cache",
+                        action='store_true',
+                        help="Don't read or write the cache of finished builds",
+                        default=False)
+    parser.add_argument("--refresh", dest="refresh",
+                        action='store_true',
+                        help="Refetch finished builds and update the cache",
+                        default=False)
+    parser.add_argument("--history", dest="history",
+                        action='store_true',
+                        help="Sync new runs into the local history and show from there",
+                        default=False)
+    parser.add_argument("--pool-stats", dest="pool_stats",
+                        action='store_true',
+                        help="Print connection pool stats to stderr when done",
+                        default=False)
+    parser.add_argument("--profile", dest="profile",
+                        nargs='?',
+                        const='-',
+                        metavar="FILE",
+                        help="Print where the time went to stderr, and write a Chrome trace to FILE if given",
+                        default=None)
 
     options = parser.parse_args()
 
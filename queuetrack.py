@@ -0,0 +1,244 @@
+'''
+    queuetrack
+    Follows launched builds through the Jenkins queue until they turn into
+    real builds. One poll loop covers however many queue items: each round is
+    a single queue/api/json for everything still waiting (why, and where it is
+    in line), plus a queue/item request for each one that's dropped out of the
+    queue, to get its build number.
+
+    Items can also be followed past the queue until their builds finish, the
+    same loop asks about those builds each round.
+
+    Polls quickly while things are moving and backs off, with jitter, while
+    they aren't. A build that gets an executor in 2 seconds is noticed in
+    about 2 seconds, an hour stuck behind a busy agent doesn't hammer the
+    server, and twenty launches don't poll twenty times as often.
+'''
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL = 0.5
+MAX_INTERVAL = 15.0
+# How much longer to wait after a round where nothing changed
+BACKOFF = 1.5
+MAX_FAILURES = 5
+
+
+class QueueItem():
+    """Where one launch is at. version goes up every time something changes."""
+
+    def __init__(self, queue_id, label=None, jobname=None, follow=False):
+        self.id = queue_id
+        self.label = label or f"queue item {queue_id}"
+        # JenkinsLight style job name, only needed to follow the build
+        self.jobname = jobname
+        self.follow = follow
+        self.why = None
+        self.position = None
+        self.queue_length = None
+        self.stuck = False
+        self.number = None
+        self.url = None
+        self.cancelled = False
+        self.result = None
+        self.duration = None
+        self.error = None
+        self.version = 0
+
+    @property
+    def done(self):
+        """Nothing left to wait for: started (finished if following), cancelled or lost"""
+        if self.cancelled or self.error is not None:
+            return True
+        if self.follow:
+            return self.result is not None
+        return self.number is not None
+
+    def describe(self):
+        """One line on how it's going"""
+        if self.result is not None:
+            return f"{self.label}: #{self.number} finished {self.result} in {self.duration / 1000:.0f}s"
+        if self.number is not None:
+            return f"{self.label}: started as #{self.number}"
+        if self.cancelled:
+            return f"{self.label}: cancelled while in the queue"
+        if self.error is not None:
+            return f"{self.label}: lost track of it, {self.error}"
+        if self.position is None:
+            return f"{self.label}: left the queue, waiting for a build number"
+        state = "stuck" if self.stuck else "waiting"
+        return f"{self.label}: {state}, #{self.position} of {self.queue_length} in the queue: {self.why}"
+
+
+class QueueTracker():
+
+    def __init__(self, light, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 max_failures=MAX_FAILURES):
+        """
+        :param light: JenkinsLight to poll with
+        :param min_interval: seconds between polls while things are changing
+        :param max_interval: seconds between polls once nothing has for a while
+        :param max_failures: failed polls in a row before giving up on everything
+        """
+        self.light = light
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_failures = max_failures
+        self.items = {}
+        self.condition = threading.Condition()
+        self.poller = None
+        self.kicked = False
+
+    def add(self, queue_id, label=None, jobname=None):
+        """
+        Starts tracking queue_id, polling starts if it wasn't going already.
+        Given the job's name it's followed until the build finishes.
+        """
+        with self.condition:
+            item = self.items.get(queue_id)
+            if item is None:
+                item = self.items[queue_id] = QueueItem(queue_id, label, jobname, follow=jobname is not None)
+                # Poll right away instead of sitting out a long backoff
+                self.kicked = True
+                self.condition.notify_all()
+            if self.poller is None:
+                self.poller = threading.Thread(target=self.run, name="queue-poller", daemon=True)
+                self.poller.start()
+            return item
+
+    def wait(self, queue_id, label=None, on_change=None, timeout=None, jobname=None):
+        """
+        Blocks until queue_id is out of the queue. Any number of threads can
+        wait on their own items, the polling is shared.
+
+        :param jobname: JenkinsLight job name, to wait for the build to finish too
+        :param on_change: called with the item, from this thread, whenever
+            something about it changes
+        :param timeout: seconds to give up after, None to wait it out
+
+        Returns:
+            the QueueItem, check number, cancelled and error for how it went
+        """
+        item = self.add(queue_id, label, jobname)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        seen = 0
+        while True:
+            with self.condition:
+                while item.version == seen:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return item
+                    self.condition.wait(remaining)
+                seen = item.version
+                done = item.done
+            if on_change is not None:
+                on_change(item)
+            if done:
+                return item
+
+    def run(self):
+        """The poll loop, runs until nothing's left in the queue"""
+        interval = self.min_interval
+        failures = 0
+        while True:
+            with self.condition:
+                pending = [item for item in self.items.values() if not item.done]
+                if not pending:
+                    self.poller = None
+                    return
+                self.kicked = False
+
+            try:
+                changed = self.poll(pending)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                logger.warning("Polling the queue failed (%s), %d in a row", e, failures)
+                if failures > self.max_failures:
+                    self._update({item.id: {'error': e} for item in pending})
+                    continue
+                changed = False
+
+            # Moving: poll again soon. Quiet: back off, up to max_interval.
+            interval = self.min_interval if changed else min(self.max_interval, interval * BACKOFF)
+            with self.condition:
+                self.condition.wait_for(lambda: self.kicked, interval * random.uniform(0.5, 1.5))
+                if self.kicked:
+                    interval = self.min_interval
+
+    def poll(self, pending):
+        """
+        One round for the items still waiting
+
+        Returns:
+            True if anything about any of them changed
+        """
+        updates = self.poll_builds([item for item in pending if item.number is not None])
+        pending = [item for item in pending if item.number is None]
+        if not pending:
+            return self._update(updates)
+
+        queue = self.light.get_queue()
+        # Roughly the order Jenkins hands out executors in, longest waiting first
+        queue.sort(key=lambda entry: entry.get('inQueueSince') or 0)
+        positions = {entry['id']: (position, entry) for (position, entry) in enumerate(queue, 1)}
+
+        gone = []
+        for item in pending:
+            if item.id in positions:
+                (position, entry) = positions[item.id]
+                updates[item.id] = {'why': entry.get('why'), 'position': position,
+                                    'queue_length': len(queue), 'stuck': bool(entry.get('stuck'))}
+            else:
+                gone.append(item)
+
+        # Out of the queue, started or cancelled (or just about to be)
+        left = self.light.fetch_all([(self.light.get_queue_item, (item.id,)) for item in gone])
+        for (item, entry) in zip(gone, left):
+            if isinstance(entry, Exception):
+                status = getattr(getattr(entry, 'response', None), 'status_code', None)
+                if status != 404:
+                    raise entry
+                # Jenkins forgets items a while after they leave the queue
+                updates[item.id] = {'error': LookupError(f"queue item {item.id} is gone from Jenkins")}
+                continue
+            executable = entry.get('executable') or {}
+            updates[item.id] = {'why': entry.get('why'), 'position': None, 'queue_length': None,
+                                'stuck': False, 'cancelled': bool(entry.get('cancelled')),
+                                'number': executable.get('number'), 'url': executable.get('url')}
+        return self._update(updates)
+
+    def poll_builds(self, running):
+        """Updates for followed builds that have started, whether they're done yet"""
+        updates = {}
+        infos = self.light.fetch_all([(self.light.get_build_info, (item.jobname, item.number))
+                                      for item in running])
+        for (item, info) in zip(running, infos):
+            if isinstance(info, Exception):
+                status = getattr(getattr(info, 'response', None), 'status_code', None)
+                if status != 404:
+                    raise info
+                # Numbered but not quite there yet, try again next round
+                continue
+            if not info.get('building') and info.get('result'):
+                updates[item.id] = {'result': info['result'], 'duration': info.get('duration') or 0}
+        return updates
+
+    def _update(self, updates):
+        """Applies {queue id: {field: value}}, wakes the waiters if anything changed"""
+        changed = False
+        with self.condition:
+            for (queue_id, fields) in updates.items():
+                item = self.items[queue_id]
+                if any(getattr(item, name) != value for (name, value) in fields.items()):
+                    for (name, value) in fields.items():
+                        setattr(item, name, value)
+                    item.version += 1
+                    changed = True
+            if changed:
+                self.condition.notify_all()
+        return changed
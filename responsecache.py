@@ -0,0 +1,165 @@
+'''
+    responsecache
+    On-disk cache for Jenkins responses that are never going to change. Once a
+    build is done its test report, fingerprints and stages are set in stone, so
+    there's no point in asking Jenkins for them every time stage-view redraws.
+
+    JenkinsLight also keeps responses that can change, job configs and the
+    like, here along with their ETag or Last-Modified, and checks them with a
+    conditional GET before using them.
+
+    Entries are keyed on (server, job, build, endpoint), stored as one json file
+    each, and evicted least recently used first once the cache gets too big.
+'''
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Build/run statuses that mean the build is finished and its data is final.
+# wfapi uses FAILED, the regular build api uses FAILURE. Cover both.
+TERMINAL_STATUSES = frozenset([
+    'SUCCESS',
+    'FAILED',
+    'FAILURE',
+    'ABORTED',
+    'UNSTABLE',
+    'NOT_BUILT',
+    'NOT_EXECUTED',
+])
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def default_cache_dir():
+    """Where the cache lives unless told otherwise, honors XDG_CACHE_HOME"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'janky')
+
+
+def is_terminal(status):
+    """True if a build in this status can't change anymore"""
+    return status is not None and status.upper() in TERMINAL_STATUSES
+
+
+class ResponseCache():
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, refresh=False):
+        """
+        :param directory: where to keep the cache files, defaults to ~/.cache/janky
+        :param max_bytes: size cap, least recently used entries go first past this
+        :param refresh: ignore what's cached, but still store fresh responses
+        """
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._size = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + '.json')
+
+    def get(self, key):
+        """Returns the cached value for key, or None if we don't have it"""
+        if self.refresh:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding="utf-8") as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+        # Guard against hash collisions and half written junk
+        if entry.get('key') != list(key):
+            return None
+
+        # Bump the mtime, that's what eviction goes by
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry['value']
+
+    def put(self, key, value):
+        """Stores value under key, then trims the cache if it's over size"""
+        path = self._path(key)
+        data = json.dumps({'key': list(key), 'value': value}, ensure_ascii=False).encode("utf-8")
+
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+
+            # Write to a temp file and move it into place so readers in other
+            # processes never see a partial entry.
+            (handle, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(handle, 'wb') as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += len(data) - old_size
+
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def delete(self, key):
+        """Drops key's entry if there is one"""
+        path = self._path(key)
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                return
+            if self._size is not None:
+                self._size -= size
+
+    def clear(self):
+        """Throws away everything in the cache"""
+        with self._lock:
+            for (path, _, _) in self._entries():
+                os.remove(path)
+            self._size = 0
+
+    def _entries(self):
+        entries = []
+        for (root, _, files) in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _disk_usage(self):
+        return sum(size for (_, _, size) in self._entries())
+
+    def _evict(self):
+        # Oldest first, and trim down to 90% so we're not evicting on every put
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for (_, _, size) in entries)
+        target = self.max_bytes * 0.9
+        for (path, _, size) in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        logger.debug("Cache trimmed to %d bytes", total)
+        self._size = total
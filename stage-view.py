@@ -8,20 +8,28 @@ import datetime
 import json
 import os
 import sys
+import time
 # if Python 3.10 or higher we can use the system keychain (or equiv on other platforms)
 if sys.version_info.major >= 3 and sys.version_info.minor >= 10:
     import truststore
     truststore.inject_into_ssl()
 
 #from jenkinsapi.jenkins import Jenkins
+from rich import box
 from rich.align import Align
 from rich.console import Console, Group
 from rich.columns import Columns
+from rich.live import Live
+from rich.measure import Measurement
 from rich.panel import Panel
 from rich.style import Style
+from rich.table import Table
+from rich.text import Text
 from rich.theme import Theme
 
-from jenkinslight import JenkinsLight
+from jenkinslight import DEFAULT_MAX_WORKERS, JenkinsLight, downstream_numbers, save_json
+from responsecache import ResponseCache
+from tracing import Tracer, report
 
 
 def main():
@@ -29,12 +37,15 @@ def main():
         main - where the magic happens
     """
     opts = parse_commandline()
-    jobs_hash = {}
     # Read the config file and connect to Jenkins
     (server, uid, token) = load_secrets()
-    j = JenkinsLight(server, uid, token, timeout=60)
+    cache = None if opts.no_cache else ResponseCache(refresh=opts.refresh)
+    tracer = Tracer() if opts.profile else None
+    j = JenkinsLight(server, uid, token, timeout=60, max_workers=opts.workers, cache=cache,
+                     tracer=tracer)
 
     theme = load_theme(opts.theme)
+    styles = ThemeCache(theme)
     if not opts.jobname:
         print("You have to specify at least one job.")
         sys.exit(3)
@@ -42,110 +53,463 @@ def main():
 
     console = Console(theme=theme)
 
-    for jobname in jobs:
-        view_data = j.get_pipeline_data(jobname, opts.filename)
-        line_limit = int(opts.limit) if opts.limit else 999
-        # This strips the /job/ dividers that wind up in the URLs for display
-        display_name = jobname.replace('/job/', '/')
-        console.print(f'[job_title]{display_name}[/job_title]: [job_url]{j.baseurl}/job/{jobname}[/job_url]')
-
-        jobs_hash[jobname] = {}
-
-        for job in view_data:
-            if opts.limit and line_limit <= 0:
-                break
-            line_limit -= 1
-
-            stages = job["stages"]
-            jobs_hash[jobname][job["id"]] = {}
-
-            jobtime = datetime.datetime.fromtimestamp(job["startTimeMillis"]/1000.0)
-            date = jobtime.strftime("%b %d")
-            time = jobtime.strftime(" %H:%M")
-
-            duration = time_str(job["durationMillis"])
-            statcolor = job["status"].lower()
-            job_string1 = f'[{statcolor}]{job["status"]}'
-            job_string2 = f'[date]{date}'
-            job_string3 = f"[b][time]{time}[/b]"
-            
-            # Get fingerprints to find downstream job numbers
-            downstream_string = ""
-            if opts.subjob:
-                try:
-                    fingerprints = j.get_fingerprints(jobname, job["id"])
-                    # Filter for the specified subjob and extract build numbers
-                    subjob_numbers = [fp['owner_build_number'] for fp in fingerprints 
-                                     if fp['owner_job'] == opts.subjob and fp['owner_build_number']]
-                    if subjob_numbers:
-                        downstream_string = ", ".join([str(num) for num in subjob_numbers])
-                except Exception:
-                    pass
-
-            job_renderables = [
-                    Panel(
-                        Group(
-                            # Align.center(" "),
-                            Align.center(job_string1),
-                            Align.center(job_string2),
-                            Align.center(job_string3),
-                            Align.center(f"{downstream_string}") if downstream_string else Align.center(" "),
-                            ),
-                        width=15,
-                        height=6,
-                        title=f'[stage_title]{job["name"]}',
-                        subtitle=f"[time]{duration}",
-                        border_style=statcolor,
-                        )
-                    ]
-            job_renderables.extend(
-                    [
-                        Panel(
-                            get_content(stage),
-                            width=15,
-                            height=6,
-                            expand=True,
-                            border_style=stage["status"].lower(),
-                            )
-                        for stage in stages
-                        ]
-                    )
+    if opts.watch:
+        try:
+            watch(j, console, styles, jobs, opts)
+        except KeyboardInterrupt:
+            pass
+    else:
+        show(j, console, styles, jobs, opts)
+
+    if opts.pool_stats:
+        stats = j.pool_stats()
+        print(f"Connections opened: {stats['opened']}, requests: {stats['requests']}, "
+              f"reused: {stats['reused']}", file=sys.stderr)
+
+    if tracer is not None:
+        report(tracer, opts.profile, j.pool_stats())
+
+
+def show(j, console, styles, jobs, opts):
+    """
+        Renders the view once and exits
+    """
+    jobs_hash = {}
+
+    # Grab the run lists for every job, then fan out all the per-run
+    # requests for all the jobs in one go. Rendering happens afterwards,
+    # in the same order as before, so the output doesn't shuffle around.
+    with j.tracer.span('fetch'):
+        if opts.history:
+            # Only runs newer than what's stored hit the server
+            from history import HistoryStore, load_runs
+
+            store = HistoryStore()
+            line_limit = int(opts.limit) if opts.limit else None
+            (job_runs, details) = load_runs(j, store, jobs, line_limit, fingerprints=bool(opts.subjob),
+                                            downstream=opts.subjob)
+            store.close()
+        else:
+            job_runs = fetch_runs(j, jobs, opts)
+            details = j.fetch_run_details(job_runs, results=True, summary=True, downstream=opts.subjob)
+
+    if opts.compact:
+        # Everything laid out up front, out to the terminal in one write
+        with j.tracer.span('render'):
+            frame = []
+            for (jobname, runs) in job_runs:
+                (table, jobs_hash[jobname]) = render_table(jobname, runs, details, opts.subjob, styles)
+                frame.extend([job_header(j, jobname, styles), table])
+            # Wider than the terminal is better than cut off
+            console.print(Group(*frame), crop=False)
+        save_results(jobs_hash, opts.resultfname)
+        return
+
+    with j.tracer.span('render'):
+        for (jobname, runs) in job_runs:
+            console.print(job_header(j, jobname, styles))
+
+            jobs_hash[jobname] = {}
+
+            for job in runs:
+                run_details = details.get((jobname, job["id"]), {})
+                (renderable, run_results) = render_run(job, run_details, opts.subjob, styles)
+                jobs_hash[jobname][job["id"]] = run_results
+                console.print(renderable)
+
+    save_results(jobs_hash, opts.resultfname)
+
+
+def watch(j, console, styles, jobs, opts):
+    """
+        Keeps the view up on screen, refreshing every opts.watch seconds.
+        Each tick only asks for the run lists, the results and fingerprints
+        are refetched (and the run re-rendered) only for runs whose status or
+        duration moved since the last tick. Everything else is drawn from
+        segments kept from the last time, so an unchanged board is nearly free.
+        Editing colors.cfg while it's up switches the theme on the next tick.
+    """
+    seen = {}
+    rendered = {}
+    fetched = {}
+    tables = {}
+    job_runs = []
+    # Swap reloaded themes in on top of the one the console started with,
+    # instead of piling them up on its theme stack
+    theme_pushed = False
+
+    with Live(console=console, auto_refresh=False) as live:
+        while True:
+            problem = None
             try:
-                result_data = j.get_pipeline_results(jobname, job["id"])
-                jobs_hash[jobname][job["id"]].update({
-                    'passCount': result_data["passCount"],
-                    'failCount': result_data["failCount"],
-                    'skipCount': result_data["skipCount"]
-                    })
-
-                results_title = '[b][stage_title]Results[/b]'
-                res_string1 = f'[success]Passed: {result_data["passCount"]}'
-                res_string2 = f'[failed]Failed: {result_data["failCount"]}'
-                res_string3 = f'[unstable]Skipped: {result_data["skipCount"]}'
-                job_renderables.extend(
-                        [
-                            Panel(
-                                Group(
-                                    results_title,
-                                    Align.left(res_string1),
-                                    Align.left(res_string2),
-                                    Align.left(res_string3),
-                                    ),
-                                width=15,
-                                height=6,
-                                border_style=statcolor,
-                                )
-                            ]
-                        )
+                theme = load_theme(opts.theme)
+                if theme is not styles.theme:
+                    if theme_pushed:
+                        console.pop_theme()
+                    console.push_theme(theme)
+                    theme_pushed = True
+                    styles = ThemeCache(theme)
+                    rendered.clear()
+                    tables.clear()
+                    seen.clear()
+
+                with j.tracer.span('fetch'):
+                    job_runs = fetch_runs(j, jobs, opts)
+                    stale = []
+                    for (jobname, runs) in job_runs:
+                        changed = [run for run in runs
+                                   if seen.get((jobname, run["id"])) != (run["status"], run["durationMillis"])]
+                        if changed:
+                            stale.append((jobname, changed))
+
+                    details = j.fetch_run_details(stale, results=True, summary=True,
+                                                  downstream=opts.subjob)
+                for (jobname, runs) in stale:
+                    for run in runs:
+                        key = (jobname, run["id"])
+                        fetched[key] = details.get(key, {})
+                        if not opts.compact:
+                            with j.tracer.span('render'):
+                                (renderable, run_results) = render_run(run, fetched[key], opts.subjob, styles)
+                                rendered[key] = (Prerendered(renderable), run_results)
+                        # A run whose fetch failed gets asked about again next tick
+                        if not fetch_failed(fetched[key]):
+                            seen[key] = (run["status"], run["durationMillis"])
             except Exception as e:
-                no_results = True
+                # Keep the last good picture up, a blip shouldn't kill the board
+                problem = e
+
+            # Forget runs that scrolled off
+            showing = set((jobname, run["id"]) for (jobname, runs) in job_runs for run in runs)
+            for key in list(fetched):
+                if key not in showing:
+                    del fetched[key]
+                    rendered.pop(key, None)
+                    seen.pop(key, None)
+
+            jobs_hash = {}
+            frame = []
+            for (jobname, runs) in job_runs:
+                frame.append(job_header(j, jobname, styles))
+                if opts.compact:
+                    runs = [run for run in runs if (jobname, run["id"]) in fetched]
+                    # Same runs in the same states, same table as last time
+                    signature = tuple((run["id"], seen.get((jobname, run["id"]))) for run in runs)
+                    if tables.get(jobname, (None,))[0] != signature:
+                        with j.tracer.span('render'):
+                            (table, job_results) = render_table(jobname, runs, fetched, opts.subjob, styles)
+                            tables[jobname] = (signature, Prerendered(table), job_results)
+                    (_, table, jobs_hash[jobname]) = tables[jobname]
+                    frame.append(table)
+                    continue
+                jobs_hash[jobname] = {}
+                for run in runs:
+                    key = (jobname, run["id"])
+                    if key not in rendered:
+                        continue
+                    (renderable, run_results) = rendered[key]
+                    jobs_hash[jobname][run["id"]] = run_results
+                    frame.append(renderable)
+
+            stamp = datetime.datetime.now().strftime("%H:%M:%S")
+            if problem is not None:
+                frame.append(Text(f'Update failed at {stamp}: {problem}', styles.style('failed')))
+            else:
+                frame.append(Text(f'Updated {stamp}, every {opts.watch:g}s. Ctrl+C to quit.',
+                                  styles.style('subtitle')))
+
+            with j.tracer.span('draw'):
+                live.update(Group(*frame), refresh=True)
+            save_results(jobs_hash, opts.resultfname)
+            time.sleep(opts.watch)
+
+
+def fetch_runs(j, jobs, opts):
+    """
+        Gets the run lists for all the jobs concurrently, trimmed to the limit
+    """
+    line_limit = int(opts.limit) if opts.limit else None
+    pipelines = j.fetch_all([(j.get_pipeline_data, (jobname, None)) for jobname in jobs])
+    job_runs = []
+    for (jobname, view_data) in zip(jobs, pipelines):
+        if isinstance(view_data, Exception):
+            raise view_data
+        if opts.filename is not None:
+            save_json(view_data, opts.filename)
+        job_runs.append((jobname, view_data[:line_limit]))
+    return job_runs
+
+
+def job_header(j, jobname, styles):
+    """The job name and url line above a job's runs"""
+    # This strips the /job/ dividers that wind up in the URLs for display
+    display_name = jobname.replace('/job/', '/')
+    # Underlined like rich's highlighter does for urls in plain strings
+    return Text.assemble((display_name, styles.style('job_title')), ': ',
+                         (f'{j.baseurl}/job/{jobname}', styles.style('job_url') + Style(underline=True)))
+
+
+def fetch_failed(run_details):
+    """
+        True if some of a run's details didn't come back for a reason that
+        could go away, a 5xx or a dropped connection. No test results
+        (LookupError) or a 404 are answers, not failures.
+    """
+    for value in run_details.values():
+        if not isinstance(value, Exception) or isinstance(value, LookupError):
+            continue
+        response = getattr(value, 'response', None)
+        if response is not None and response.status_code == 404:
+            continue
+        return True
+    return False
+
+
+def render_run(job, run_details, subjob, styles):
+    """
+        Builds the row of panels for one run
 
+        Returns:
+            (renderable, run_results) where run_results holds the test counts
+            that go into the --results file
+    """
+    stages = job["stages"]
+
+    jobtime = datetime.datetime.fromtimestamp(job["startTimeMillis"]/1000.0)
+    date = jobtime.strftime("%b %d")
+    time = jobtime.strftime(" %H:%M")
+
+    duration = time_str(job["durationMillis"])
+    status_style = styles.style(job["status"])
+
+    # Find the downstream job numbers
+    downstream_string = ""
+    if subjob:
+        try:
+            subjob_numbers = downstream_numbers(run_details, subjob)
+            if subjob_numbers:
+                downstream_string = ", ".join([str(num) for num in subjob_numbers])
+        except Exception:
+            pass
+
+    job_renderables = [
+            Panel(
+                Group(
+                    Align.center(Text(job["status"], status_style)),
+                    Align.center(Text(date, styles.style('date'))),
+                    Align.center(Text(time, styles.bold('time'))),
+                    Align.center(Text(downstream_string or " ")),
+                    ),
+                width=15,
+                height=6,
+                title=Text(job["name"], styles.style('stage_title')),
+                subtitle=Text(duration, styles.style('time')),
+                border_style=status_style,
+                )
+            ]
+    job_renderables.extend([styles.stage_panel(stage) for stage in stages])
+
+    run_results = result_counts(run_details)
+    if run_results:
+        job_renderables.append(
+                Panel(
+                    Group(
+                        Text('Results', styles.bold('stage_title')),
+                        Text(f'Passed: {run_results["passCount"]}', styles.style('success')),
+                        Text(f'Failed: {run_results["failCount"]}', styles.style('failed')),
+                        Text(f'Skipped: {run_results["skipCount"]}', styles.style('unstable')),
+                        ),
+                    width=15,
+                    height=6,
+                    border_style=status_style,
+                    )
+                )
 
-            console.print(Columns(job_renderables))
+    return (Columns(job_renderables), run_results)
 
-    if opts.resultfname is not None:
+
+# Narrowest a --compact stage column gets, its name wraps to fit
+STAGE_MIN_WIDTH = 5
+# Room to measure a table in without it getting squeezed
+UNLIMITED_WIDTH = 100000
+
+
+def render_table(jobname, runs, details, subjob, styles):
+    """
+        Builds one table for all of a job's runs, a row per run and a column
+        per stage. Stages line up across runs even when a run skipped some or
+        didn't get that far.
+
+        Returns:
+            (table, job_results) where job_results maps run id to the test
+            counts that go into the --results file
+    """
+    # Stage name -> widest time in its column, in the order they first show up
+    stage_widths = {}
+    for run in runs:
+        for stage in run["stages"]:
+            width = len(compact_time(stage["durationMillis"]))
+            stage_widths[stage["name"]] = max(width, stage_widths.get(stage["name"], 0))
+    stage_names = list(stage_widths)
+
+    # Columns never squeeze below what their cells need. Stage names wrap in
+    # the header instead of getting cut to "Stag…", and a table that still
+    # doesn't fit runs off past the edge of the terminal.
+    table = Table(box=box.SIMPLE_HEAD, show_edge=False, pad_edge=False, padding=(0, 1, 0, 0),
+                  header_style=styles.style('stage_title'))
+    table.add_column("Run", style=styles.style('stage_title'), no_wrap=True,
+                     min_width=max([len("Run")] + [len(run["name"]) for run in runs]))
+    table.add_column("Status", no_wrap=True,
+                     min_width=max([len("Status")] + [len(run["status"]) for run in runs]))
+    table.add_column("Started", style=styles.style('date'), no_wrap=True, min_width=len("MM-DD HH:MM"))
+    table.add_column("Time", style=styles.style('time'), no_wrap=True,
+                     min_width=max([len("Time")] + [len(compact_time(run["durationMillis"])) for run in runs]))
+    if subjob:
+        table.add_column(subjob, no_wrap=True, min_width=len(subjob))
+    for name in stage_names:
+        table.add_column(name, overflow="fold", min_width=max(STAGE_MIN_WIDTH, stage_widths[name]))
+    table.add_column("Tests", no_wrap=True, min_width=len("Tests"))
+
+    missing = Text("-")
+    job_results = {}
+    for run in runs:
+        run_details = details.get((jobname, run["id"]), {})
+        started = datetime.datetime.fromtimestamp(run["startTimeMillis"]/1000.0).strftime("%m-%d %H:%M")
+        row = [run["name"], Text(run["status"], styles.style(run["status"])), started,
+               compact_time(run["durationMillis"])]
+
+        if subjob:
+            try:
+                row.append(", ".join(str(num) for num in downstream_numbers(run_details, subjob)))
+            except Exception:
+                row.append("")
+
+        stages = {stage["name"]: stage for stage in run["stages"]}
+        for name in stage_names:
+            stage = stages.get(name)
+            row.append(styles.stage_cell(stage) if stage else missing)
+
+        job_results[run["id"]] = run_results = result_counts(run_details)
+        if run_results:
+            row.append(Text.assemble((str(run_results["passCount"]), styles.style('success')), ' ',
+                                     (str(run_results["failCount"]), styles.style('failed')), ' ',
+                                     (str(run_results["skipCount"]), styles.style('unstable'))))
+        else:
+            row.append(missing)
+        table.add_row(*row)
+
+    return (Unsqueezed(table), job_results)
+
+
+def result_counts(run_details):
+    """The pass/fail/skip counts out of a run's details, {} if there are none"""
+    result_data = run_details.get('results')
+    if not isinstance(result_data, dict):
+        return {}
+    return {
+        'passCount': result_data["passCount"],
+        'failCount': result_data["failCount"],
+        'skipCount': result_data["skipCount"]
+        }
+
+
+class ThemeCache():
+    """
+        A theme's styles, each looked up once, plus the stage panels and table
+        cells already built with them. Stages that look the same share one
+        renderable. A different theme gets a new ThemeCache.
+    """
+    # Plenty for any board, and --watch can't grow it forever
+    MAX_ENTRIES = 10000
+
+    def __init__(self, theme):
+        self.theme = theme
+        self._styles = {}
+        self._panels = {}
+        self._cells = {}
+
+    def style(self, name):
+        """Style for a theme name or a run/stage status, plain if the theme doesn't have it"""
+        style = self._styles.get(name)
+        if style is None:
+            style = self._styles[name] = self.theme.styles.get(name.lower(), Style.null())
+        return style
+
+    def bold(self, name):
+        key = ('bold', name)
+        style = self._styles.get(key)
+        if style is None:
+            style = self._styles[key] = self.style(name) + Style(bold=True)
+        return style
+
+    def stage_panel(self, stage):
+        """The panel for a stage in the regular view"""
+        key = (stage["name"], stage["status"], time_str(stage["durationMillis"]))
+        panel = self._panels.get(key)
+        if panel is None:
+            if len(self._panels) >= self.MAX_ENTRIES:
+                self._panels.clear()
+            panel = self._panels[key] = Panel(
+                    get_content(stage, self),
+                    width=15,
+                    height=6,
+                    expand=True,
+                    border_style=self.style(stage["status"]),
+                    )
+        return panel
+
+    def stage_cell(self, stage):
+        """The cell for a stage in the --compact table"""
+        key = (stage["status"], compact_time(stage["durationMillis"]))
+        cell = self._cells.get(key)
+        if cell is None:
+            if len(self._cells) >= self.MAX_ENTRIES:
+                self._cells.clear()
+            cell = self._cells[key] = Text(key[1], self.style(stage["status"]))
+        return cell
+
+
+class Unsqueezed():
+    """
+        Draws a table at least as wide as its columns' minimums. Squeezed into
+        a narrower terminal rich starts dropping columns, this way the extra
+        just runs off the edge.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def __rich_console__(self, console, options):
+        needed = Measurement.get(console, options.update_width(UNLIMITED_WIDTH), self.table).minimum
+        yield from console.render(self.table, options.update_width(max(options.max_width, needed)))
+
+
+class Prerendered():
+    """
+        Wraps a renderable and hangs on to the segments it rendered to, so
+        drawing it again at the same width is just replaying them
+    """
+
+    def __init__(self, renderable):
+        self.renderable = renderable
+        self._width = None
+        self._lines = None
+
+    def __rich_console__(self, console, options):
+        if self._width != options.max_width:
+            self._lines = console.render_lines(self.renderable, options, pad=False, new_lines=True)
+            self._width = options.max_width
+        for line in self._lines:
+            yield from line
+
+
+def save_results(jobs_hash, resultfname):
+    """
+        Writes the run numbers and test counts out for --results
+    """
+    if resultfname is not None:
         j = json.dumps(jobs_hash, indent=4, ensure_ascii=False)
-        with open(opts.resultfname, 'w', encoding="utf-8") as output_file:
+        with open(resultfname, 'w', encoding="utf-8") as output_file:
             output_file.write(j)
 
 def time_str(millis, short=False):
@@ -171,25 +535,38 @@ def time_str(millis, short=False):
     return h_string + ms_string
 
 
-def get_content(stage):
+def compact_time(millis):
+    """time_str, minus the hours when there aren't any"""
+    return time_str(millis, short=millis < 3600000)
+
+
+def get_content(stage, styles):
     """Formats data from the stage status info"""
-    # print(stage)
     status = stage["status"]
-    name = stage["name"]
-    time = time_str(stage["durationMillis"])
-    return f'[b][stage_title]{name}[/b]\n[{status.lower()}]{status}\n[time]{time}'
+    return Text.assemble((stage["name"], styles.bold('stage_title')), '\n',
+                         (status, styles.style(status)), '\n',
+                         (time_str(stage["durationMillis"]), styles.style('time')))
+
+
+# theme name -> (colors.cfg mtime, Theme), parsed once until the file changes
+_themes = {}
 
 
 def load_theme(theme_override=None):
     """
-        Reads colors.cfg to bring in the themes
+        Reads colors.cfg to bring in the themes. Asking again hands back the
+        same Theme object unless the file has been changed since.
     """
     cfgfile = 'colors.cfg'
     if not os.path.isfile(cfgfile):
         raise ValueError("colors.cfg file does not exist")
+    mtime = os.stat(cfgfile).st_mtime_ns
+    cached = _themes.get(theme_override)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
     cfg = configparser.ConfigParser()
     cfg.read(cfgfile)
-    
     if theme_override:
         theme_name = theme_override
     else:
@@ -200,6 +577,7 @@ def load_theme(theme_override=None):
     
     theme_colors = cfg[theme_name]
     session_theme = Theme(theme_colors)
+    _themes[theme_override] = (mtime, session_theme)
     return session_theme
 
 def load_secrets():
@@ -252,6 +630,41 @@ def parse_commandline():
     parser.add_argument("-t", "--theme", dest="theme",
                         help="Color theme to use (e.g., Dark, Light, ElfLord)",
                         default=None)
+    parser.add_argument("-w", "--workers", dest="workers",
+                        help="Max number of requests in flight at once",
+                        type=int,
+                        default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("-c", "--compact", dest="compact",
+                        action='store_true',
+                        help="One table per job, a row per run and a column per stage",
+                        default=False)
+    parser.add_argument("--watch", dest="watch",
+                        metavar="INTERVAL",
+                        help="Keep the view up, refreshing every INTERVAL seconds",
+                        type=float,
+                        default=None)
+    parser.add_argument("--no-cache", dest="no_cache",
+                        action='store_true',
+                        help="Don't read or write the cache of finished builds",
+                        default=False)
+    parser.add_argument("--refresh", dest="refresh",
+                        action='store_true',
+                        help="Refetch finished builds and update the cache",
+                        default=False)
+    parser.add_argument("--history", dest="history",
+                        action='store_true',
+                        help="Sync new runs into the local history and show from there",
+                        default=False)
+    parser.add_argument("--pool-stats", dest="pool_stats",
+                        action='store_true',
+                        help="Print connection pool stats to stderr when done",
+                        default=False)
+    parser.add_argument("--profile", dest="profile",
+                        nargs='?',
+                        const='-',
+                        metavar="FILE",
+                        help="Print where the time went to stderr, and write a Chrome trace to FILE if given",
+                        default=None)
 
     options = parser.parse_args()
 
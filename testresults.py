@@ -0,0 +1,151 @@
+'''
+    testresults
+    Compact holder for a build's test cases. A report can have tens of thousands
+    of cases, so each one keeps only the handful of fields janky prints, in a
+    __slots__ object, and the ones we don't want are dropped while the report is
+    still streaming in.
+'''
+
+# Statuses that aren't worth showing when only asking for failures
+PASSING_STATUSES = frozenset(['PASSED', 'FIXED'])
+FAILING_STATUSES = frozenset(['FAILED', 'REGRESSION'])
+
+# tree= filters so Jenkins only sends the fields we use
+CASE_TREE = 'suites[name,cases[className,name,status]]'
+DETAILS_TREE = 'suites[name,cases[className,name,status,errorStackTrace]]'
+
+
+class Case():
+    """One test case, just the bits we print"""
+    __slots__ = ('suite', 'class_name', 'name', 'status', 'stack_trace')
+
+    def __init__(self, suite, class_name, name, status, stack_trace=None):
+        self.suite = suite
+        self.class_name = class_name
+        self.name = name
+        self.status = status
+        self.stack_trace = stack_trace
+
+
+class TestResults():
+
+    def __init__(self, cases=None):
+        self.cases = cases if cases is not None else []
+
+    @classmethod
+    def from_stream(cls, stream, only_failed=False, details=False):
+        """
+        Builds the results from (suite name, case dict) pairs, like the ones
+        JenkinsLight.iter_test_cases yields
+
+        :param stream: iterable of (suite name, case dict)
+        :param only_failed: skip PASSED and FIXED cases
+        :param details: hold on to the stack traces
+        """
+        cases = []
+        append = cases.append
+        for (suite, case) in stream:
+            status = case.get("status")
+            if only_failed and status in PASSING_STATUSES:
+                continue
+            append(Case(suite, case.get("className"), case.get("name"), status,
+                        case.get("errorStackTrace") if details else None))
+        return cls(cases)
+
+    @classmethod
+    def from_report(cls, report, only_failed=False, details=False):
+        """Same as from_stream, for a report that's already a dict"""
+        return cls.from_stream(((suite.get("name"), case)
+                                for suite in report.get("suites", [])
+                                for case in suite.get("cases", [])),
+                               only_failed, details)
+
+    def __len__(self):
+        return len(self.cases)
+
+    def by_suite(self):
+        """
+        Cases sorted by suite then class, grouped up per suite. One sort over
+        the lot, it's stable so cases keep report order within a class.
+
+        Returns:
+            list of (suite name, [cases]) tuples
+        """
+        ordered = sorted(self.cases, key=lambda case: (case.suite or '', case.class_name or ''))
+        groups = []
+        for case in ordered:
+            if not groups or groups[-1][0] != case.suite:
+                groups.append((case.suite, []))
+            groups[-1][1].append(case)
+        return groups
+
+    def index(self):
+        """
+        Maps (suite, class, name) to status, what diffs and flake hunting
+        compare builds by. A case that shows up twice keeps its last status.
+        """
+        return {(case.suite, case.class_name, case.name): case.status for case in self.cases}
+
+
+class ResultsDiff():
+    """What changed between two builds' results, keyed on (suite, class, name)"""
+
+    def __init__(self, old, new):
+        """
+        :param old: index() of the older build
+        :param new: index() of the newer build
+        """
+        self.newly_failing = []
+        self.fixed = []
+        self.still_failing = []
+        self.added = []
+        for (key, status) in new.items():
+            before = old.get(key)
+            if before is None:
+                self.added.append((key, status))
+            elif status in FAILING_STATUSES:
+                if before in FAILING_STATUSES:
+                    self.still_failing.append((key, status))
+                else:
+                    self.newly_failing.append((key, status))
+            elif before in FAILING_STATUSES and status in PASSING_STATUSES:
+                self.fixed.append((key, status))
+        self.removed = [(key, status) for (key, status) in old.items() if key not in new]
+
+
+def find_flaky(indexes, min_flips=1):
+    """
+    Counts how many times each test flipped between passing and failing, in
+    one pass over the builds. Skipped runs don't count either way.
+
+    :param indexes: index() of each build, oldest first
+    :param min_flips: leave out tests that flipped fewer times than this
+
+    Returns:
+        list of (key, flips, failures, runs), most flips first
+    """
+    # key -> [last outcome, flips, failures, runs]
+    seen = {}
+    for index in indexes:
+        for (key, status) in index.items():
+            if status in FAILING_STATUSES:
+                failed = True
+            elif status in PASSING_STATUSES:
+                failed = False
+            else:
+                continue
+
+            entry = seen.get(key)
+            if entry is None:
+                seen[key] = [failed, 0, int(failed), 1]
+                continue
+            if entry[0] != failed:
+                entry[1] += 1
+                entry[0] = failed
+            entry[2] += failed
+            entry[3] += 1
+
+    flaky = [(key, flips, failures, runs) for (key, (_, flips, failures, runs)) in seen.items()
+             if flips >= min_flips]
+    flaky.sort(key=lambda item: (-item[1], item[0][0] or '', item[0][1] or '', item[0][2] or ''))
+    return flaky
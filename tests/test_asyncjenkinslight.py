@@ -0,0 +1,233 @@
+'''
+    AsyncJenkinsLight against bench/fakejenkins.py, next to JenkinsLight
+    asking the same server the same things. Needs httpx.
+
+    python3 -m unittest discover tests
+'''
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+import httpx  # noqa: E402
+
+from asyncjenkinslight import AsyncJenkinsLight  # noqa: E402
+from fakejenkins import FakeJenkins, start_server  # noqa: E402
+from jenkinslight import JenkinsLight  # noqa: E402
+from responsecache import ResponseCache  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+UPSTREAM = 'big-pipeline'
+SUBJOB = 'sub-job'
+RECORDED = 'recorded-job'
+
+
+def setUpModule():
+    global fake, server
+    fake = FakeJenkins(builds=12, runs=6, stages=5, cases=200, artifacts=5, console_lines=10,
+                       upstream=UPSTREAM, subjob=SUBJOB, fixtures=FIXTURES)
+    server = start_server(fake)
+
+
+def tearDownModule():
+    server.shutdown()
+    server.server_close()
+
+
+def comparable(details):
+    """
+    fetch_run_details output with the exceptions swapped for something that
+    compares. requests and httpx raise different HTTP errors, the status is
+    what counts. Fingerprint ages go too, they're from the clock and an hour
+    old build can be "59 min old" one call and "1 hr old" the next.
+    """
+    def plain(value):
+        if isinstance(value, list):
+            return [{key: fp[key] for key in fp if key != 'age'} for fp in value]
+        if not isinstance(value, Exception):
+            return value
+        response = getattr(value, 'response', None)
+        return ('HTTP', response.status_code) if response is not None else type(value).__name__
+
+    return {key: {kind: plain(value) for (kind, value) in run_details.items()}
+            for (key, run_details) in details.items()}
+
+
+class FakeServerTestCase(unittest.IsolatedAsyncioTestCase):
+    """Zeroes the fake's stats before each test and puts its knobs back after"""
+    KNOBS = ('latency', 'jitter', 'fail_rate', 'fail_status', 'drop_rate')
+
+    def setUp(self):
+        self.knobs = {knob: getattr(fake, knob) for knob in self.KNOBS}
+        # Requests a timed out or cancelled test gave up on are still being
+        # answered, let them finish so they don't count here
+        while fake.in_flight:
+            time.sleep(0.01)
+        fake.reset()
+
+    def tearDown(self):
+        for (knob, value) in self.knobs.items():
+            setattr(fake, knob, value)
+
+    def light(self, **kwargs):
+        return JenkinsLight(server.url, 'me', 'whatever', **kwargs)
+
+    def async_light(self, **kwargs):
+        return AsyncJenkinsLight(server.url, 'me', 'whatever', **kwargs)
+
+
+class SameShapesTest(FakeServerTestCase):
+    """Same calls, same answers as JenkinsLight"""
+
+    async def asyncSetUp(self):
+        self.sync = self.light()
+        self.runs = self.sync.get_pipeline_data(UPSTREAM, None)
+        self.finished = [run for run in self.runs if run["status"] != 'IN_PROGRESS']
+
+    async def test_pipeline_data(self):
+        async with self.async_light() as j:
+            self.assertEqual(await j.get_pipeline_data(UPSTREAM), self.runs)
+        self.assertEqual(len(self.runs), 6)
+
+    async def test_pipeline_data_recorded(self):
+        async with self.async_light() as j:
+            runs = await j.get_pipeline_data(RECORDED)
+        self.assertEqual(runs, self.sync.get_pipeline_data(RECORDED, None))
+        self.assertEqual([run["id"] for run in runs], ['3', '2'])
+
+    async def test_pipeline_results(self):
+        run = self.finished[0]
+        async with self.async_light() as j:
+            report = await j.get_pipeline_results(UPSTREAM, run["id"], run["status"])
+            summary = await j.get_results_summary(UPSTREAM, run["id"], run["status"])
+        self.assertEqual(report, self.sync.get_pipeline_results(UPSTREAM, run["id"], run["status"]))
+        self.assertEqual(summary, self.sync.get_results_summary(UPSTREAM, run["id"], run["status"]))
+        self.assertEqual(summary['passCount'] + summary['failCount'] + summary['skipCount'], 200)
+
+    async def test_fingerprints(self):
+        async with self.async_light() as j:
+            for (jobname, jobno) in ((UPSTREAM, self.finished[0]["id"]), (SUBJOB, 1005), (RECORDED, 3)):
+                with self.subTest(job=jobname):
+                    prints = await j.get_fingerprints(jobname, jobno)
+                    expected = self.sync.get_fingerprints(jobname, jobno)
+                    self.assertEqual(comparable({0: {'fingerprints': prints}}),
+                                     comparable({0: {'fingerprints': expected}}))
+
+    async def test_fingerprints_recorded(self):
+        async with self.async_light() as j:
+            prints = await j.get_fingerprints(RECORDED, 3)
+        self.assertEqual([(fp['filename'], fp['owner'], fp['owner_job'], fp['owner_build_number'])
+                          for fp in prints],
+                         [('recorded-job-3.tar.gz', 'this build', None, None),
+                          ('ui-tests-report.zip', 'sub-job #1003', 'sub-job', 1003),
+                          ('vendored.jar', 'outside Jenkins', None, None)])
+
+    async def test_run_details(self):
+        job_runs = [(UPSTREAM, self.runs), (SUBJOB, self.sync.get_pipeline_data(SUBJOB, None))]
+        async with self.async_light() as j:
+            for summary in (True, False):
+                with self.subTest(summary=summary):
+                    details = await j.fetch_run_details(job_runs, results=True, fingerprints=True,
+                                                        summary=summary)
+                    expected = self.sync.fetch_run_details(job_runs, results=True, fingerprints=True,
+                                                           summary=summary)
+                    self.assertEqual(comparable(details), comparable(expected))
+                    self.assertEqual(len(details), 12)
+
+    async def test_shared_cache(self):
+        """Finished builds and conditional GETs share ResponseCache entries both ways"""
+        with tempfile.TemporaryDirectory() as directory:
+            run = self.finished[0]
+            sync = self.light(cache=ResponseCache(directory))
+            runs = sync.get_pipeline_data(UPSTREAM, None)
+            prints = sync.get_fingerprints(UPSTREAM, run["id"], run["status"])
+
+            fake.reset()
+            async with self.async_light(cache=ResponseCache(directory)) as j:
+                self.assertEqual(await j.get_pipeline_data(UPSTREAM), runs)
+                self.assertEqual(await j.get_fingerprints(UPSTREAM, run["id"], run["status"]), prints)
+            stats = fake.snapshot()
+            # Just the run list, asked conditionally and not modified
+            self.assertEqual(stats['requests'], 1)
+            self.assertEqual(stats['statuses'], {'304': 1})
+
+    async def test_revalidated(self):
+        fake.reset()
+        async with self.async_light() as j:
+            first = await j.get_pipeline_data(UPSTREAM)
+            second = await j.get_pipeline_data(UPSTREAM)
+        self.assertEqual(first, second)
+        self.assertEqual(fake.snapshot()['statuses'], {'200': 1, '304': 1})
+
+
+class LimitsTest(FakeServerTestCase):
+    """Concurrency cap, retries, timeouts and cancelling"""
+
+    def calls(self, j, count):
+        return [(j.get_results_summary, (UPSTREAM, number % 10 + 1)) for number in range(count)]
+
+    async def test_max_per_host(self):
+        fake.latency = 0.05
+        async with self.async_light(max_per_host=3, max_connections=10) as j:
+            results = await j.fetch_all(self.calls(j, 12))
+        self.assertFalse([result for result in results if isinstance(result, Exception)])
+        stats = fake.snapshot()
+        self.assertEqual(stats['requests'], 12)
+        self.assertEqual(stats['peak_in_flight'], 3)
+
+    async def test_retry(self):
+        for status in (503, 429):
+            with self.subTest(status=status):
+                fake.reset()
+                (fake.fail_rate, fake.fail_status) = (0.3, status)
+                async with self.async_light(max_retries=10) as j:
+                    results = await j.fetch_all(self.calls(j, 20))
+                self.assertFalse([result for result in results if isinstance(result, Exception)])
+                stats = fake.snapshot()
+                self.assertGreater(stats['failed'], 0)
+                self.assertEqual(stats['requests'], 20 + stats['failed'])
+                self.assertEqual(stats['statuses'][str(status)], stats['failed'])
+
+    async def test_retry_gives_up(self):
+        fake.fail_rate = 1.0
+        async with self.async_light(max_retries=2) as j:
+            with self.assertRaises(httpx.HTTPStatusError) as caught:
+                await j.get_pipeline_data(UPSTREAM)
+        self.assertEqual(caught.exception.response.status_code, 503)
+        self.assertEqual(fake.snapshot()['requests'], 3)
+
+    async def test_batch_timeout(self):
+        fake.latency = 0.5
+        async with self.async_light() as j:
+            started = time.perf_counter()
+            results = await j.fetch_all(self.calls(j, 4), timeout=0.1)
+            took = time.perf_counter() - started
+        self.assertTrue(all(isinstance(result, asyncio.TimeoutError) for result in results))
+        self.assertLess(took, 0.4)
+
+    async def test_request_timeout(self):
+        fake.latency = 0.5
+        async with self.async_light(timeout=0.1, max_retries=0) as j:
+            results = await j.fetch_all(self.calls(j, 2))
+        self.assertTrue(all(isinstance(result, httpx.TimeoutException) for result in results))
+
+    async def test_cancel(self):
+        fake.latency = 0.5
+        async with self.async_light(max_per_host=2) as j:
+            batch = asyncio.ensure_future(j.fetch_all(self.calls(j, 8)))
+            await asyncio.sleep(0.1)
+            batch.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await batch
+            # Nothing from the batch is left running
+            self.assertEqual(asyncio.all_tasks() - {asyncio.current_task()}, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+'''
+    ConsoleStreamer against bench/fakejenkins.py with console notes in the
+    log, so X-Text-Size is further along than the text that came back
+
+    python3 -m unittest discover tests
+'''
+import io
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+from consolestream import ConsoleStreamer  # noqa: E402
+from fakejenkins import FakeJenkins, console_text, start_server  # noqa: E402
+from jenkinslight import JenkinsLight  # noqa: E402
+
+JOB = 'big-pipeline'
+# The newest build, still going
+RUNNING = 12
+
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeJenkins(builds=RUNNING, console_lines=20000, stream_step=300000, notes=True,
+                                compress=False)
+        self.server = start_server(self.fake)
+        self.light = JenkinsLight(self.server.url, 'me', 'whatever')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stream(self):
+        out = io.BytesIO()
+        size = ConsoleStreamer(self.light, JOB, RUNNING, out, min_interval=0, max_interval=0.01,
+                               max_failures=50).run()
+        return (out.getvalue(), size)
+
+    def expected(self):
+        return console_text(self.fake.seed, JOB, RUNNING, self.fake.console_lines, 'SUCCESS')
+
+    def test_stream(self):
+        (text, size) = self.stream()
+        self.assertEqual(text, self.expected())
+        # The offset is into the log, notes and all
+        self.assertGreater(size, len(text))
+
+    def test_cut_off(self):
+        self.fake.cut_rate = 0.4
+        (text, _) = self.stream()
+        self.assertGreater(self.fake.snapshot()['cut'], 0)
+        # Nothing printed twice, nothing missing
+        self.assertEqual(text, self.expected())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+'''
+    history.sync against bench/fakejenkins.py, into an in memory store
+
+    python3 -m unittest discover tests
+'''
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+from fakejenkins import FakeJenkins, start_server  # noqa: E402
+from history import HistoryStore, sync  # noqa: E402
+from jenkinslight import JenkinsLight  # noqa: E402
+
+JOB = 'big-pipeline'
+# How many runs wfapi/runs hands back
+WINDOW = 6
+
+
+class SyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeJenkins(builds=12, runs=WINDOW, stages=3, cases=50, artifacts=2, console_lines=10,
+                                upstream=JOB)
+        self.server = start_server(self.fake)
+        self.light = JenkinsLight(self.server.url, 'me', 'whatever')
+        self.store = HistoryStore(':memory:')
+
+    def tearDown(self):
+        self.store.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def more_builds(self, count):
+        """count more builds happen before the next sync"""
+        self.fake.builds += count
+        # The fake makes a job's info once, it has to notice the new builds
+        self.fake.jobs.clear()
+
+    def stored_ids(self):
+        return sorted(int(run["id"]) for run in self.store.runs(self.light.baseurl, JOB))
+
+    def test_first_sync(self):
+        (fetched, _) = sync(self.light, self.store, JOB, fingerprints=False)
+        self.assertEqual(len(fetched), WINDOW)
+        self.assertEqual(self.stored_ids(), list(range(7, 13)))
+        # The newest is still going
+        self.assertEqual(self.store.high_water(self.light.baseurl, JOB), 11)
+
+    def test_within_window(self):
+        sync(self.light, self.store, JOB, fingerprints=False)
+        self.more_builds(3)
+        self.fake.reset()
+        sync(self.light, self.store, JOB, fingerprints=False)
+        self.assertEqual(self.stored_ids(), list(range(7, 16)))
+        # No paging back when the window reaches the high water mark
+        self.assertNotIn('wfapi/describe', self.fake.snapshot()['endpoints'])
+
+    def test_gap_bigger_than_window(self):
+        sync(self.light, self.store, JOB, fingerprints=False)
+        self.more_builds(4 * WINDOW)
+        (fetched, _) = sync(self.light, self.store, JOB, fingerprints=False)
+
+        newest = 12 + 4 * WINDOW
+        self.assertEqual(self.stored_ids(), list(range(7, newest + 1)))
+        self.assertEqual(len(fetched), newest - 11)
+        self.assertEqual(self.store.high_water(self.light.baseurl, JOB), newest - 1)
+        # Runs from the gap are stored whole, stages and all
+        gap_run = next(run for run in self.store.runs(self.light.baseurl, JOB) if run["id"] == '20')
+        self.assertEqual(gap_run, self.fake.wfapi_run(JOB, 20))
+
+    def test_gap_paged(self):
+        sync(self.light, self.store, JOB, fingerprints=False)
+        self.more_builds(250)
+        sync(self.light, self.store, JOB, fingerprints=False)
+        self.assertEqual(self.stored_ids(), list(range(7, 12 + 250 + 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+'''
+    Tracer byte and download time counts against bench/fakejenkins.py, with
+    and without chunked bodies
+
+    python3 -m unittest discover tests
+'''
+import io
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+from fakejenkins import FakeJenkins, start_server  # noqa: E402
+from jenkinslight import JenkinsLight  # noqa: E402
+from tracing import Tracer  # noqa: E402
+
+JOB = 'big-pipeline'
+
+
+class BytesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeJenkins(builds=12, runs=6, stages=5, console_lines=20000)
+        self.server = start_server(self.fake)
+        self.tracer = Tracer()
+        self.light = JenkinsLight(self.server.url, 'me', 'whatever', tracer=self.tracer)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fetch(self):
+        """A streamed console and a parsed json body, what the tracer counted for each"""
+        self.light.copy_console_text(JOB, 5, io.BytesIO())
+        self.light.get_pipeline_data(JOB, None)
+        self.assertEqual(len(self.tracer.requests), 2)
+        return self.tracer.requests
+
+    def check(self):
+        records = self.fetch()
+        endpoints = self.fake.snapshot()['endpoints']
+        for (record, kind) in zip(records, ('consoleText', 'wfapi/runs')):
+            with self.subTest(kind=kind):
+                # Gzipped, what came over the wire
+                self.assertEqual(record['bytes'], endpoints[kind][1])
+                self.assertGreater(record['end'], record['headers'])
+
+    def test_content_length(self):
+        self.check()
+
+    def test_chunked(self):
+        self.fake.chunked = True
+        self.check()
+
+
+if __name__ == "__main__":
+    unittest.main()
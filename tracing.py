@@ -0,0 +1,230 @@
+'''
+    tracing
+    Where did the time go? A Tracer hooks a requests session and writes down
+    every response: url, status, how long until the headers showed up (server
+    time plus connecting), how long the body took to come down and how many
+    bytes that was on the wire. Spans mark the phases around them, fetch,
+    parse, render, whatever the caller calls them.
+
+    At the end print a summary by endpoint and phase, or dump a Chrome trace
+    to open in chrome://tracing or ui.perfetto.dev and see the timeline.
+    NULL_TRACER does nothing, cheaply, for when nobody's asking.
+'''
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from urllib.parse import parse_qs, urlsplit
+
+# /job/a/job/b/123/testReport/api/json -> /job/*/*/testReport/api/json
+_JOB_SEGMENTS = re.compile(r'(/job/[^/]+)+')
+_BUILD_SEGMENT = re.compile(r'(/job/\*)/(\d+|last\w*Build)(?=/|$)')
+_QUEUE_ITEM = re.compile(r'^/queue/item/\d+')
+# Long tree= filters get cut down to this much in endpoint names
+TREE_CHARS = 24
+
+
+class Tracer():
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.requests = []
+        self.spans = []
+        self.threads = {}
+
+    def hook(self, session):
+        """Records every response session gets from now on"""
+        session.hooks['response'].append(self._on_response)
+        return session
+
+    def _on_response(self, response, *args, **kwargs):
+        # Hooks run once the headers are in, before the body is read
+        now = time.perf_counter()
+        record = {
+            'url': response.url,
+            'status': response.status_code,
+            'start': now - response.elapsed.total_seconds(),
+            'headers': now,
+            'end': now,
+            'thread': self._thread(),
+            # Until the body's read, all there is to go on
+            'bytes': content_length(response.headers),
+        }
+
+        # Note when the last of the body comes off the wire and how much of it
+        # there was, requests and iter_content read a Content-Length body
+        # through raw.read. Only numbers get kept, the record doesn't hang on
+        # to the connection.
+        raw = response.raw
+        read = getattr(raw, 'read', None)
+        if read is not None:
+            def traced_read(*args, **kwargs):
+                data = read(*args, **kwargs)
+                record['end'] = time.perf_counter()
+                record['bytes'] = wire_bytes(raw) or record['bytes']
+                return data
+            raw.read = traced_read
+
+        # Chunked bodies go through read_chunked, which doesn't count them in
+        # tell() and never calls read. Each chunk comes off the wire here.
+        handle_chunk = getattr(raw, '_handle_chunk', None)
+        if handle_chunk is not None:
+            def traced_handle_chunk(*args, **kwargs):
+                data = handle_chunk(*args, **kwargs)
+                record['end'] = time.perf_counter()
+                record['bytes'] += len(data)
+                return data
+            raw._handle_chunk = traced_handle_chunk
+
+        with self.lock:
+            self.requests.append(record)
+        return response
+
+    @contextmanager
+    def span(self, name, **args):
+        """Times the with block as a name span, args end up in the trace"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.spans.append({'name': name, 'start': start, 'end': end,
+                                   'thread': self._thread(), 'args': args})
+
+    def _thread(self):
+        ident = threading.get_ident()
+        if ident not in self.threads:
+            self.threads[ident] = threading.current_thread().name
+        return ident
+
+    def request_rows(self):
+        """Per endpoint (count, errors, wait secs, download secs, bytes), slowest first"""
+        rows = {}
+        for record in self.requests:
+            row = rows.setdefault(endpoint_name(record['url']), [0, 0, 0.0, 0.0, 0])
+            row[0] += 1
+            row[1] += record['status'] >= 400
+            row[2] += record['headers'] - record['start']
+            row[3] += record['end'] - record['headers']
+            row[4] += record['bytes']
+        return sorted(rows.items(), key=lambda item: -(item[1][2] + item[1][3]))
+
+    def span_rows(self):
+        """Per span name (count, total secs, max secs), biggest first"""
+        rows = {}
+        for span in self.spans:
+            row = rows.setdefault(span['name'], [0, 0.0, 0.0])
+            took = span['end'] - span['start']
+            row[0] += 1
+            row[1] += took
+            row[2] = max(row[2], took)
+        return sorted(rows.items(), key=lambda item: -item[1][1])
+
+    def summary(self, out=None, pool=None):
+        """Prints where the time went, by endpoint and by phase
+
+        :param out: where to print, stderr by default so stdout stays clean
+        :param pool: JenkinsLight.pool_stats() to show connection reuse
+        """
+        out = out or sys.stderr
+        wall = time.perf_counter() - self.origin
+        requests = self.request_rows()
+        total_bytes = sum(row[4] for (_, row) in requests)
+
+        print(f"\nProfile: {wall * 1000:.0f} ms wall, {len(self.requests)} requests, "
+              f"{total_bytes / 1024:.0f} KB", file=out)
+        if pool:
+            print(f"Connections opened: {pool['opened']}, reused: {pool['reused']}", file=out)
+        if requests:
+            print(f"\n{'endpoint':<56} {'reqs':>5} {'errs':>5} {'wait ms':>9} "
+                  f"{'read ms':>9} {'avg ms':>8} {'KB':>8}", file=out)
+            for (name, (count, errors, wait, download, size)) in requests:
+                print(f"{name[:56]:<56} {count:>5} {errors:>5} {wait * 1000:>9.0f} "
+                      f"{download * 1000:>9.0f} {(wait + download) * 1000 / count:>8.1f} "
+                      f"{size / 1024:>8.0f}", file=out)
+        spans = self.span_rows()
+        if spans:
+            # Spans on different threads overlap, totals can add up past the wall time
+            print(f"\n{'phase':<32} {'count':>6} {'total ms':>10} {'max ms':>9}", file=out)
+            for (name, (count, total, longest)) in spans:
+                print(f"{name:<32} {count:>6} {total * 1000:>10.0f} {longest * 1000:>9.1f}", file=out)
+
+    def chrome_trace(self):
+        """The lot as Chrome trace events, one row per thread"""
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': ident, 'args': {'name': name}}
+                  for (ident, name) in self.threads.items()]
+        for record in self.requests:
+            args = {'url': record['url'], 'status': record['status'], 'bytes': record['bytes'],
+                    'wait_ms': round((record['headers'] - record['start']) * 1000, 3)}
+            events.append(self._event(endpoint_name(record['url']), 'request', record['start'],
+                                      record['end'], record['thread'], pid, args))
+            if record['end'] > record['headers']:
+                events.append(self._event('download', 'request', record['headers'], record['end'],
+                                          record['thread'], pid, {}))
+        for span in self.spans:
+            events.append(self._event(span['name'], 'phase', span['start'], span['end'],
+                                      span['thread'], pid, {key: str(value) for (key, value) in span['args'].items()}))
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def _event(self, name, category, start, end, thread, pid, args):
+        return {'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': thread,
+                'ts': round((start - self.origin) * 1e6, 1), 'dur': round((end - start) * 1e6, 1),
+                'args': args}
+
+    def write_chrome_trace(self, filename):
+        with open(filename, 'w', encoding='utf-8') as out:
+            json.dump(self.chrome_trace(), out)
+
+
+class NullTracer():
+    """Stands in when nobody asked for a profile"""
+    _nothing = nullcontext()
+
+    def hook(self, session):
+        return session
+
+    def span(self, name, **args):
+        return self._nothing
+
+
+NULL_TRACER = NullTracer()
+
+
+def endpoint_name(url):
+    """url with the job names, build numbers and queue ids starred out, plus the tree= filter"""
+    parts = urlsplit(url)
+    path = _JOB_SEGMENTS.sub('/job/*', parts.path, count=1)
+    path = _BUILD_SEGMENT.sub(r'\1/*', path)
+    path = _QUEUE_ITEM.sub('/queue/item/*', path)
+    tree = parse_qs(parts.query).get('tree')
+    if tree:
+        filter_text = tree[0] if len(tree[0]) <= TREE_CHARS else tree[0][:TREE_CHARS] + '...'
+        path += '?tree=' + filter_text
+    return path
+
+
+def wire_bytes(raw):
+    """Body bytes read off the socket so far, before any gunzipping, 0 if raw can't say"""
+    try:
+        return raw.tell() or 0
+    except Exception:
+        return 0
+
+
+def content_length(headers):
+    length = headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else 0
+
+
+def report(tracer, target, pool=None):
+    """What --profile does at the end: summary on stderr, and a trace file if target isn't -"""
+    if target and target != '-':
+        tracer.write_chrome_trace(target)
+        print(f"Chrome trace written to {target}", file=sys.stderr)
+    tracer.summary(pool=pool)